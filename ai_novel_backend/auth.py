@@ -1,3 +1,4 @@
+import os
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException, status
@@ -12,6 +13,8 @@ from database import get_db, User
 SECRET_KEY = "lxczuishuai"  # 请使用安全的密钥
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# 管理员账号，逗号分隔；未配置时没有人能调用管理接口
+ADMIN_ACCOUNTS = {account.strip() for account in os.getenv("ADMIN_ACCOUNTS", "").split(",") if account.strip()}
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -24,6 +27,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def decode_access_token(token: Optional[str]) -> Optional[int]:
+    """解析 access_token，返回用户 id；token 无效或过期时返回 None"""
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        return int(payload.get("sub"))
+    except (JWTError, TypeError, ValueError):
+        return None
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme), 
     db: AsyncSession = Depends(get_db)
@@ -33,12 +46,8 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = int(payload.get("sub"))
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+    user_id = decode_access_token(token)
+    if user_id is None:
         raise credentials_exception
 
     result = await db.execute(select(User).where(User.id == user_id))
@@ -46,4 +55,10 @@ async def get_current_user(
     
     if user is None:
         raise credentials_exception
-    return user 
\ No newline at end of file
+    return user 
+
+async def get_admin_user(current_user: User = Depends(get_current_user)):
+    """管理接口使用：当前用户必须在 ADMIN_ACCOUNTS 中"""
+    if current_user.account not in ADMIN_ACCOUNTS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="需要管理员权限")
+    return current_user
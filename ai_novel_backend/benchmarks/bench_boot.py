@@ -0,0 +1,39 @@
+# benchmarks/bench_boot.py
+# 启动耗时基准：多次在独立子进程中 import main，统计总耗时和各路由模块的导入耗时（-X importtime）中位数
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_boot
+import os
+import statistics
+import subprocess
+import sys
+
+RUNS = 9
+MODULES = ["main", "routes.spirate_routes", "routes.feature_routes", "routes.ai_routes"]
+
+
+def run_once() -> dict:
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True, text=True, check=True,
+    ).stderr
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if name in MODULES and cumulative.strip().isdigit():
+            timings[name] = int(cumulative) / 1000
+    return timings
+
+
+def main():
+    runs = [run_once() for _ in range(RUNS)]
+    if os.path.exists("mcp_client.log"):
+        os.remove("mcp_client.log")
+    print(f"{'module':<26}{'median ms':>12}")
+    for name in MODULES:
+        print(f"{name:<26}{statistics.median(run[name] for run in runs):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# benchmarks/bench_character_insert.py
+# 角色写入基准：每个故事 10 个角色，对比逐个开会话提交与 add_story_characters 批量写入的语句数、提交数和耗时
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_character_insert
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from dao.character import add_story_characters, story_character_prompt
+from database import Base, Character, InspirationResult
+
+STORIES = 50
+CHARACTERS_PER_STORY = 10
+
+
+def parsed_story(i: int) -> dict:
+    return {
+        "title": f"故事 {i}",
+        "content": "正文" * 200,
+        "story_direction": ["方向一", "方向二", "方向三"],
+        "characters": [
+            {"姓名": f"角色{i}-{j}", "描述": ["性格沉稳", f"年龄{20 + j}"]}
+            for j in range(CHARACTERS_PER_STORY)
+        ],
+    }
+
+
+async def save_story_legacy(session_factory, story: dict, user_id: int) -> int:
+    """旧实现：每个角色单独开会话、提交并 refresh，最后再单独写灵感结果"""
+    character_ids = []
+    for character in story["characters"]:
+        character_result = Character(
+            name=character["姓名"],
+            description="\n".join(character["描述"]),
+            user_id=user_id,
+            prompt=story_character_prompt(character["姓名"], character["描述"])
+        )
+        async with session_factory() as db:
+            db.add(character_result)
+            await db.commit()
+            await db.refresh(character_result)
+            character_ids.append(character_result.id)
+    inspiration_result = InspirationResult(
+        title=story["title"], characters=character_ids, content=story["content"],
+        user_id=user_id, story_direction=story["story_direction"], cover_image=""
+    )
+    async with session_factory() as db:
+        db.add(inspiration_result)
+        await db.commit()
+        await db.refresh(inspiration_result)
+        return inspiration_result.id
+
+
+async def save_story_batched(session_factory, story: dict, user_id: int) -> int:
+    async with session_factory() as db:
+        characters = await add_story_characters(db, user_id, story["characters"])
+        inspiration_result = InspirationResult(
+            title=story["title"], characters=[character.id for character in characters],
+            content=story["content"], user_id=user_id,
+            story_direction=story["story_direction"], cover_image=""
+        )
+        db.add(inspiration_result)
+        await db.commit()
+        return inspiration_result.id
+
+
+async def run(name: str, save, path: str) -> dict:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[Character.__table__, InspirationResult.__table__])
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    counts = {"statements": 0, "commits": 0, "connections": 0}
+
+    def on_execute(*args):
+        counts["statements"] += 1
+
+    def on_commit(conn):
+        counts["commits"] += 1
+
+    def on_checkout(*args):
+        counts["connections"] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+    event.listen(engine.sync_engine, "commit", on_commit)
+    event.listen(engine.sync_engine.pool, "checkout", on_checkout)
+
+    start = time.perf_counter()
+    for i in range(STORIES):
+        await save(session_factory, parsed_story(i), 1)
+    elapsed = time.perf_counter() - start
+
+    async with session_factory() as db:
+        stories = (await db.execute(select(InspirationResult))).scalars().all()
+        linked = sum(len(story.characters) for story in stories)
+        total = (await db.execute(select(func.count()).select_from(Character))).scalar()
+    await engine.dispose()
+    assert linked == total == STORIES * CHARACTERS_PER_STORY
+    return {"name": name, "elapsed": elapsed, **counts}
+
+
+async def main():
+    print(f"{STORIES} stories x {CHARACTERS_PER_STORY} characters")
+    print(f"{'mode':<10}{'statements':>12}{'commits':>9}{'checkouts':>11}{'ms/story':>10}")
+    for name, save in [("legacy", save_story_legacy), ("batched", save_story_batched)]:
+        with tempfile.TemporaryDirectory() as directory:
+            r = await run(name, save, os.path.join(directory, "characters.db"))
+        print(f"{r['name']:<10}{r['statements'] / STORIES:>12.1f}{r['commits'] / STORIES:>9.1f}"
+              f"{r['connections'] / STORIES:>11.1f}{r['elapsed'] * 1000 / STORIES:>10.2f}")
+    print("（语句数、提交数、连接签出次数均为每个故事的平均值）")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+# benchmarks/bench_chat_budget.py
+# 聊天上下文 token 预算检查：同一会话发送 60 条长短不一的消息（每 4 条有 1 条长消息，回复也长短不一），
+# 对比旧实现（固定取最近 10 条消息）和按 token 预算 + 滚动摘要组装的提示词 token 数
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_chat_budget
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.bench_llm_pool import API_KEY, start_server
+from bridge.openai_bridge import close_async_clients
+from dao.chat_context import CHAT_CONTEXT_TOKENS, ChatContextCache
+from dao.message_writer import ChatMessageWriter
+from database import Base, Character, ChatMessage, ChatSession, User, get_db
+from routes import chat_routes
+from util.tokenizer import count_message_tokens, count_messages_tokens
+
+TURNS = 60
+LEGACY_TURNS = 10
+CHARACTER_PROMPT = "你是一个温柔的剑客，说话简洁。"
+TABLES = [User.__table__, Character.__table__, ChatSession.__table__, ChatMessage.__table__]
+
+chat_prompts = []
+summary_calls = []
+
+
+def user_content(i: int) -> str:
+    return f"第 {i} 条消息：" + ("我给你讲一段很长的往事。" * 120 if i % 4 == 3 else "然后呢？")
+
+
+def reply(body: dict) -> str:
+    if not body.get("stream"):
+        # 摘要请求，按 max_tokens 截断
+        summary_calls.append(body)
+        return ("摘要：" + "两人结伴同行，约定一起去江南。" * 100)[:body.get("max_tokens") or 400]
+    chat_prompts.append(body["messages"])
+    return "剑客答道：" + "风起了。" * (5 + 60 * (len(chat_prompts) % 3))
+
+
+async def main():
+    base_url = start_server(delay=0, reply=reply)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = API_KEY
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'chat.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+        session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with session_factory() as db:
+            db.add(User(id=1, account="bench", password_hash="x"))
+            db.add(Character(id=1, name="剑客", user_id=1, prompt=CHARACTER_PROMPT, is_used=True))
+            db.add(ChatSession(id=1, user_id=1, character_id=1))
+            await db.commit()
+
+        cache = ChatContextCache(session_factory=session_factory)
+        chat_routes.chat_context_cache = cache
+        chat_routes.chat_message_writer = ChatMessageWriter(session_factory=session_factory)
+        app = FastAPI()
+        app.include_router(chat_routes.router)
+
+        async def override_get_db():
+            async with session_factory() as session:
+                yield session
+
+        app.dependency_overrides[get_db] = override_get_db
+
+        history = []
+        legacy_tokens = []
+        budget_tokens = []
+        failed = False
+        system_tokens = count_message_tokens({"content": CHARACTER_PROMPT})
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+            for i in range(TURNS):
+                content = user_content(i)
+                # 旧实现：角色提示词 + 最近 10 条消息 + 本次消息
+                legacy = [{"role": "system", "content": CHARACTER_PROMPT}, *history[-LEGACY_TURNS:], {"role": "user", "content": content}]
+                legacy_tokens.append(count_messages_tokens(legacy))
+
+                response = await client.post("/chat/session/1/message", json={"content": content})
+                assert response.status_code == 200, response.text
+                prompt = chat_prompts[-1]
+                budget_tokens.append(count_messages_tokens(prompt))
+                # 摘要 + 历史消息不超过预算，提示词总长 = 角色提示词 + 预算 + 本次消息
+                bound = system_tokens + CHAT_CONTEXT_TOKENS + count_message_tokens({"content": content})
+                if budget_tokens[-1] > bound:
+                    print(f"第 {i + 1} 轮超出预算：{budget_tokens[-1]} > {bound}")
+                    failed = True
+
+                history.append({"role": "user", "content": content})
+                history.append({"role": "assistant", "content": response.text.replace("data: ", "").replace("\n", "")})
+                # 摘要在后台生成，发下一条消息前等它完成，模拟用户的思考间隔
+                await asyncio.gather(*cache._summarizing.values())
+
+        await chat_routes.chat_message_writer.close()
+        async with session_factory() as db:
+            session = await db.get(ChatSession, 1)
+            summary_message_id = session.summary_message_id
+        await engine.dispose()
+    await close_async_clients()
+
+    print(f"{TURNS} turns, budget {CHAT_CONTEXT_TOKENS} tokens for summary + history")
+    print(f"{'turn':>5}{'last 10':>10}{'budget':>10}")
+    for i in range(4, TURNS, 5):
+        print(f"{i + 1:>5}{legacy_tokens[i]:>10}{budget_tokens[i]:>10}")
+    for name, tokens in [("last 10", legacy_tokens), ("budget", budget_tokens)]:
+        print(f"{name:<8} p50 {statistics.median(tokens):>7.0f}  max {max(tokens):>6}  stdev {statistics.pstdev(tokens):>7.0f}")
+    print(f"summary refreshes: {len(summary_calls)}, summary covers messages up to id {summary_message_id}")
+    if failed or not summary_calls:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
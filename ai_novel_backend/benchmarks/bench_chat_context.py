@@ -0,0 +1,129 @@
+# benchmarks/bench_chat_context.py
+# 会话上下文缓存检查：同一会话连续发送 20 条消息，统计每轮请求大模型之前执行的 SELECT 和写入语句数，
+# 对比关闭缓存（每轮都从数据库加载上下文）、单 worker 缓存（热会话 0 次读取）、多 worker 时的缓存校验
+# （热会话 1 次按索引的读取），以及两个 worker 各有一份缓存、轮流处理同一会话时，
+# 发给大模型的上下文不能缺少另一个 worker 写入的消息。
+# 写入语句包括本轮的用户消息，以及先写入上一轮排队中的回复（保证消息 id 顺序），各种方式相同
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_chat_context
+import asyncio
+import os
+import sys
+import tempfile
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.bench_llm_pool import API_KEY, start_server
+from bridge.openai_bridge import close_async_clients
+from dao.chat_context import ChatContextCache
+from dao.message_writer import ChatMessageWriter
+from database import Base, Character, ChatMessage, ChatSession, User, get_db
+from routes import chat_routes
+
+TURNS = 20
+TABLES = [User.__table__, Character.__table__, ChatSession.__table__, ChatMessage.__table__]
+
+selects = 0
+writes = 0
+llm_requests = []
+
+
+def on_llm_request(body: dict):
+    """假接口收到请求时记录此前执行过的 SELECT 数、写入语句数和消息条数"""
+    llm_requests.append((selects, writes, len(body["messages"])))
+
+
+async def run(max_sessions: int, validate: bool, workers: int, path: str) -> list:
+    global selects, writes
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as db:
+        db.add(User(id=1, account="bench", password_hash="x"))
+        db.add(Character(id=1, name="角色", user_id=1, prompt="你是一个角色", is_used=True))
+        db.add(ChatSession(id=1, user_id=1, character_id=1))
+        await db.commit()
+
+    def on_execute(conn, cursor, statement, *args):
+        global selects, writes
+        keyword = statement.lstrip()[:6].upper()
+        if keyword == "SELECT":
+            selects += 1
+        elif keyword in ("INSERT", "UPDATE"):
+            writes += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+    # 每个 worker 一份缓存；回复的合并写入共用一个 writer，这里只检查上下文缓存
+    caches = [ChatContextCache(max_sessions=max_sessions, validate=validate, session_factory=session_factory)
+              for _ in range(workers)]
+    chat_routes.chat_message_writer = ChatMessageWriter(session_factory=session_factory)
+
+    app = FastAPI()
+    app.include_router(chat_routes.router)
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+
+    turns = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+        for i in range(TURNS):
+            chat_routes.chat_context_cache = caches[i % workers]
+            selects = 0
+            writes = 0
+            llm_requests.clear()
+            response = await client.post("/chat/session/1/message", json={"content": f"第 {i} 条消息"})
+            assert response.status_code == 200, response.text
+            assert "Error" not in response.text, response.text
+            turns.append(llm_requests[0])
+    await chat_routes.chat_message_writer.close()
+    await engine.dispose()
+    return turns
+
+
+async def main():
+    # 回复很短，20 轮都在 token 预算内，不会触发摘要
+    base_url = start_server(delay=0, on_request=on_llm_request, reply=lambda body: "好的，我记住了。")
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = API_KEY
+
+    results = {}
+    modes = [("no cache", 0, False, 1), ("cache", 1000, False, 1), ("validate", 1000, True, 1),
+             ("2 workers", 1000, True, 2)]
+    for name, max_sessions, validate, workers in modes:
+        with tempfile.TemporaryDirectory() as directory:
+            results[name] = await run(max_sessions, validate, workers, os.path.join(directory, "chat.db"))
+    await close_async_clients()
+
+    print(f"{TURNS} turns in one session; SELECTs / INSERT+UPDATEs before the LLM request / messages sent")
+    print(f"{'turn':>5}" + "".join(f"{name:>16}" for name in results))
+    for i in range(TURNS):
+        print(f"{i + 1:>5}" + "".join(f"{f'{r[i][0]} / {r[i][1]} / {r[i][2]}':>16}" for r in results.values()))
+    print("validate = 多 worker 部署（WEB_CONCURRENCY > 1）时的默认值：热会话每轮 1 次按索引的读取；"
+          "单 worker 默认不校验，热会话 0 次读取")
+    print("写入语句 = 先写入上一轮排队中的回复（INSERT + UPDATE 会话）+ 本轮用户消息（INSERT + UPDATE 会话），各种方式相同")
+
+    # 各种方式发给大模型的上下文长度必须一致；单 worker 缓存命中后没有读取，校验时只有 1 次读取
+    expected = [m for _, _, m in results["no cache"]]
+    failed = False
+    for name in ["cache", "validate", "2 workers"]:
+        if [m for _, _, m in results[name]] != expected:
+            print(f"{name}: 上下文与不使用缓存时不一致")
+            failed = True
+    for name, limit in [("cache", 0), ("validate", 1)]:
+        hot_reads = max(reads for reads, _, _ in results[name][1:])
+        if hot_reads > limit:
+            print(f"{name}: 热会话每轮最多 {hot_reads} 次读取，应不超过 {limit} 次")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+# benchmarks/bench_chat_sessions.py
+# 会话列表基准：用户有 150 个会话、每个会话 80 条消息，对比逐会话查询 50 条消息的旧实现
+# 与一次窗口函数查询的 GET /chat/sessions/{user_id} 的耗时、SQL 语句数和读取的消息行数
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_chat_sessions
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, ChatMessage, ChatSession
+from routes.chat_routes import get_chat_sessions
+
+SESSIONS = 150
+MESSAGES_PER_SESSION = 80
+OTHER_USERS = 20
+REPEAT = 10
+
+
+async def legacy_get_chat_sessions(db: AsyncSession, user_id: int) -> list:
+    """旧实现：先查会话，再逐个会话查询最多 50 条消息"""
+    sessions = (await db.execute(select(ChatSession).where(ChatSession.user_id == user_id))).scalars().all()
+    sessions_with_messages = []
+    for session in sessions:
+        result = await db.execute(
+            select(ChatMessage).where(ChatMessage.session_id == session.id)
+            .order_by(ChatMessage.created_at.asc()).limit(50)
+        )
+        messages = result.scalars().all()
+        if len(messages) > 0:
+            session.last_message = messages[-1].content
+            session.last_message_time = messages[-1].created_at
+        sessions_with_messages.append({"session": session, "messages": messages})
+    return sessions_with_messages
+
+
+async def seed(session_factory):
+    start = datetime(2024, 1, 1)
+    async with session_factory() as db:
+        sessions = []
+        for user_id in range(1, OTHER_USERS + 2):
+            for i in range(SESSIONS):
+                sessions.append({"user_id": user_id, "character_id": i + 1,
+                                 "created_at": start, "updated_at": start + timedelta(minutes=i)})
+        await db.execute(insert(ChatSession), sessions)
+        session_ids = (await db.execute(select(ChatSession.id))).scalars().all()
+        messages = [
+            {"session_id": session_id, "sender_type": "user" if j % 2 == 0 else "character",
+             "content": f"消息 {j} " + "内容" * 100, "created_at": start + timedelta(seconds=j),
+             "updated_at": start}
+            for session_id in session_ids
+            for j in range(MESSAGES_PER_SESSION)
+        ]
+        await db.execute(insert(ChatMessage), messages)
+        await db.commit()
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'chat.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=[ChatSession.__table__, ChatMessage.__table__])
+        session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        await seed(session_factory)
+
+        counts = {"statements": 0}
+
+        def on_execute(*args):
+            counts["statements"] += 1
+
+        event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+
+        modes = [
+            ("legacy", lambda db: legacy_get_chat_sessions(db, 1)),
+            ("window", lambda db: get_chat_sessions(db, 1)),
+            ("window+5", lambda db: get_chat_sessions(db, 1, preview=5)),
+        ]
+        print(f"{SESSIONS} sessions x {MESSAGES_PER_SESSION} messages for the user, median of {REPEAT}")
+        print(f"{'mode':<10}{'ms':>9}{'statements':>12}{'messages':>10}")
+        last_messages = {}
+        for name, load in modes:
+            timings = []
+            for _ in range(REPEAT):
+                counts["statements"] = 0
+                async with session_factory() as db:
+                    start = time.perf_counter()
+                    sessions = await load(db)
+                    timings.append(time.perf_counter() - start)
+            timings.sort()
+            last_messages[name] = {
+                (item["session"]["id"] if isinstance(item["session"], dict) else item["session"].id):
+                (item["session"]["last_message"] if isinstance(item["session"], dict) else item["session"].last_message)
+                for item in sessions
+            }
+            loaded = sum(len(item["messages"]) for item in sessions)
+            print(f"{name:<10}{timings[len(timings) // 2] * 1000:>9.1f}{counts['statements']:>12}{loaded:>10}")
+        # 旧实现只读前 50 条，最后一条消息并不是最新的；新实现应返回每个会话真正的最新消息
+        assert all(message.startswith(f"消息 {MESSAGES_PER_SESSION - 1} ") for message in last_messages["window"].values())
+        assert last_messages["window"] == last_messages["window+5"]
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,175 @@
+# benchmarks/bench_chat_writes.py
+# 聊天回复写入基准：50 个会话并发聊天，每个会话 5 轮、每轮间隔 1 秒，通过真实的 HTTP 流读取 POST /chat/session/{id}/message，
+# 对比旧实现（流结束前新开会话提交 AI 消息、再查会话提交 last_message）和后台合并写入：
+# 最后一个 token 到流关闭的间隔、事务提交数和插入 chat_messages 的语句数
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_chat_writes
+import asyncio
+import os
+import socket
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.bench_llm_pool import API_KEY, start_server
+from bridge.openai_bridge import close_async_clients, get_async_client
+from dao.chat_context import ChatContextCache
+from dao.message_writer import ChatMessageWriter
+from database import Base, Character, ChatMessage, ChatSession, User, get_db
+from routes import chat_routes
+from routes.feature_routes import get_feature_by_name
+
+SESSIONS = 50
+TURNS = 5
+THINK_SECONDS = 1.0  # 用户看完回复到发出下一条消息的间隔
+TABLES = [User.__table__, Character.__table__, ChatSession.__table__, ChatMessage.__table__]
+
+
+def legacy_generate_response(session_factory):
+    """旧实现：流式内容发完后新开会话插入 AI 消息并提交，再查出会话更新 last_message 并提交，最后才发结束帧"""
+    async def generate_response(messages: list, session_id: int):
+        stream = await get_async_client().chat.completions.create(
+            model=get_feature_by_name("聊天")["model"], messages=messages, stream=True
+        )
+        accumulated_message = ""
+        async for chunk in stream:
+            if chunk.choices[0].delta.content is not None:
+                accumulated_message += chunk.choices[0].delta.content
+                yield f"data: {chunk.choices[0].delta.content}\n\n"
+        async with session_factory() as new_db:
+            ai_message = ChatMessage(session_id=session_id, content=accumulated_message, sender_type="character",
+                                     created_at=datetime.now(), updated_at=datetime.now())
+            new_db.add(ai_message)
+            await new_db.commit()
+            await new_db.refresh(ai_message)
+            chat_routes.chat_context_cache.append(session_id, "assistant", accumulated_message, ai_message.id)
+            session = (await new_db.execute(select(ChatSession).where(ChatSession.id == session_id))).scalar_one_or_none()
+            session.last_message = accumulated_message
+            session.last_message_time = datetime.now()
+            await new_db.commit()
+            yield "data:\n\n"
+
+    return generate_response
+
+
+async def run(mode: str, path: str) -> dict:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args={"timeout": 30})
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as db:
+        db.add(User(id=1, account="bench", password_hash="x"))
+        db.add(Character(id=1, name="角色", user_id=1, prompt="你是一个角色", is_used=True))
+        db.add_all([ChatSession(id=i + 1, user_id=1, character_id=1) for i in range(SESSIONS)])
+        await db.commit()
+
+    counts = {"commits": 0, "inserts": 0}
+
+    def on_commit(conn):
+        counts["commits"] += 1
+
+    def on_execute(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("INSERT INTO CHAT_MESSAGES"):
+            counts["inserts"] += 1
+
+    event.listen(engine.sync_engine, "commit", on_commit)
+    event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+
+    original_generate_response = chat_routes.generate_response
+    chat_routes.chat_context_cache = ChatContextCache(session_factory=session_factory)
+    chat_routes.chat_message_writer = ChatMessageWriter(session_factory=session_factory)
+    if mode == "legacy":
+        chat_routes.generate_response = legacy_generate_response(session_factory)
+
+    app = FastAPI()
+    app.include_router(chat_routes.router)
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    tails = []
+
+    async def chat(client: httpx.AsyncClient, session_id: int):
+        for i in range(TURNS):
+            async with client.stream("POST", f"/chat/session/{session_id}/message", json={"content": f"第 {i} 条消息"}) as response:
+                last_token = None
+                async for line in response.aiter_lines():
+                    if line.startswith("data: ") and line != "data: ":
+                        last_token = time.perf_counter()
+                tails.append(time.perf_counter() - last_token)
+            await asyncio.sleep(THINK_SECONDS)
+
+    start = time.perf_counter()
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60,
+                                 limits=httpx.Limits(max_connections=SESSIONS)) as client:
+        await asyncio.gather(*(chat(client, i + 1) for i in range(SESSIONS)))
+    elapsed = time.perf_counter() - start
+
+    server.should_exit = True
+    await serving
+    await chat_routes.chat_message_writer.close()
+    async with session_factory() as db:
+        saved = (await db.execute(
+            select(func.count()).select_from(ChatMessage).where(ChatMessage.sender_type == "character")
+        )).scalar()
+        last_messages = (await db.execute(
+            select(func.count()).select_from(ChatSession).where(ChatSession.last_message.is_not(None))
+        )).scalar()
+    await engine.dispose()
+    chat_routes.generate_response = original_generate_response
+
+    tails.sort()
+    return {
+        "mode": mode,
+        "tail_p50": statistics.median(tails) * 1000,
+        "tail_p99": tails[int(len(tails) * 0.99) - 1] * 1000,
+        "elapsed": elapsed,
+        "commits": counts["commits"],
+        "inserts": counts["inserts"],
+        "saved": saved,
+        "last_messages": last_messages,
+    }
+
+
+async def main():
+    # 回复不长，5 轮都在 token 预算内，不会触发摘要
+    os.environ["OPENAI_BASE_URL"] = start_server(delay=0.05, token_delay=0.005, reply=lambda body: "好的，我明白了。" * 20)
+    os.environ["OPENAI_API_KEY"] = API_KEY
+
+    results = []
+    for mode in ["legacy", "write-behind"]:
+        with tempfile.TemporaryDirectory() as directory:
+            results.append(await run(mode, os.path.join(directory, "chat.db")))
+    await close_async_clients()
+
+    print(f"{SESSIONS} sessions x {TURNS} turns, last token -> stream closed")
+    print(f"{'mode':<14}{'p50 ms':>9}{'p99 ms':>9}{'total s':>9}{'commits':>9}{'inserts':>9}{'replies':>9}")
+    for r in results:
+        print(f"{r['mode']:<14}{r['tail_p50']:>9.2f}{r['tail_p99']:>9.2f}{r['elapsed']:>9.2f}"
+              f"{r['commits']:>9}{r['inserts']:>9}{r['saved']:>9}")
+    # 两种方式都必须把全部回复和每个会话的 last_message 写进数据库
+    for r in results:
+        assert r["saved"] == SESSIONS * TURNS and r["last_messages"] == SESSIONS, r
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
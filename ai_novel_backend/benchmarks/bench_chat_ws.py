@@ -0,0 +1,260 @@
+# benchmarks/bench_chat_ws.py
+# WebSocket 与 SSE 聊天的负载对比：N 个并发用户，每人同时开着 2 个角色会话、每个会话聊 3 轮
+# - sse：每轮一个 POST /chat/session/{id}/message 流式请求
+# - ws：每个用户一条 /chat/ws 连接，认证一次，两个会话的回复在同一条连接上交错返回
+# 在 ASGI 层直接驱动应用（不经过网络和 HTTP/WebSocket 协议库），统计同一个事件循环里服务 N 个并发用户时
+# 每轮对话消耗的主线程 CPU、首个片段延迟和吞吐，即单个 worker 能承载的并发连接的应用层开销。
+# 大模型换成进程内的假流（解析上游 SSE 的开销两种方式相同，不计入），SQLite 在其他线程，不计入 CPU
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_chat_ws
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from auth import create_access_token
+from dao.chat_context import ChatContextCache
+from dao.message_writer import ChatMessageWriter
+from database import Base, Character, ChatMessage, ChatSession, User, get_db
+from routes import chat_routes
+
+USERS = [50, 200]
+SESSIONS_PER_USER = 2
+TURNS = 3
+STREAM_CHUNKS = 20
+TOKEN_DELAY = 0.005  # 假模型的分片间隔
+FIRST_TOKEN_DELAY = 0.05
+
+
+class FakeStream:
+    """模拟 openai 的 AsyncStream：按间隔产出 STREAM_CHUNKS 个内容分片"""
+
+    def __init__(self):
+        self.chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=f"片段{i}。"))])
+            for i in range(STREAM_CHUNKS)
+        ]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def __aiter__(self):
+        await asyncio.sleep(FIRST_TOKEN_DELAY)
+        for chunk in self.chunks:
+            await asyncio.sleep(TOKEN_DELAY)
+            yield chunk
+
+
+async def create_completion(**kwargs):
+    return FakeStream()
+
+
+fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create_completion)))
+TABLES = [User.__table__, Character.__table__, ChatSession.__table__, ChatMessage.__table__]
+
+
+async def sse_turn(app, session_id: int, content: str) -> float:
+    """按 ASGI 协议发一个流式 POST，返回首个片段的延迟"""
+    body = json.dumps({"content": content}).encode()
+    path = f"/chat/session/{session_id}/message"
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 10000), "server": ("bench", 80),
+    }
+    start = time.perf_counter()
+    first = None
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # 客户端一直在线，直到响应结束
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal first
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message
+        elif message["type"] == "http.response.body" and first is None and message.get("body", b"").startswith(b"data: "):
+            first = time.perf_counter() - start
+
+    await app(scope, receive, send)
+    return first
+
+
+class ASGIWebSocket:
+    """最小的 ASGI WebSocket 客户端"""
+
+    def __init__(self, app, path: str):
+        self.inbox = asyncio.Queue()
+        self.outbox = asyncio.Queue()
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "path": path, "raw_path": path.encode(),
+            "query_string": b"", "root_path": "", "headers": [], "subprotocols": [],
+            "client": ("127.0.0.1", 10000), "server": ("bench", 80),
+        }
+        self.task = asyncio.create_task(app(scope, self.inbox.get, self.outbox.put))
+
+    async def connect(self):
+        await self.inbox.put({"type": "websocket.connect"})
+        message = await self.outbox.get()
+        assert message["type"] == "websocket.accept", message
+
+    async def send(self, **fields):
+        await self.inbox.put({"type": "websocket.receive", "text": json.dumps(fields, ensure_ascii=False)})
+
+    async def receive(self) -> dict:
+        message = await self.outbox.get()
+        assert message["type"] == "websocket.send", message
+        return json.loads(message["text"])
+
+    async def close(self):
+        await self.inbox.put({"type": "websocket.disconnect", "code": 1000})
+        await self.task
+
+
+async def sse_user(app, user_id: int, session_ids: list, first_tokens: list):
+    async def chat(session_id: int):
+        for i in range(TURNS):
+            first_tokens.append(await sse_turn(app, session_id, f"第 {i} 条消息"))
+
+    await asyncio.gather(*(chat(session_id) for session_id in session_ids))
+
+
+async def ws_user(app, user_id: int, session_ids: list, first_tokens: list):
+    ws = ASGIWebSocket(app, "/chat/ws")
+    await ws.connect()
+    await ws.send(t="auth", token=create_access_token({"sub": str(user_id)}))
+    assert (await ws.receive())["t"] == "ok"
+    for i in range(TURNS):
+        start = time.perf_counter()
+        for session_id in session_ids:
+            await ws.send(t="send", s=session_id, c=f"第 {i} 条消息")
+        waiting = set(session_ids)
+        started = set()
+        while waiting:
+            frame = await ws.receive()
+            assert frame["t"] in ("d", "end"), frame
+            if frame["t"] == "d" and frame["s"] not in started:
+                started.add(frame["s"])
+                first_tokens.append(time.perf_counter() - start)
+            elif frame["t"] == "end":
+                waiting.discard(frame["s"])
+    await ws.close()
+
+
+async def run(mode: str, users: int, path: str) -> dict:
+    # 所有事务排队使用同一个连接：数百个并发事务时 SQLite 的锁等待会让数据库成为瓶颈，
+    # 这里比较的是传输方式本身的开销；提交也不等待刷盘
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=AsyncAdaptedQueuePool,
+                                 pool_size=1, max_overflow=0, pool_timeout=300)
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.close()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as db:
+        await db.execute(insert(User), [{"id": i + 1, "account": f"u{i}", "password_hash": "x"} for i in range(users)])
+        db.add(Character(id=1, name="角色", user_id=1, prompt="你是一个角色", is_used=True))
+        await db.execute(insert(ChatSession), [
+            {"id": i * SESSIONS_PER_USER + j + 1, "user_id": i + 1, "character_id": 1}
+            for i in range(users) for j in range(SESSIONS_PER_USER)
+        ])
+        await db.commit()
+
+    chat_routes.async_session = session_factory
+    chat_routes.chat_context_cache = ChatContextCache(session_factory=session_factory)
+    chat_routes.chat_message_writer = ChatMessageWriter(session_factory=session_factory)
+    app = FastAPI()
+    app.include_router(chat_routes.router)
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+
+    user = sse_user if mode == "sse" else ws_user
+    first_tokens = []
+    cpu = time.thread_time()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        user(app, i + 1, [i * SESSIONS_PER_USER + j + 1 for j in range(SESSIONS_PER_USER)], first_tokens)
+        for i in range(users)
+    ))
+    elapsed = time.perf_counter() - start
+    cpu = time.thread_time() - cpu
+
+    # 已认证、空闲的 WebSocket 连接在应用层占用的内存（不含协议库和内核的缓冲区）
+    idle_kb = None
+    if mode == "ws":
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        sockets = []
+        for i in range(users):
+            ws = ASGIWebSocket(app, "/chat/ws")
+            await ws.connect()
+            await ws.send(t="auth", token=create_access_token({"sub": str(i + 1)}))
+            assert (await ws.receive())["t"] == "ok"
+            sockets.append(ws)
+        idle_kb = (tracemalloc.get_traced_memory()[0] - before) / users / 1024
+        tracemalloc.stop()
+        for ws in sockets:
+            await ws.close()
+
+    await chat_routes.chat_message_writer.close()
+    await engine.dispose()
+
+    turns = users * SESSIONS_PER_USER * TURNS
+    assert len(first_tokens) == turns, (len(first_tokens), turns)
+    return {
+        "mode": mode,
+        "users": users,
+        "connections": users * SESSIONS_PER_USER if mode == "sse" else users,
+        "turns_per_s": turns / elapsed,
+        "cpu_ms": cpu / turns * 1000,
+        "ttft_p50": statistics.median(first_tokens) * 1000,
+        "idle_kb": idle_kb,
+    }
+
+
+async def main():
+    chat_routes.get_async_client = lambda: fake_client
+
+    results = []
+    for users in USERS:
+        for mode in ["sse", "ws"]:
+            with tempfile.TemporaryDirectory() as directory:
+                results.append(await run(mode, users, os.path.join(directory, "chat.db")))
+
+    print(f"{SESSIONS_PER_USER} sessions per user x {TURNS} turns; connections = concurrent streams (sse) / sockets (ws)")
+    print(f"{'mode':<6}{'users':>7}{'conns':>7}{'turns/s':>10}{'cpu ms/turn':>13}{'ttft p50 ms':>13}{'idle KB/conn':>14}")
+    for r in results:
+        idle = f"{r['idle_kb']:.1f}" if r["idle_kb"] is not None else "-"
+        print(f"{r['mode']:<6}{r['users']:>7}{r['connections']:>7}{r['turns_per_s']:>10.1f}{r['cpu_ms']:>13.2f}"
+              f"{r['ttft_p50']:>13.1f}{idle:>14}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+# benchmarks/bench_event_loop.py
+# 事件循环阻塞检查：慢速假 LLM 生成进行中，同时请求健康检查，对比同步 bridge.chat 与 chat_async
+# 同步调用会让健康检查排队到生成结束；异步调用下健康检查应在毫秒级返回
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_event_loop
+import asyncio
+import sys
+import time
+
+import httpx
+import openai
+from fastapi import FastAPI
+
+from benchmarks.bench_llm_pool import API_KEY, chapter_messages, start_server
+from bridge.openai_bridge import OpenAIBridge, close_async_clients
+
+LLM_DELAY = 1.0
+GENERATIONS = 4
+HEALTH_CHECKS = 20
+HEALTH_INTERVAL = 0.1
+HEALTH_BUDGET_MS = 50
+
+
+def build_app(bridge: OpenAIBridge, use_async: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.post("/generate")
+    async def generate():
+        if use_async:
+            content = await bridge.chat_async(chapter_messages(1), {"model": "bench"})
+        else:
+            content = bridge.chat(chapter_messages(1), {"model": "bench"})
+        return {"length": len(content)}
+
+    return app
+
+
+async def run(app: FastAPI) -> float:
+    """健康检查按固定间隔排期，延迟从排期时刻算起，事件循环被占用的时间也计算在内"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        async def health_checks() -> float:
+            worst = 0.0
+            start = time.perf_counter()
+            for i in range(HEALTH_CHECKS):
+                scheduled = start + i * HEALTH_INTERVAL
+                await asyncio.sleep(max(scheduled - time.perf_counter(), 0))
+                response = await client.get("/health")
+                assert response.status_code == 200
+                worst = max(worst, time.perf_counter() - scheduled)
+            return worst
+
+        checks = asyncio.create_task(health_checks())
+        await asyncio.sleep(HEALTH_INTERVAL)
+        generations = [client.post("/generate") for _ in range(GENERATIONS)]
+        for response in await asyncio.gather(*generations):
+            assert response.status_code == 200, response.text
+        worst = await checks
+    return worst * 1000
+
+
+async def main():
+    base_url = start_server(LLM_DELAY)
+    # 同步 chat 走 openai 模块级客户端
+    openai.base_url = base_url + "/"
+    openai.api_key = API_KEY
+    bridge = OpenAIBridge()
+    bridge.init({"base_url": base_url, "api_key": API_KEY})
+
+    print(f"{GENERATIONS} generations x {LLM_DELAY:.1f}s fake LLM, {HEALTH_CHECKS} health checks")
+    print(f"{'mode':<14}{'worst health ms':>18}")
+    results = {}
+    for name, use_async in [("sync chat", False), ("chat_async", True)]:
+        results[name] = await run(build_app(bridge, use_async))
+        print(f"{name:<14}{results[name]:>18.1f}")
+    await close_async_clients()
+    if results["chat_async"] > HEALTH_BUDGET_MS:
+        print(f"健康检查超过 {HEALTH_BUDGET_MS}ms，事件循环仍被阻塞")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
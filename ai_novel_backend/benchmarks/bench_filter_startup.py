@@ -0,0 +1,76 @@
+# benchmarks/bench_filter_startup.py
+# 敏感词过滤器启动基准：每种模式在独立子进程中测量构建耗时和常驻内存(RSS)增量
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_filter_startup
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+WORDS_FILE = "./my_filter/sensitive_words.txt"
+
+
+def rss_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def build_legacy():
+    """旧实现：词集合 + 布隆过滤器集合 + (行号, 词) 元组负载，每次启动都重新构建"""
+    import ahocorasick
+    words, bloom = set(), set()
+    ac = ahocorasick.Automaton()
+    with open(WORDS_FILE, "r", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            word = line.strip()
+            if word:
+                words.add(word)
+                bloom.add(word)
+                ac.add_word(word, (i, word))
+    ac.make_automaton()
+    return words, bloom, ac
+
+
+def measure(mode: str, cache_dir: str) -> dict:
+    import ahocorasick  # noqa: F401  模块本身的内存不计入
+    from my_filter.sesitive_filter import SensitiveWordFilter
+
+    before = rss_kb()
+    start = time.perf_counter()
+    if mode == "legacy":
+        instance = build_legacy()
+    else:
+        instance = SensitiveWordFilter(WORDS_FILE, cache_dir=cache_dir)
+    elapsed = time.perf_counter() - start
+    return {"mode": mode, "ms": elapsed * 1000, "rss_kb": rss_kb() - before, "_keep": id(instance)}
+
+
+def run_child(mode: str, cache_dir: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_filter_startup", mode, cache_dir],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        results = [
+            run_child("legacy", cache_dir),
+            run_child("cold", cache_dir),   # 无缓存：构建并写入缓存
+            run_child("warm", cache_dir),   # 有缓存：直接加载
+        ]
+    print(f"{'mode':<10}{'startup ms':>12}{'RSS +KB':>10}")
+    for result in results:
+        print(f"{result['mode']:<10}{result['ms']:>12.1f}{result['rss_kb']:>10}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        print(json.dumps(measure(sys.argv[1], sys.argv[2])))
+    else:
+        main()
@@ -0,0 +1,110 @@
+# benchmarks/bench_listing_queries.py
+# 列表接口查询次数检查：角色数从 1 增加到 50，GET /character/{user_id} 与 GET /spirate/{id}
+# 的 SQL 语句数必须保持不变，出现 N+1 查询时以非零状态退出
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_listing_queries
+import asyncio
+import os
+import sys
+import tempfile
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Character, ChatSession, InspirationResult, User, get_db
+from routes import character_routes, spirate_routes
+
+CHARACTER_COUNTS = [1, 5, 50]
+TABLES = [User.__table__, Character.__table__, ChatSession.__table__, InspirationResult.__table__]
+
+
+async def seed(session_factory, count: int) -> int:
+    """写入一个用户、count 个角色（一半有会话）和一个引用全部角色的灵感，返回灵感 id"""
+    async with session_factory() as db:
+        user = User(id=1, account="bench", password_hash="x")
+        db.add(user)
+        characters = [
+            Character(name=f"角色{i}", description="描述", user_id=1, prompt="提示词", is_used=True)
+            for i in range(count)
+        ]
+        db.add_all(characters)
+        await db.flush()
+        db.add_all([
+            ChatSession(user_id=1, character_id=character.id)
+            for character in characters[::2]
+        ])
+        inspiration = InspirationResult(
+            title="灵感", characters=[character.id for character in reversed(characters)],
+            content="正文", user_id=1, story_direction=["方向"]
+        )
+        db.add(inspiration)
+        await db.commit()
+        return inspiration.id
+
+
+async def measure(count: int, path: str) -> dict:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    inspiration_id = await seed(session_factory, count)
+
+    app = FastAPI()
+    app.include_router(character_routes.router)
+    app.include_router(spirate_routes.router)
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+
+    statements = 0
+
+    def on_execute(*args):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+    counts = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        statements = 0
+        response = await client.get("/character/1")
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert len(body) == count
+        with_session = [item for item in body if item["session_id"] is not None]
+        assert len(with_session) == (count + 1) // 2, "session_id 未附加到角色上"
+        counts["/character/{user_id}"] = statements
+
+        statements = 0
+        response = await client.get(f"/spirate/{inspiration_id}")
+        assert response.status_code == 200, response.text
+        ids = [item["id"] for item in response.json()["characters"]]
+        assert ids == sorted(ids, reverse=True), "角色顺序与灵感中保存的不一致"
+        counts["/spirate/{id}"] = statements
+    await engine.dispose()
+    return counts
+
+
+async def main():
+    results = {}
+    for count in CHARACTER_COUNTS:
+        with tempfile.TemporaryDirectory() as directory:
+            results[count] = await measure(count, os.path.join(directory, "listing.db"))
+
+    endpoints = list(results[CHARACTER_COUNTS[0]])
+    print(f"{'characters':>10}" + "".join(f"{name:>24}" for name in endpoints))
+    for count, counts in results.items():
+        print(f"{count:>10}" + "".join(f"{counts[name]:>24}" for name in endpoints))
+
+    failed = [name for name in endpoints if len({counts[name] for counts in results.values()}) != 1]
+    if failed:
+        print(f"查询次数随角色数增长（N+1）：{', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,156 @@
+# benchmarks/bench_llm_pool.py
+# LLM 连接池基准：本地假 OpenAI 接口上并发生成章节，对比连接复用数和 p50/p99 延迟
+# - sync requests：旧的 requests.post 调用（在事件循环中阻塞）
+# - per-call client：每次请求新建 AsyncOpenAI（路由里原来的写法）
+# - pooled：OpenAIBridge.chat_async，进程级共享连接池
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_llm_pool
+import asyncio
+import json
+import socket
+import statistics
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from openai import AsyncOpenAI
+
+from bridge.openai_bridge import OpenAIBridge, close_async_clients
+
+CHAPTERS = 200
+CONCURRENCY = 20
+LLM_DELAY = 0.05  # 假接口的生成耗时
+API_KEY = "sk-bench"
+STREAM_CHUNKS = 20  # 流式响应的分片数
+
+# 服务端看到的客户端端口，每个端口对应一条 TCP 连接
+connections = set()
+
+
+def stream_chunks(model: str, content: str, token_delay: float, include_usage: bool):
+    """按 OpenAI 流式格式输出：内容分片、结束分片、可选的用量分片和 [DONE]"""
+    base = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+    size = max(len(content) // STREAM_CHUNKS, 1)
+
+    def frame(payload: dict) -> str:
+        return f"data: {json.dumps({**base, **payload}, ensure_ascii=False)}\n\n"
+
+    async def generate():
+        for start in range(0, len(content), size):
+            if token_delay:
+                await asyncio.sleep(token_delay)
+            yield frame({"choices": [{"index": 0, "delta": {"content": content[start:start + size]}, "finish_reason": None}]})
+        yield frame({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if include_usage:
+            yield frame({"choices": [], "usage": {"prompt_tokens": 100, "completion_tokens": len(content), "total_tokens": 100 + len(content)}})
+        yield "data: [DONE]\n\n"
+
+    return generate()
+
+
+def build_fake_llm(delay: float = LLM_DELAY, token_delay: float = 0, on_request=None, reply=None) -> FastAPI:
+    """
+    假 OpenAI 接口：delay 为首个 token 前的耗时，token_delay 为流式分片间隔，
+    on_request(body) 在收到请求时调用，reply(body) 返回回复内容（默认固定的章节正文）
+    """
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        connections.add(request.client.port)
+        body = await request.json()
+        if on_request is not None:
+            on_request(body)
+        await asyncio.sleep(delay)
+        content = reply(body) if reply is not None else "第一章 正文" * 200
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            return StreamingResponse(
+                stream_chunks(body["model"], content, token_delay, include_usage),
+                media_type="text/event-stream"
+            )
+        return {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+        }
+
+    return app
+
+
+def start_server(delay: float = LLM_DELAY, token_delay: float = 0, on_request=None, reply=None) -> str:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    app = build_fake_llm(delay, token_delay, on_request, reply)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def chapter_messages(i: int) -> list:
+    return [
+        {"role": "system", "content": "你是一位小说作家"},
+        {"role": "user", "content": f"请写第{i}章"},
+    ]
+
+
+async def run(name: str, generate) -> dict:
+    connections.clear()
+    latencies = []
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await generate(i)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(CHAPTERS)))
+    elapsed = time.perf_counter() - start
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "mode": name,
+        "p50": quantiles[49] * 1000,
+        "p99": quantiles[98] * 1000,
+        "total": elapsed,
+        "connections": len(connections),
+    }
+
+
+async def main():
+    base_url = start_server()
+    bridge = OpenAIBridge()
+    bridge.init({"base_url": base_url, "api_key": API_KEY})
+
+    async def sync_requests(i):
+        bridge.function_call(chapter_messages(i), [], {"model": "bench"})
+
+    async def per_call_client(i):
+        client = AsyncOpenAI(base_url=base_url, api_key=API_KEY)
+        await client.chat.completions.create(model="bench", messages=chapter_messages(i))
+
+    async def pooled(i):
+        await bridge.chat_async(chapter_messages(i), {"model": "bench"})
+
+    print(f"{CHAPTERS} chapters, concurrency {CONCURRENCY}, fake LLM delay {LLM_DELAY * 1000:.0f}ms")
+    print(f"{'mode':<18}{'p50 ms':>10}{'p99 ms':>10}{'total s':>10}{'connections':>13}")
+    for name, generate in [("sync requests", sync_requests), ("per-call client", per_call_client), ("pooled", pooled)]:
+        result = await run(name, generate)
+        print(f"{result['mode']:<18}{result['p50']:>10.1f}{result['p99']:>10.1f}{result['total']:>10.2f}{result['connections']:>13}")
+    await close_async_clients()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+# benchmarks/bench_normalized_filter.py
+# 归一化匹配开销基准：对比直接在原文上匹配与先归一化（全角/繁体/插入标点）再匹配的吞吐量
+# 预算：归一化后的吞吐量不低于原文直接匹配的 1/BUDGET
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_normalized_filter
+import random
+import sys
+import time
+
+from benchmarks.bench_sensitive_filter import CHAPTER_SIZES, ROUNDS, make_chapter
+from my_filter.sesitive_filter import SensitiveWordFilter
+
+WORDS_FILE = "./my_filter/sensitive_words.txt"
+BUDGET = 3.0
+STREAM_CHUNK = 8
+
+
+def raw_filter_text(word_filter: SensitiveWordFilter, text: str, replacement: str = '*') -> str:
+    """归一化之前的实现：直接在原文上匹配"""
+    result = None
+    for end_index, length in word_filter.ac.iter(text):
+        if result is None:
+            result = list(text)
+        start_index = end_index - length + 1
+        result[start_index:end_index + 1] = replacement * length
+    if result is None:
+        return text
+    return ''.join(result)
+
+
+def raw_stream(word_filter: SensitiveWordFilter, text: str):
+    """原文直接匹配的流式版本，只保留自动机状态，不做归一化"""
+    search = None
+    for i in range(0, len(text), STREAM_CHUNK):
+        chunk = text[i:i + STREAM_CHUNK]
+        if search is None:
+            search = word_filter.ac.iter(chunk)
+        else:
+            search.set(chunk)
+        for _ in search:
+            pass
+
+
+def normalized_stream(word_filter: SensitiveWordFilter, text: str):
+    stream = word_filter.stream_filter()
+    for i in range(0, len(text), STREAM_CHUNK):
+        stream.feed(text[i:i + STREAM_CHUNK])
+    stream.flush()
+
+
+def obfuscate(text: str, seed: int = 7) -> str:
+    """把部分字符换成全角并随机插入空格，模拟绕过写法"""
+    rng = random.Random(seed)
+    chars = []
+    for char in text:
+        if '!' <= char <= '~' and rng.random() < 0.5:
+            char = chr(ord(char) + 0xFEE0)
+        chars.append(char)
+        if rng.random() < 0.05:
+            chars.append(' ')
+    return ''.join(chars)
+
+
+def chars_per_second(func, text: str) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return len(text) / best
+
+
+def main():
+    word_filter = SensitiveWordFilter(WORDS_FILE)
+    words = sorted(word_filter.ac.keys())
+    cases = [
+        ("filter_text", lambda t: raw_filter_text(word_filter, t), word_filter.filter_text),
+        ("stream", lambda t: raw_stream(word_filter, t), lambda t: normalized_stream(word_filter, t)),
+    ]
+    print(f"budget: normalized cost <= {BUDGET:.1f}x raw")
+    print(f"{'case':<14}{'chars':>8}{'raw chars/s':>16}{'norm chars/s':>16}{'cost':>8}")
+    over_budget = False
+    for size in CHAPTER_SIZES:
+        text = obfuscate(make_chapter(size, words))
+        for name, raw, normalized in cases:
+            raw_cps = chars_per_second(raw, text)
+            norm_cps = chars_per_second(normalized, text)
+            cost = raw_cps / norm_cps
+            over_budget = over_budget or cost > BUDGET
+            print(f"{name:<14}{size:>8}{raw_cps:>16,.0f}{norm_cps:>16,.0f}{cost:>7.2f}x")
+    if over_budget:
+        print("超出吞吐量预算")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
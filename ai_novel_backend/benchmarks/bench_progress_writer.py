@@ -0,0 +1,95 @@
+# benchmarks/bench_progress_writer.py
+# 进度写入基准：多个任务并发上报进度，对比每次进度都提交与 ProgressWriter 合并写入的提交次数
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_progress_writer
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import event, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from dao.progress_writer import ProgressWriter
+from database import Base, Task
+
+TASKS = 50
+STEPS = 10
+STEP_DELAY = 0.1
+FLUSH_SECONDS = 0.5
+
+
+async def direct_progress(session_factory, task_id: int, values: dict):
+    """旧实现：每次进度更新都单独开会话、UPDATE 并提交"""
+    async with session_factory() as db:
+        await db.execute(update(Task).where(Task.id == task_id).values(**values))
+        await db.commit()
+
+
+async def run_task(set_progress, task_id: int):
+    for step in range(1, STEPS + 1):
+        await asyncio.sleep(STEP_DELAY)
+        await set_progress(task_id, {"completion_percentage": step * 100 // (STEPS + 1), "updated_at": datetime.utcnow()})
+    await set_progress(task_id, {"completion_percentage": 100, "status": "completed"}, terminal=True)
+
+
+async def run(mode: str, path: str) -> dict:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args={"timeout": 30})
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[Task.__table__])
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as db:
+        db.add_all([
+            Task(user_id=1, task_type="INSPIRATION", result_type="INSPIRATION", prompt=f"灵感 {i}",
+                 status="processing", completion_percentage=0)
+            for i in range(TASKS)
+        ])
+        await db.commit()
+        task_ids = (await db.execute(select(Task.id))).scalars().all()
+
+    commits = 0
+
+    def on_commit(conn):
+        nonlocal commits
+        commits += 1
+
+    event.listen(engine.sync_engine, "commit", on_commit)
+    if mode == "direct":
+        async def set_progress(task_id, values, terminal=False):
+            await direct_progress(session_factory, task_id, values)
+        writer = None
+    else:
+        writer = ProgressWriter(Task, flush_seconds=FLUSH_SECONDS, session_factory=session_factory)
+        set_progress = writer.set
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_task(set_progress, task_id) for task_id in task_ids))
+    if writer is not None:
+        await writer.close()
+    elapsed = time.perf_counter() - start
+    event.remove(engine.sync_engine, "commit", on_commit)
+
+    async with session_factory() as db:
+        completed = (await db.execute(
+            select(func.count()).select_from(Task)
+            .where(Task.status == "completed", Task.completion_percentage == 100)
+        )).scalar()
+    await engine.dispose()
+    return {"mode": mode, "commits": commits, "elapsed": elapsed, "completed": completed}
+
+
+async def main():
+    print(f"{TASKS} tasks x {STEPS} progress updates every {STEP_DELAY * 1000:.0f}ms, flush every {FLUSH_SECONDS}s")
+    print(f"{'mode':<10}{'commits':>9}{'seconds':>9}{'completed':>11}")
+    results = {}
+    for mode in ["direct", "writer"]:
+        with tempfile.TemporaryDirectory() as directory:
+            results[mode] = await run(mode, os.path.join(directory, "tasks.db"))
+        r = results[mode]
+        print(f"{r['mode']:<10}{r['commits']:>9}{r['elapsed']:>9.2f}{r['completed']:>11}")
+    print(f"commit reduction: {results['direct']['commits'] / results['writer']['commits']:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
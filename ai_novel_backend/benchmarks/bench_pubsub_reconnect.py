@@ -0,0 +1,133 @@
+# benchmarks/bench_pubsub_reconnect.py
+# Redis 通道断线重连检查：两个 worker 的 RedisChannel 连同一个进程内的假 Redis，
+# 发布消息后断开订阅连接，确认订阅方退避重连、补发一次失效通知，之后的消息照常送达；
+# 同时统计从断线到重新订阅的耗时和重连尝试次数（断线期间假 Redis 拒绝前 FAILED_ATTEMPTS 次订阅）
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_pubsub_reconnect
+import asyncio
+import sys
+import time
+
+from util.pubsub import Channel, RedisChannel
+
+RECONNECT_DELAY = 0.05
+MAX_RECONNECT_DELAY = 0.2
+FAILED_ATTEMPTS = 3
+
+
+class FakeRedis:
+    """只实现 RedisChannel 用到的 publish / pubsub 接口"""
+
+    def __init__(self):
+        self.subscribers = []
+        self.refuse = 0  # 接下来拒绝的订阅次数，模拟 Redis 暂时不可用
+        self.subscribe_calls = 0
+
+    async def publish(self, channel: str, message: str):
+        for pubsub in list(self.subscribers):
+            if channel in pubsub.channels:
+                pubsub.queue.put_nowait({"type": "message", "channel": channel.encode(), "data": message.encode()})
+        return len(self.subscribers)
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+    def disconnect(self):
+        """断开所有订阅连接"""
+        for pubsub in list(self.subscribers):
+            pubsub.queue.put_nowait(ConnectionError("Connection closed by server."))
+        self.subscribers.clear()
+
+
+class FakePubSub:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.channels = set()
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, channel: str):
+        self.redis.subscribe_calls += 1
+        if self.redis.refuse:
+            self.redis.refuse -= 1
+            raise ConnectionError("Error connecting to fake redis.")
+        self.channels.add(channel)
+        self.redis.subscribers.append(self)
+        self.queue.put_nowait({"type": "subscribe", "channel": channel.encode(), "data": 1})
+
+    async def unsubscribe(self, channel: str):
+        self.channels.discard(channel)
+
+    async def listen(self):
+        while True:
+            item = await self.queue.get()
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    async def reset(self):
+        self.channels.clear()
+        if self in self.redis.subscribers:
+            self.redis.subscribers.remove(self)
+
+
+async def wait_for(condition, timeout: float = 5.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            return False
+        await asyncio.sleep(0.001)
+    return True
+
+
+async def main():
+    failed = []
+
+    def check(name: str, ok: bool):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+        if not ok:
+            failed.append(name)
+
+    try:
+        Channel("features")
+        check("Channel is abstract", False)
+    except TypeError:
+        check("Channel is abstract", True)
+
+    redis = FakeRedis()
+    publisher = RedisChannel("features", client=redis, reconnect_delay=RECONNECT_DELAY,
+                             max_reconnect_delay=MAX_RECONNECT_DELAY)
+    subscriber = RedisChannel("features", client=redis, reconnect_delay=RECONNECT_DELAY,
+                              max_reconnect_delay=MAX_RECONNECT_DELAY)
+    received = []
+    subscriber.subscribe(received.append)
+    await subscriber.start()
+
+    await publisher.publish("1")
+    check("message delivered", await wait_for(lambda: received == ["1"]))
+
+    redis.refuse = FAILED_ATTEMPTS
+    calls = redis.subscribe_calls
+    start = time.perf_counter()
+    redis.disconnect()
+    resubscribed = await wait_for(lambda: len(redis.subscribers) == 1)
+    elapsed = time.perf_counter() - start
+    check("listener resubscribes after the connection drops", resubscribed)
+    check("resync message dispatched after reconnect", received == ["1", ""])
+    attempts = redis.subscribe_calls - calls
+    check(f"{attempts} subscribe attempts for {FAILED_ATTEMPTS} refusals", attempts == FAILED_ATTEMPTS + 1)
+
+    await publisher.publish("2")
+    check("messages delivered after reconnect", await wait_for(lambda: received[-1:] == ["2"]))
+    check("listener task still running", subscriber._task is not None and not subscriber._task.done())
+
+    await subscriber.close()
+    check("close unsubscribes", not redis.subscribers)
+
+    # 退避：0.05 + 0.1 + 0.2 + 0.2（封顶）
+    print(f"reconnect after {FAILED_ATTEMPTS} refusals: {elapsed * 1000:.0f} ms "
+          f"(delay {RECONNECT_DELAY}s doubling, max {MAX_RECONNECT_DELAY}s)")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
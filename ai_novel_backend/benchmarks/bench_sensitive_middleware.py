@@ -0,0 +1,83 @@
+# benchmarks/bench_sensitive_middleware.py
+# 敏感词中间件负载基准：50KB 的 PUT /novels/{id}/updateNovel，对比有无过滤时的 p50/p99 延迟
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_sensitive_middleware
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.bench_sensitive_filter import make_chapter
+from my_filter.sesitive_filter import SensitiveWordMiddleware, get_filter
+from schemas import NovelUpdate
+
+BODY_SIZE = 50 * 1024
+REQUESTS = 500
+CONCURRENCY = 20
+
+
+def build_app(with_filter: bool) -> FastAPI:
+    """与 novel_routes.update_novel 同签名的轻量应用，不访问数据库"""
+    app = FastAPI()
+
+    @app.put("/novels/{novel_id}/updateNovel")
+    async def update_novel(novel_id: int, new_novel: NovelUpdate):
+        return {"id": novel_id, "chapters": len(new_novel.chapters or [])}
+
+    if with_filter:
+        app.add_middleware(SensitiveWordMiddleware, word_filter=get_filter(), routes=app.routes)
+    return app
+
+
+def build_payload() -> bytes:
+    # 干净的正文，保证请求会穿过中间件到达路由
+    content = make_chapter(BODY_SIZE // 3, [])
+    for word in get_filter().find_sensitive_words(content):
+        content = content.replace(word, "")
+    payload = {
+        "title": "基准测试",
+        "description": "50KB 章节保存",
+        "chapters": [{"order": 0, "title": "第一章", "content": content, "summary": ""}],
+    }
+    return json.dumps(payload, ensure_ascii=False).encode()
+
+
+async def run(app: FastAPI, body: bytes) -> list:
+    latencies = []
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.put(
+                    "/novels/1/updateNovel",
+                    content=body,
+                    headers={"Content-Type": "application/json"},
+                )
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+
+        await asyncio.gather(*(one() for _ in range(REQUESTS)))
+    return latencies
+
+
+def percentile(values: list, p: float) -> float:
+    return statistics.quantiles(values, n=100)[int(p) - 1] * 1000
+
+
+async def main():
+    body = build_payload()
+    print(f"body size: {len(body)} bytes, {REQUESTS} requests, concurrency {CONCURRENCY}")
+    print(f"{'mode':<16}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, with_filter in [("no filter", False), ("with filter", True)]:
+        app = build_app(with_filter)
+        await run(app, body)  # 预热
+        latencies = await run(app, body)
+        print(f"{name:<16}{percentile(latencies, 50):>10.2f}{percentile(latencies, 99):>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
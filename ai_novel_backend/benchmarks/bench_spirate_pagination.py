@@ -0,0 +1,113 @@
+# benchmarks/bench_spirate_pagination.py
+# 灵感分页基准：一个用户 20000 条灵感，对比 OFFSET 分页与游标分页在不同翻页深度下的单页耗时和 SQL 语句数
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_spirate_pagination
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import event, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, InspirationResult, get_db
+from routes import spirate_routes
+
+ROWS = 20000
+OTHER_USERS_ROWS = 20000
+PAGE_SIZE = 20
+DEPTHS = [1, 50, 250, 1000]
+REPEAT = 20
+
+
+async def seed(session_factory):
+    start = datetime(2024, 1, 1)
+    rows = [
+        {"title": f"灵感 {i}", "content": "正文", "user_id": 1, "characters": [], "story_direction": [],
+         # 每 10 条共用一个创建时间，验证 id 作为第二排序键
+         "created_at": start + timedelta(minutes=i // 10), "updated_at": start}
+        for i in range(ROWS)
+    ] + [
+        {"title": f"其他 {i}", "content": "正文", "user_id": 2 + i % 50, "characters": [], "story_direction": [],
+         "created_at": start + timedelta(minutes=i), "updated_at": start}
+        for i in range(OTHER_USERS_ROWS)
+    ]
+    async with session_factory() as db:
+        await db.execute(insert(InspirationResult), rows)
+        await db.commit()
+
+
+async def cursor_for_page(session_factory, page: int):
+    """取第 page 页之前最后一条记录的游标，模拟客户端一路翻到该页"""
+    if page == 1:
+        return None
+    async with session_factory() as db:
+        row = (await db.execute(
+            select(InspirationResult)
+            .where(InspirationResult.user_id == 1)
+            .order_by(InspirationResult.created_at.desc(), InspirationResult.id.desc())
+            .offset((page - 1) * PAGE_SIZE - 1).limit(1)
+        )).scalar_one()
+    return spirate_routes.encode_spirate_cursor(row)
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'spirate.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=[InspirationResult.__table__])
+        session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        await seed(session_factory)
+
+        app = FastAPI()
+        app.include_router(spirate_routes.router)
+
+        async def override_get_db():
+            async with session_factory() as session:
+                yield session
+
+        app.dependency_overrides[get_db] = override_get_db
+
+        statements = 0
+
+        def on_execute(*args):
+            nonlocal statements
+            statements += 1
+
+        event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+
+        print(f"{ROWS} rows for the user, page size {PAGE_SIZE}, median of {REPEAT} requests")
+        print(f"{'page':>6}{'offset ms':>12}{'cursor ms':>12}{'offset stmts':>14}{'cursor stmts':>14}")
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for page in DEPTHS:
+                cursor = await cursor_for_page(session_factory, page)
+                results = {}
+                for mode in ["offset", "cursor"]:
+                    params = {"pageSize": PAGE_SIZE, "page": page}
+                    if mode == "cursor" and cursor:
+                        params["cursor"] = cursor
+                    timings = []
+                    pages = []
+                    for _ in range(REPEAT):
+                        if mode == "offset":
+                            # 旧实现每次都查总数
+                            spirate_routes.spirate_count_cache.clear()
+                        statements = 0
+                        start = time.perf_counter()
+                        response = await client.get("/spirate/user/1", params=params)
+                        timings.append(time.perf_counter() - start)
+                        assert response.status_code == 200, response.text
+                        pages.append([item["id"] for item in response.json()["data"]])
+                    timings.sort()
+                    results[mode] = (timings[len(timings) // 2] * 1000, statements, pages[-1])
+                assert results["offset"][2] == results["cursor"][2], "两种分页方式返回的数据不一致"
+                print(f"{page:>6}{results['offset'][0]:>12.2f}{results['cursor'][0]:>12.2f}"
+                      f"{results['offset'][1]:>14}{results['cursor'][1]:>14}")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
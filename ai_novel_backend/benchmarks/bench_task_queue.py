@@ -0,0 +1,111 @@
+# benchmarks/bench_task_queue.py
+# 任务队列吞吐量基准：假 LLM（固定耗时）+ SQLite 临时库，对比不同 worker 数的吞吐量和最大并发，
+# 并验证租约过期的 processing 任务会被重新认领
+# 用法（在 ai_novel_backend 目录下）：python -m benchmarks.bench_task_queue
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from dao.task_queue import TaskQueue
+from database import Base, Task
+
+TASKS = 200
+LLM_DELAY = 0.05
+WORKER_COUNTS = [1, 4, 16]
+ORPHANS = 5
+
+
+class FakeLLMHandler:
+    """模拟 process_task：调用一次假 LLM，然后把任务标记为完成"""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, task_id: int, payload: dict):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(LLM_DELAY)
+        finally:
+            self.running -= 1
+        async with self.session_factory() as db:
+            await db.execute(
+                update(Task).where(Task.id == task_id)
+                .values(status="completed", completion_percentage=100, updated_at=datetime.utcnow())
+            )
+            await db.commit()
+
+
+async def insert_tasks(session_factory, count: int, **values):
+    async with session_factory() as db:
+        for i in range(count):
+            db.add(Task(
+                user_id=1, task_type="INSPIRATION", result_type="INSPIRATION",
+                prompt=f"灵感 {i}", payload={"task_type": "INSPIRATION", "prompt": f"灵感 {i}"},
+                completion_percentage=0, **values
+            ))
+        await db.commit()
+
+
+async def wait_until_done(session_factory):
+    while True:
+        async with session_factory() as db:
+            remaining = (await db.execute(
+                select(func.count()).select_from(Task).where(Task.status.in_(["pending", "processing"]))
+            )).scalar()
+        if not remaining:
+            return
+        await asyncio.sleep(0.02)
+
+
+async def run(workers: int, path: str) -> dict:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args={"timeout": 30})
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=[Task.__table__])
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    await insert_tasks(session_factory, TASKS, status="pending")
+    # 模拟上次进程崩溃遗留的任务：processing 且租约已过期
+    await insert_tasks(session_factory, ORPHANS, status="processing", attempts=1,
+                       lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+
+    handler = FakeLLMHandler(session_factory)
+    queue = TaskQueue(handler, session_factory=session_factory, workers=workers, poll_seconds=0.05)
+    start = time.perf_counter()
+    queue.start()
+    await wait_until_done(session_factory)
+    elapsed = time.perf_counter() - start
+    await queue.stop()
+
+    async with session_factory() as db:
+        completed = (await db.execute(
+            select(func.count()).select_from(Task).where(Task.status == "completed")
+        )).scalar()
+    await engine.dispose()
+    return {
+        "workers": workers,
+        "tasks_per_s": (TASKS + ORPHANS) / elapsed,
+        "max_running": handler.max_running,
+        "completed": completed,
+    }
+
+
+async def main():
+    print(f"{TASKS} tasks + {ORPHANS} orphaned, fake LLM {LLM_DELAY * 1000:.0f}ms")
+    print(f"{'workers':>8}{'tasks/s':>10}{'max concurrent':>16}{'completed':>11}")
+    for workers in WORKER_COUNTS:
+        with tempfile.TemporaryDirectory() as directory:
+            result = await run(workers, os.path.join(directory, "tasks.db"))
+        print(f"{result['workers']:>8}{result['tasks_per_s']:>10.1f}{result['max_running']:>16}{result['completed']:>11}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,13 +1,79 @@
 import os
+import importlib.util
+import time
+import httpx
 from httpx import request
 import openai
-from typing import Dict, List, Optional, Any
+from openai import AsyncOpenAI
+from typing import Dict, List, Optional, Any, Tuple
 import json
 import requests
 
 from schemas import GenerateImageRequest
 
 
+# 进程级连接池配置，可通过环境变量调整
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 100))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 20))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 600))
+# HTTP/2 需要安装 h2（pip install httpx[http2]），未安装时退回 HTTP/1.1 keep-alive
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+# 流式请求是否带 stream_options={"include_usage": True} 取回 token 用量；
+# 不支持该参数的兼容接口可以整体关闭，也可以在调用的 options 里传 include_usage=False
+LLM_STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "1") == "1"
+
+# 每个 (base_url, api_key) 共用一个 httpx.AsyncClient 和一个 AsyncOpenAI
+_http_clients: Dict[Tuple[Optional[str], Optional[str]], httpx.AsyncClient] = {}
+_openai_clients: Dict[Tuple[Optional[str], Optional[str]], AsyncOpenAI] = {}
+# 拒绝过 stream_options 的 base_url，之后的流式请求不再携带
+_no_stream_usage = set()
+
+
+def get_http_client(base_url: Optional[str] = None, api_key: Optional[str] = None) -> httpx.AsyncClient:
+    """
+    获取共享的 httpx.AsyncClient
+
+    连接保持 keep-alive 并在所有请求间复用，避免每次调用都重新建立 TCP/TLS 连接。
+    客户端绑定在应用的事件循环上，不要在其他线程的 asyncio.run 中使用。
+    """
+    key = (base_url or None, api_key or None)
+    client = _http_clients.get(key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=LLM_HTTP2,
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0),
+        )
+        _http_clients[key] = client
+        _openai_clients.pop(key, None)
+    return client
+
+
+def get_async_client(base_url: Optional[str] = None, api_key: Optional[str] = None) -> AsyncOpenAI:
+    """获取共享的 AsyncOpenAI 客户端；base_url/api_key 为空时与 AsyncOpenAI() 一样读取环境变量"""
+    key = (base_url or None, api_key or None)
+    http_client = get_http_client(*key)
+    client = _openai_clients.get(key)
+    if client is None:
+        client = AsyncOpenAI(base_url=key[0], api_key=key[1], http_client=http_client)
+        _openai_clients[key] = client
+    return client
+
+
+async def close_async_clients():
+    """应用关闭时释放连接池"""
+    clients = list(_http_clients.values())
+    _http_clients.clear()
+    _openai_clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
 # 单例模式
 class OpenAIBridge:
     _instance = None
@@ -128,6 +194,151 @@ class OpenAIBridge:
             raise e
         
             
+    async def chat_async(self, messages: List[Dict], options: Dict = {}) -> str:
+        """基础聊天请求（异步），使用共享连接池，不阻塞事件循环"""
+        try:
+            client = get_async_client(self.base_url, self.api_key)
+            response = await client.chat.completions.create(
+                model=options.get('model', 'gpt-4o-mini'),
+                messages=[
+                    {
+                        'role': msg['role'],
+                        'content': msg['content']
+                    }
+                    for msg in messages
+                ],
+                stream=False,
+            )
+            return response.choices[0].message.content
+        except Exception as e:
+            print('OpenAI chat error:', str(e))
+            raise e
+
+    async def chat_stream_async(self, messages: List[Dict], options: Dict = {}, usage: Optional[Dict] = None):
+        """
+        流式聊天请求（异步），逐块产出文本
+
+        传入 usage 字典时回填 token 用量（接口返回时）、首字耗时和总耗时，
+        用于按任务记账。接口以 400/422 拒绝 stream_options 时去掉该参数重试一次，
+        并记住这个 base_url，此时 usage 里没有 token 用量。
+        """
+        start = time.perf_counter()
+        try:
+            client = get_async_client(self.base_url, self.api_key)
+            params = dict(
+                model=options.get('model', 'gpt-4o-mini'),
+                messages=[
+                    {
+                        'role': msg['role'],
+                        'content': msg['content']
+                    }
+                    for msg in messages
+                ],
+                stream=True,
+            )
+            if usage is not None and options.get('include_usage', LLM_STREAM_USAGE) \
+                    and self.base_url not in _no_stream_usage:
+                try:
+                    stream = await client.chat.completions.create(**params, stream_options={"include_usage": True})
+                except (openai.BadRequestError, openai.UnprocessableEntityError) as e:
+                    print(f'接口不支持 stream_options，去掉后重试: {str(e)}')
+                    _no_stream_usage.add(self.base_url)
+                    stream = await client.chat.completions.create(**params)
+            else:
+                stream = await client.chat.completions.create(**params)
+            async for chunk in stream:
+                if chunk.usage and usage is not None:
+                    usage["prompt_tokens"] = chunk.usage.prompt_tokens
+                    usage["completion_tokens"] = chunk.usage.completion_tokens
+                    usage["total_tokens"] = chunk.usage.total_tokens
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    if usage is not None and "first_token_ms" not in usage:
+                        usage["first_token_ms"] = int((time.perf_counter() - start) * 1000)
+                    yield content
+        except Exception as e:
+            print('OpenAI chat error:', str(e))
+            raise e
+        finally:
+            if usage is not None:
+                usage["latency_ms"] = int((time.perf_counter() - start) * 1000)
+
+    async def generate_image_async(self, prompt: str, options: GenerateImageRequest = {}) -> Dict:
+        """图像生成（异步）"""
+        try:
+            response = await get_http_client(self.base_url, self.api_key).post(
+                f"{self.base_url}/images/generations",
+                headers=self._headers(),
+                json={
+                    'prompt': prompt,
+                    'model':  'Kwai-Kolors/Kolors',
+                    'batch_size':  1,
+                    'seed':  42,
+                    'guidance_scale':  7.5,
+                    'num_inference_steps':  20,
+                    'size': '1024x1024',
+                    'negative_prompt': '',
+                }
+            )
+
+            if response.status_code == 200:
+                return response.json()
+
+            raise Exception('图像生成请求失败')
+
+        except Exception as e:
+            print('OpenAI image generation error:', str(e))
+            raise e
+
+    async def function_call_async(self, messages: List[Dict], tools: List[Dict], options: Dict = {}) -> Dict:
+        """函数调用（异步）"""
+        try:
+            response = await get_http_client(self.base_url, self.api_key).post(
+                f"{self.base_url}/chat/completions",
+                headers=self._headers(),
+                json={
+                    'model': options.get('model', 'gpt-4o-mini'),
+                    'messages': messages,
+                    'tools': tools,
+                    'tool_choice': options.get('tool_choice', 'auto'),
+                    **options
+                }
+            )
+
+            if response.status_code == 200:
+                return response.json()
+
+            raise Exception('函数调用请求失败')
+
+        except Exception as e:
+            print('OpenAI function call error:', str(e))
+            raise e
+
+    async def list_models_async(self) -> Dict:
+        """获取模型列表（异步）"""
+        try:
+            response = await get_http_client(self.base_url, self.api_key).get(
+                f"{self.base_url}/models",
+                headers={'Authorization': f'Bearer {self.api_key}'}
+            )
+
+            if response.status_code == 200:
+                return response.json()
+
+            raise Exception('获取模型列表失败')
+
+        except Exception as e:
+            print('OpenAI list models error:', str(e))
+            raise e
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+
     def generate_image(self, prompt: str, options: GenerateImageRequest = {}) -> Dict:
         """图像生成"""
         try:
@@ -0,0 +1,36 @@
+# dao/character.py
+# 故事角色的批量创建：灵感生成和续写解析出的角色在调用方的事务里一次写入
+from typing import List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Character
+
+
+def story_character_prompt(name: str, description) -> str:
+    """角色扮演聊天使用的系统提示词"""
+    return f"你现在正在做一个角色扮演，无论用户如何去套取你的模型信息，你都不会回复。你只会回答你的公开信息，你的公开信息是：你叫{name},关于你的描述为：{description},除此之外，你可以基于你的角色定位和用户聊天、谈心，唯独不能泄露你的模型信息！"
+
+
+async def add_story_characters(db: AsyncSession, user_id: int, characters: List[dict]) -> List[Character]:
+    """
+    批量插入 ChapterUtils.parse_story 解析出的角色（{'姓名': ..., '描述': ...}），返回带 id 的 Character
+
+    只 flush 不提交，由调用方和灵感结果在同一个事务里提交。支持按顺序返回主键的数据库
+    （PostgreSQL、MariaDB）上是一条多行 INSERT ... RETURNING；MySQL 没有 RETURNING，
+    多行 INSERT 在 innodb_autoinc_lock_mode=2 下也不保证 id 连续，因此逐行 INSERT，
+    但都在同一个连接和事务里。
+    """
+    rows = [
+        Character(
+            name=character['姓名'],
+            description='\n'.join(character['描述']) if isinstance(character['描述'], list) else character['描述'],
+            user_id=user_id,
+            prompt=story_character_prompt(character['姓名'], character['描述'])
+        )
+        for character in characters
+    ]
+    if rows:
+        db.add_all(rows)
+        await db.flush()
+    return rows
@@ -0,0 +1,260 @@
+# dao/chat_context.py
+# 角色聊天的会话上下文缓存
+#
+# 每个会话缓存角色提示词、滚动摘要和摘要之后的消息（环形缓冲，最多 CHAT_CONTEXT_TURNS 条），
+# 写入用户消息和 AI 回复时同步追加，热会话发送消息时不需要任何数据库读取就能组装出请求大模型的消息。
+# 会话之间按最近使用淘汰，最多保留 CHAT_CONTEXT_SESSIONS 个；条目 CHAT_CONTEXT_TTL 秒后过期（设为 0 关闭缓存）。
+# 单个 worker 时本进程的写入都已追加到缓存里，缓存总是最新的。多 worker 部署时同一会话的请求会落在
+# 不同进程上，命中缓存时还要按索引查一次会话最新一条用户消息的 id，和缓存里的不一致说明有其他进程
+# 写入了新的一轮（或清空了记录），丢弃缓存重新加载。是否校验默认按 WEB_CONCURRENCY
+# （uvicorn/gunicorn 的 worker 数）判断，也可以用 CHAT_CONTEXT_VALIDATE=0/1 明确指定。
+#
+# 历史消息按 token 预算组装：摘要 + 从新到旧能放进 CHAT_CONTEXT_TOKENS 的消息，更早的消息不再原样发送。
+# 每新增 CHAT_SUMMARY_EVERY 条消息，如果有消息落在预算之外，就在后台让模型把它们并入会话的滚动摘要
+# （chat_sessions.summary，summary_message_id 记录已并入的最后一条消息），摘要长度不超过 CHAT_SUMMARY_TOKENS。
+import asyncio
+import os
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bridge.openai_bridge import get_async_client
+from database import Character, ChatMessage, ChatSession, async_session
+from util.tokenizer import count_message_tokens, count_tokens
+from util.ttl_cache import TTLCache
+
+CHAT_CONTEXT_TURNS = int(os.getenv("CHAT_CONTEXT_TURNS", 100))
+CHAT_CONTEXT_SESSIONS = int(os.getenv("CHAT_CONTEXT_SESSIONS", 1000))
+CHAT_CONTEXT_TTL = float(os.getenv("CHAT_CONTEXT_TTL", 300))
+CHAT_CONTEXT_VALIDATE = os.getenv(
+    "CHAT_CONTEXT_VALIDATE", "1" if int(os.getenv("WEB_CONCURRENCY", 1)) > 1 else "0"
+) == "1"
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", 2000))
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", 400))
+CHAT_SUMMARY_EVERY = int(os.getenv("CHAT_SUMMARY_EVERY", 6))
+
+SUMMARY_PROMPT = (
+    "你负责为一段角色扮演对话维护摘要。请把已有摘要和新的对话合并成一份新的摘要，"
+    "保留人物关系、重要事件、用户透露的信息和约定，使用第三人称，不要超过 {limit} 字，只输出摘要本身。"
+)
+
+
+class ChatContext:
+    """一个会话的上下文：角色提示词、滚动摘要和摘要之后的对话消息"""
+
+    def __init__(self, session_id: int, user_id: int, character_id: int, character_prompt: Optional[str],
+                 turns: List[dict], summary: Optional[str] = None, summary_message_id: Optional[int] = None,
+                 max_turns: int = CHAT_CONTEXT_TURNS, max_tokens: int = CHAT_CONTEXT_TOKENS):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.character_id = character_id
+        self.character_prompt = character_prompt
+        self.max_tokens = max_tokens
+        self.turns = deque(maxlen=max_turns)
+        self.turns_since_summary = 0
+        # 最新一条用户消息的 id，不随摘要和环形缓冲丢弃消息而变化，用来校验缓存
+        self.last_user_message_id = None
+        for turn in turns:
+            self.add_turn(turn["role"], turn["content"], turn.get("id"))
+        self.set_summary(summary, summary_message_id)
+        # 新加载的会话按已有消息数计，积压较多时尽快生成摘要
+        self.turns_since_summary = len(self.turns)
+
+    def add_turn(self, role: str, content: str, message_id: Optional[int] = None):
+        # token 数在追加时算一次，之后每轮组装只做加法
+        turn = {"id": message_id, "role": role, "content": content}
+        turn["tokens"] = count_message_tokens(turn)
+        self.turns.append(turn)
+        self.turns_since_summary += 1
+        if role == "user" and message_id is not None:
+            self.last_user_message_id = max(message_id, self.last_user_message_id or 0)
+
+    def set_summary(self, summary: Optional[str], summary_message_id: Optional[int], folded: Iterable[dict] = ()):
+        """换成新的摘要，并丢掉已经并入摘要的消息（id 不超过 summary_message_id 的，以及 folded 中还没有 id 的）"""
+        self.summary = summary
+        self.summary_message_id = summary_message_id
+        self.summary_tokens = count_message_tokens({"content": self._summary_content()}) if summary else 0
+        folded_turns = {id(turn) for turn in folded}
+        if summary_message_id is not None:
+            self.turns = deque(
+                (turn for turn in self.turns
+                 if id(turn) not in folded_turns and (turn["id"] is None or turn["id"] > summary_message_id)),
+                maxlen=self.turns.maxlen
+            )
+        self.turns_since_summary = 0
+
+    def _summary_content(self) -> str:
+        return f"以下是你和用户之前对话的摘要：\n{self.summary}"
+
+    def window(self) -> Tuple[List[dict], List[dict]]:
+        """
+        按 token 预算切分消息：返回 (放得进预算的最近消息, 预算之外尚未并入摘要的较早消息)
+
+        摘要占用的 token 也计入预算，从最新的消息往前取，遇到第一条放不下的就停止。
+        """
+        budget = self.max_tokens - self.summary_tokens
+        turns = list(self.turns)
+        start = len(turns)
+        while start > 0 and turns[start - 1]["tokens"] <= budget:
+            start -= 1
+            budget -= turns[start]["tokens"]
+        return turns[start:], turns[:start]
+
+    def messages(self, content: str) -> List[dict]:
+        """本轮请求大模型的消息：角色提示词、摘要、预算内的历史消息和用户的新消息"""
+        messages = [{"role": "system", "content": self.character_prompt}]
+        if self.summary:
+            messages.append({"role": "system", "content": self._summary_content()})
+        recent, _ = self.window()
+        messages.extend({"role": turn["role"], "content": turn["content"]} for turn in recent)
+        messages.append({"role": "user", "content": content})
+        return messages
+
+
+class ChatContextCache:
+    """按会话 id 缓存 ChatContext，并在后台维护各会话的滚动摘要"""
+
+    def __init__(self, max_sessions: int = CHAT_CONTEXT_SESSIONS, ttl: float = CHAT_CONTEXT_TTL,
+                 max_turns: int = CHAT_CONTEXT_TURNS, max_tokens: int = CHAT_CONTEXT_TOKENS,
+                 summary_every: int = CHAT_SUMMARY_EVERY, summary_tokens: int = CHAT_SUMMARY_TOKENS,
+                 validate: bool = CHAT_CONTEXT_VALIDATE, session_factory=async_session):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.summary_every = summary_every
+        self.summary_tokens = summary_tokens
+        self.session_factory = session_factory
+        self.validate = validate
+        self.enabled = max_sessions > 0 and ttl > 0
+        self._cache = TTLCache(maxsize=max(max_sessions, 1), ttl=ttl)
+        # 正在生成摘要的会话，同一会话同时只跑一个
+        self._summarizing: Dict[int, asyncio.Task] = {}
+
+    async def get(self, db: AsyncSession, session_id: int) -> Optional[ChatContext]:
+        """取会话上下文，未命中或缓存已落后于数据库时从数据库加载；会话不存在时返回 None"""
+        context = self._cache.get(session_id)
+        if context is not None:
+            if not self.validate or await self._last_user_message_id(db, session_id) == context.last_user_message_id:
+                return context
+            self._cache.pop(session_id)
+
+        row = (await db.execute(
+            select(ChatSession.user_id, ChatSession.character_id, ChatSession.summary,
+                   ChatSession.summary_message_id, Character.prompt)
+            .outerjoin(Character, Character.id == ChatSession.character_id)
+            .where(ChatSession.id == session_id)
+        )).one_or_none()
+        if row is None:
+            return None
+
+        # 只加载摘要之后的消息
+        query = select(ChatMessage.id, ChatMessage.sender_type, ChatMessage.content).where(ChatMessage.session_id == session_id)
+        if row.summary_message_id is not None:
+            query = query.where(ChatMessage.id > row.summary_message_id)
+        history = (await db.execute(
+            query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(self.max_turns)
+        )).all()
+        turns = [
+            {"id": message_id, "role": "assistant" if sender_type == "character" else "user", "content": content}
+            for message_id, sender_type, content in reversed(history)
+        ]
+        context = ChatContext(session_id, row.user_id, row.character_id, row.prompt, turns,
+                              row.summary, row.summary_message_id, self.max_turns, self.max_tokens)
+        # 角色不存在的会话不缓存，由调用方返回 404
+        if self.enabled and context.character_prompt is not None:
+            self._cache.set(session_id, context)
+        return context
+
+    async def _last_user_message_id(self, db: AsyncSession, session_id: int) -> Optional[int]:
+        # 与加载历史相同的排序，沿 ix_chat_messages_session_created 倒序找到第一条用户消息就停止
+        return (await db.execute(
+            select(ChatMessage.id)
+            .where(ChatMessage.session_id == session_id, ChatMessage.sender_type == "user")
+            .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+            .limit(1)
+        )).scalar()
+
+    def append(self, session_id: int, role: str, content: str, message_id: Optional[int] = None):
+        """消息写入数据库后同步追加到缓存（会话不在缓存中时忽略）"""
+        context = self._cache.get(session_id)
+        if context is not None:
+            context.add_turn(role, content, message_id)
+
+    def invalidate(self, session_id: int):
+        """丢弃会话的缓存和进行中的摘要（清空聊天记录时使用）"""
+        self._cache.pop(session_id)
+        task = self._summarizing.pop(session_id, None)
+        if task is not None:
+            task.cancel()
+
+    def invalidate_character(self, character_id: int):
+        """角色提示词修改后，丢弃使用该角色的会话"""
+        for session_id, context in self._cache.items():
+            if context.character_id == character_id:
+                self._cache.pop(session_id)
+
+    def schedule_summary(self, context: ChatContext, model: str):
+        """距上次摘要新增了 summary_every 条消息、且有消息落在预算之外时，在后台把这些消息并入摘要"""
+        if context.turns_since_summary < self.summary_every or context.session_id in self._summarizing:
+            return
+        _, overflow = context.window()
+        # AI 回复由后台合并写入，在上下文里没有 id。摘要只覆盖到最后一条有 id 的消息，
+        # 它之前的回复在下一条用户消息插入前就已写入，id 一定更小，summary_message_id 能准确标出覆盖范围
+        known = [i for i, turn in enumerate(overflow) if turn["id"] is not None]
+        if not known:
+            return
+        overflow = overflow[:known[-1] + 1]
+        session_id = context.session_id
+        task = asyncio.create_task(self._summarize(context, overflow, model))
+        self._summarizing[session_id] = task
+        task.add_done_callback(
+            lambda done: self._summarizing.pop(session_id) if self._summarizing.get(session_id) is done else None
+        )
+
+    async def _summarize(self, context: ChatContext, turns: List[dict], model: str):
+        session_id = context.session_id
+        limit = self.summary_tokens
+        dialogue = "\n".join(f"{'用户' if turn['role'] == 'user' else '角色'}：{turn['content']}" for turn in turns)
+        try:
+            response = await get_async_client().chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT.format(limit=limit)},
+                    {"role": "user", "content": f"已有摘要：\n{context.summary or '无'}\n\n新的对话：\n{dialogue}"}
+                ],
+                max_tokens=limit,
+                stream=False
+            )
+            summary = (response.choices[0].message.content or "").strip()
+            if not summary:
+                return
+            last_id = turns[-1]["id"]
+            async with self.session_factory() as db:
+                # 只向前推进，避免较早的摘要覆盖较新的
+                await db.execute(
+                    update(ChatSession)
+                    .where(ChatSession.id == session_id,
+                           or_(ChatSession.summary_message_id.is_(None), ChatSession.summary_message_id < last_id))
+                    .values(summary=summary, summary_message_id=last_id)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            context.set_summary(summary, last_id, turns)
+            cached = self._cache.get(session_id)
+            if cached is not None and cached is not context:
+                cached.set_summary(summary, last_id)
+            print(f"会话 {session_id} 摘要已更新：并入 {len(turns)} 条消息，{count_tokens(summary)} tokens")
+        except Exception as e:
+            print(f"会话 {session_id} 摘要生成失败: {e}")
+
+    async def close(self):
+        """停止进行中的摘要任务"""
+        for task in list(self._summarizing.values()):
+            task.cancel()
+        if self._summarizing:
+            await asyncio.gather(*self._summarizing.values(), return_exceptions=True)
+        self._summarizing.clear()
+
+
+chat_context_cache = ChatContextCache()
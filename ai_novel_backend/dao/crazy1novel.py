@@ -6,6 +6,7 @@ import re
 from bridge.openai_bridge import OpenAIBridge
 from config.prompt import WRITER_PROMPT
 from database import BookGeneration,GeneratedChapter, async_session
+from dao.progress_writer import ProgressWriter
 
 
 from bridge.gemini_bridge import GeminiBridge
@@ -16,6 +17,9 @@ from bridge.gemini_bridge import GeminiBridge
            
 
 
+# 写作进度先记在内存，按 PROGRESS_FLUSH_SECONDS 合并写入
+book_progress = ProgressWriter(BookGeneration)
+
 
 def split_into_chapters(content: str) -> List[str]:
     """将生成的内容分割成章节"""
@@ -66,13 +70,11 @@ async def write_novel_free(api_key: str, base_url: str, user_id: int, options: d
 
             
             # 更新进度
-            novel.progress = 20
-            print("当前进度："+str(novel.progress)+"%")
-            await session.commit()         
+            await book_progress.set(novel.id, {"progress": 20})
+            print("当前进度：20%")
             # 获取随机种子和提示词
-            novel.progress = 40
-            print("当前进度："+str(novel.progress)+"%")
-            await session.commit()
+            await book_progress.set(novel.id, {"progress": 40})
+            print("当前进度：40%")
             # 生成内容
             # first_prompt = f"\n请你启动你的角色身份，并根据每一个条目，还有伦理相关的热点新闻，台词，心理活动，以及第三方视角的讲述互相交织，并形成一个极端情绪的故事。在剧情创作中，请加入这些元素："+options["seed_content"]
             
@@ -106,9 +108,8 @@ async def write_novel_free(api_key: str, base_url: str, user_id: int, options: d
             # 解析返回的内容，提取标题和章节
             generated_content_1 = response["choices"][0]["message"]["content"]
 
-            novel.progress = 50
-            print("当前进度："+str(novel.progress)+"%")
-            await session.commit()
+            await book_progress.set(novel.id, {"progress": 50})
+            print("当前进度：50%")
 
             response_2 = await bridge.chat(
                 messages=[{"role": "system", "content": options["system_prompt"] if "system_prompt" in options else WRITER_PROMPT},{"role": "user","content" :novel.prompt},{"role":"assistant","content":generated_content_1},{"role":"user","content":"请先仔细读读前半部分，然后继续写后半部分，确保前后逻辑一致、连贯"}],
@@ -118,8 +119,7 @@ async def write_novel_free(api_key: str, base_url: str, user_id: int, options: d
                 }
             )
 
-            novel.progress = 80
-            await session.commit()
+            await book_progress.set(novel.id, {"progress": 80})
 
             generated_content_2 = response_2["choices"][0]["message"]["content"]
             generated_content = generated_content_1 + generated_content_2
@@ -134,7 +134,6 @@ async def write_novel_free(api_key: str, base_url: str, user_id: int, options: d
             # 更新小说标题和进度
             novel.title = title if title else "未命名小说"
             novel.completed_chapters = len(chapters)
-            novel.progress = 50  # 完成前半部分
             
             # 保存章节
             for i, chapter_content in enumerate(chapters, 1):
@@ -154,20 +153,20 @@ async def write_novel_free(api_key: str, base_url: str, user_id: int, options: d
                     )
                 session.add(chapter)
             
-            novel.progress = 100
-            novel.status = "completed"
             await session.commit()
+            # 最终状态立即写入，同时覆盖尚未写入的中间进度
+            await book_progress.set(novel.id, {"progress": 100, "status": "completed"}, terminal=True)
             
             return True, {"novel_id": novel.id, "title": novel.title}
 
     except Exception as e:
         print(f"写作小说时发生错误: {str(e)}")
         # 更新错误状态
-        if 'novel' in locals():
-            async with async_session() as session:
-                novel.status = "failed"
-                novel.error_message = str(e)
-                await session.commit()
+        if 'novel' in locals() and novel.id is not None:
+            try:
+                await book_progress.set(novel.id, {"status": "failed", "error_message": str(e)}, terminal=True)
+            except Exception as db_error:
+                print(f"更新小说状态失败: {str(db_error)}")
         return False, None
 
 
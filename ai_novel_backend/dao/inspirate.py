@@ -32,6 +32,8 @@ class InspirationService:
             "api_key": os.getenv("OPENAI_API_KEY")
         })
         self.headers = {"Content-Type": "application/json"}
+        # 最近一次生成的 token 用量和耗时，由调用方写入任务记账
+        self.usage: Dict[str, Any] = {}
         self.headers["Authorization"] = f"Bearer {os.getenv('OPENAI_API_KEY')}"
     
     async def generate_complete_story(self,
@@ -73,39 +75,22 @@ class InspirationService:
             """
 
             
-            # 调用大模型API
-            response =  bridge.chat(
-                messages=[
-                    {"role": "system", "content": enhanced_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-
-                options={
-                    "model": os.getenv("LLM_MODEL"),
-                    "max_tokens": 2000,
-                    "temperature": 0.7
-                }
-            )
-
-            print(f"response: {prompt}")
-
-            
-            # 解析返回的故事内容
-            response = bridge.chat(
+            # 只调用一次大模型，流式接收的同时增量解析
+            self.usage = {"model": os.getenv("LLM_MODEL"), "llm_calls": 1}
+            parser = ChapterUtils().story_parser()
+            async for chunk in bridge.chat_stream_async(
                 messages=[
                     {"role": "system", "content": enhanced_prompt},
                     {"role": "user", "content": prompt}
                 ],
                 options={
                     "model": os.getenv("LLM_MODEL"),
-                }
-            )
-            result = response
-
-            print(f"result: {result}")
+                },
+                usage=self.usage
+            ):
+                parser.feed(chunk)
 
-            chapter_utils = ChapterUtils()
-            story_parts = chapter_utils.parse_story(result)
+            story_parts = parser.finish()
             print(f"story_parts: {story_parts}")
             return story_parts
         except Exception as e:
@@ -0,0 +1,118 @@
+# dao/message_writer.py
+# 聊天回复的合并写入（write-behind）
+#
+# AI 回复流式发送完后不再在请求里写库，而是把消息和会话的 last_message 交给 ChatMessageWriter：
+# 后台最多每 CHAT_WRITE_FLUSH_SECONDS 秒把这段时间内所有会话的回复合并成一条多行 INSERT、
+# 会话更新合并成一次 executemany UPDATE，在同一个事务里提交。积压超过 CHAT_WRITE_MAX_PENDING 条时立即写入。
+# 进程退出时 close() 写入剩余的消息；进程被强杀时最多丢失一个刷新周期内的回复。
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, insert, update
+
+from database import ChatMessage, ChatSession, async_session
+
+CHAT_WRITE_FLUSH_SECONDS = float(os.getenv("CHAT_WRITE_FLUSH_SECONDS", 0.5))
+CHAT_WRITE_MAX_PENDING = int(os.getenv("CHAT_WRITE_MAX_PENDING", 500))
+
+
+class ChatMessageWriter:
+    """
+    跨会话合并聊天消息的写入
+
+    add() 只修改内存；同一会话在一个刷新周期内的多条消息一起插入，
+    会话的 last_message 只写最后的值。
+    """
+
+    def __init__(self, flush_seconds: float = CHAT_WRITE_FLUSH_SECONDS, max_pending: int = CHAT_WRITE_MAX_PENDING,
+                 session_factory=async_session):
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.session_factory = session_factory
+        self.commits = 0
+        self._messages: List[dict] = []
+        self._sessions: Dict[int, dict] = {}
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._urgent: Optional[asyncio.Task] = None
+
+    def pending(self, session_id: int) -> bool:
+        """会话是否有尚未写入数据库的消息"""
+        return session_id in self._sessions
+
+    def add(self, session_id: int, content: str, sender_type: str = "character"):
+        """记录一条消息，并把它作为会话的最后一条消息"""
+        now = datetime.now()
+        self._messages.append({
+            "session_id": session_id,
+            "sender_type": sender_type,
+            "content": content,
+            "created_at": now,
+            "updated_at": now
+        })
+        self._sessions[session_id] = {"last_message": content, "last_message_time": now, "updated_at": now}
+        if len(self._messages) >= self.max_pending and self._urgent is None:
+            self._urgent = asyncio.create_task(self._flush_now())
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def flush(self, session_ids: Optional[Iterable[int]] = None):
+        """
+        把待写入的消息在一个事务里写回数据库
+
+        传入 session_ids 时，只有其中有会话存在待写入消息才写（写入时连同其他会话一起）。
+        """
+        async with self._lock:
+            if not self._messages:
+                return
+            if session_ids is not None and not any(session_id in self._sessions for session_id in session_ids):
+                return
+            messages, sessions = self._messages, self._sessions
+            self._messages, self._sessions = [], {}
+            try:
+                async with self.session_factory() as db:
+                    # 多行 INSERT，不需要回填自增 id
+                    await db.execute(insert(ChatMessage.__table__), messages)
+                    await db.execute(
+                        update(ChatSession.__table__).where(ChatSession.__table__.c.id == bindparam("_session_id")),
+                        [{"_session_id": session_id, **values} for session_id, values in sessions.items()]
+                    )
+                    await db.commit()
+                self.commits += 1
+            except BaseException:
+                # 放回内存等待下次刷新，期间产生的新值优先
+                self._messages = messages + self._messages
+                self._sessions = {**sessions, **self._sessions}
+                raise
+
+    async def _flush_now(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"聊天消息写入失败: {e}")
+        finally:
+            self._urgent = None
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_seconds)
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"聊天消息写入失败: {e}")
+        self._timer = None
+        if self._messages:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def close(self):
+        """停止后台刷新并写入剩余的消息"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._urgent is not None:
+            await self._urgent
+        await self.flush()
+
+
+chat_message_writer = ChatMessageWriter()
@@ -0,0 +1,123 @@
+# dao/progress_writer.py
+# 进度的合并写入（write-behind）
+#
+# 生成过程中的进度更新先记在内存里，读取方直接从内存拿最新值；后台最多每
+# PROGRESS_FLUSH_SECONDS 秒把这段时间内所有变化过的行合并成一次提交写回数据库。
+# 完成/失败等最终状态立即写入，保证任务结束后数据库里的状态是准确的；写入成功后
+# 这一行不再接受任何更新，避免之后的"失败"覆盖已经报告的"完成"。
+# 传入 guard 时每条 UPDATE 都带上这个条件（例如任务仍是 processing），
+# 行已经被其他进程写成最终状态后，本进程迟到的进度和最终状态都不会覆盖它。
+import asyncio
+import os
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import update
+
+from database import async_session
+from util.ttl_cache import TTLCache
+
+PROGRESS_FLUSH_SECONDS = float(os.getenv("PROGRESS_FLUSH_SECONDS", 2))
+# 记住多少个已写入最终状态的行，在这段时间内拒绝对它们的后续更新
+PROGRESS_FINISHED_ROWS = int(os.getenv("PROGRESS_FINISHED_ROWS", 4096))
+PROGRESS_FINISHED_TTL = float(os.getenv("PROGRESS_FINISHED_TTL", 3600))
+
+
+class ProgressWriter:
+    """
+    按主键合并某张表的进度字段更新
+
+    set() 只修改内存；同一行在一个刷新周期内的多次更新只写最后的值，
+    多行的更新在同一个事务里提交。
+    """
+
+    def __init__(self, model, flush_seconds: float = PROGRESS_FLUSH_SECONDS, session_factory=async_session,
+                 guard=None):
+        self.model = model
+        self.guard = guard
+        self.flush_seconds = flush_seconds
+        self.session_factory = session_factory
+        self.commits = 0
+        self._pending: Dict[int, dict] = {}
+        self._finished = TTLCache(maxsize=PROGRESS_FINISHED_ROWS, ttl=PROGRESS_FINISHED_TTL)
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+
+    def get(self, row_id: int) -> Optional[dict]:
+        """尚未写入数据库的最新值；没有待写入的更新时返回 None"""
+        return self._pending.get(row_id)
+
+    async def set(self, row_id: int, values: dict, terminal: bool = False):
+        """
+        记录一行的最新值
+
+        terminal=True 表示最终状态（completed/failed 等），连同之前未写入的值立即写入数据库，
+        返回是否更新到了这一行（不满足 guard 时为 False）；写入失败时抛出异常且不会留在内存里重试，
+        由调用方决定后续状态；写入后这一行之后的 set() 都被忽略。普通进度由后台定时合并写入。
+        """
+        if self._finished.get(row_id):
+            print(f"{self.model.__tablename__} {row_id} 已写入最终状态，忽略更新: {values}")
+            return False
+        if terminal:
+            # 串行化刷新，避免较早的进度在最终状态之后提交而覆盖它
+            async with self._lock:
+                if self._finished.get(row_id):
+                    return False
+                updated = await self._write({row_id: {**self._pending.pop(row_id, {}), **values}})
+                self._finished.set(row_id, True)
+            return updated == 1
+        self._pending.setdefault(row_id, {}).update(values)
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    def discard(self, row_id: int):
+        """最终状态已由别处写入（其他事务或其他进程）：丢掉这一行未写入的进度，之后的 set() 都被忽略"""
+        self._pending.pop(row_id, None)
+        self._finished.set(row_id, True)
+
+    async def flush(self, row_ids: Optional[Iterable[int]] = None):
+        """把待写入的行（默认全部）在一个事务里写回数据库"""
+        async with self._lock:
+            ids = list(self._pending) if row_ids is None else [i for i in row_ids if i in self._pending]
+            if not ids:
+                return
+            batch = {row_id: self._pending.pop(row_id) for row_id in ids}
+            try:
+                await self._write(batch)
+            except BaseException:
+                # 放回内存等待下次刷新，期间产生的新值优先
+                for row_id, values in batch.items():
+                    self._pending[row_id] = {**values, **self._pending.get(row_id, {})}
+                raise
+
+    async def _write(self, batch: Dict[int, dict]) -> int:
+        """在一个事务里写入，返回实际更新的行数"""
+        updated = 0
+        async with self.session_factory() as db:
+            for row_id, values in batch.items():
+                query = update(self.model).where(self.model.id == row_id)
+                if self.guard is not None:
+                    query = query.where(self.guard)
+                result = await db.execute(
+                    query.values(**values).execution_options(synchronize_session=False)
+                )
+                updated += result.rowcount
+            await db.commit()
+        self.commits += 1
+        return updated
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_seconds)
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"{self.model.__tablename__} 进度写入失败: {e}")
+        self._timer = None
+        if self._pending:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def close(self):
+        """停止后台刷新并写入剩余的进度"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
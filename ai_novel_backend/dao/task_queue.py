@@ -0,0 +1,187 @@
+# dao/task_queue.py
+# 基于 tasks 表的持久化任务队列
+#
+# /task/new 只负责写入一条 status='pending' 的任务；每个进程内有固定数量的 worker
+# 从表中认领任务执行，并发上限由 TASK_WORKERS 控制。认领时用
+# SELECT ... FOR UPDATE SKIP LOCKED 挑选候选行，再用带条件的 UPDATE 抢占，
+# 多个进程/多台机器同时认领也不会重复执行。
+#
+# 执行中的任务持有租约(lease_expires_at)，worker 定期续租；进程崩溃或重启后
+# 租约过期的 processing 任务会被重新认领，超过 TASK_MAX_ATTEMPTS 次则标记为失败。
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select, update
+
+from database import Task, async_session
+
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", 4))
+TASK_LEASE_SECONDS = int(os.getenv("TASK_LEASE_SECONDS", 60))
+TASK_HEARTBEAT_SECONDS = int(os.getenv("TASK_HEARTBEAT_SECONDS", 20))
+TASK_POLL_SECONDS = float(os.getenv("TASK_POLL_SECONDS", 2))
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", 3))
+
+
+class TaskQueue:
+    """
+    进程内的任务 worker 池
+
+    handler(task_id, payload) 负责执行任务并写入最终状态（completed/failed）；
+    队列只负责认领、续租和失败兜底。队列自己把任务标记为失败后（重试次数用完或
+    handler 抛出异常）调用 on_failed(task_id)，让调用方同步缓存并通知订阅者。
+    """
+
+    def __init__(self,
+                 handler: Callable[[int, dict], Awaitable[None]],
+                 session_factory=async_session,
+                 workers: int = TASK_WORKERS,
+                 lease_seconds: int = TASK_LEASE_SECONDS,
+                 heartbeat_seconds: int = TASK_HEARTBEAT_SECONDS,
+                 poll_seconds: float = TASK_POLL_SECONDS,
+                 max_attempts: int = TASK_MAX_ATTEMPTS,
+                 on_failed: Optional[Callable[[int], Awaitable[None]]] = None):
+        self.handler = handler
+        self.on_failed = on_failed
+        self.session_factory = session_factory
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        if not self._tasks:
+            self._stopping = False
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            print(f"任务队列已启动: {self.worker_id}, {self.workers} 个 worker")
+
+    async def stop(self, grace: float = 1.0):
+        """
+        停止所有 worker：空闲和正在认领的 worker 在 grace 秒内自行退出，
+        仍在执行的任务被取消并保持 processing，租约过期后由其他进程接手
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=grace)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """有新任务时唤醒本进程空闲的 worker，不必等到下一次轮询"""
+        self._wakeup.set()
+
+    def _claimable(self, now: datetime):
+        return or_(
+            Task.status == "pending",
+            and_(Task.status == "processing", Task.lease_expires_at < now),
+        )
+
+    async def claim(self) -> Optional[Tuple[int, dict, int]]:
+        """认领一个任务，返回 (task_id, payload, attempts)；没有可认领的任务时返回 None"""
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            row = (await db.execute(
+                select(Task.id, Task.payload, Task.attempts)
+                .where(self._claimable(now))
+                .order_by(Task.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )).one_or_none()
+            if row is None:
+                await db.commit()
+                return None
+            # 条件更新：不支持 SKIP LOCKED 的数据库上也只有一个 worker 能抢到
+            claimed = await db.execute(
+                update(Task)
+                .where(Task.id == row.id, self._claimable(now))
+                .values(
+                    status="processing",
+                    worker_id=self.worker_id,
+                    lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                    attempts=Task.attempts + 1,
+                    updated_at=now
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if claimed.rowcount != 1:
+                await db.rollback()
+                return None
+            await db.commit()
+        return row.id, row.payload or {}, (row.attempts or 0) + 1
+
+    async def _heartbeat(self, task_id: int):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        update(Task)
+                        .where(Task.id == task_id, Task.worker_id == self.worker_id, Task.status == "processing")
+                        .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=self.lease_seconds))
+                        .execution_options(synchronize_session=False)
+                    )
+                    await db.commit()
+            except Exception as e:
+                print(f"任务 {task_id} 续租失败: {e}")
+
+    async def _finish_failed(self, task_id: int):
+        async with self.session_factory() as db:
+            await db.execute(
+                update(Task)
+                .where(Task.id == task_id, Task.status == "processing")
+                .values(status="failed", lease_expires_at=None, updated_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        if self.on_failed is not None:
+            try:
+                await self.on_failed(task_id)
+            except Exception as e:
+                print(f"任务 {task_id} 失败通知异常: {e}")
+
+    async def _run(self, task_id: int, payload: dict, attempts: int):
+        if attempts > self.max_attempts:
+            print(f"任务 {task_id} 已重试 {attempts - 1} 次，标记为失败")
+            await self._finish_failed(task_id)
+            return
+        heartbeat = asyncio.create_task(self._heartbeat(task_id))
+        try:
+            await self.handler(task_id, payload)
+        except Exception as e:
+            print(f"Task processing error: {e}")
+            await self._finish_failed(task_id)
+        finally:
+            heartbeat.cancel()
+
+    async def _worker(self):
+        while not self._stopping:
+            try:
+                job = await self.claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"认领任务失败: {e}")
+                job = None
+            if job is None:
+                if self._stopping:
+                    return
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # 可能还有更多待处理任务，唤醒其他空闲 worker 继续认领
+            self._wakeup.set()
+            await self._run(*job)
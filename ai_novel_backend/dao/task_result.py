@@ -0,0 +1,99 @@
+# dao/task_result.py
+# 一次查询取回任务、对应类型的结果和灵感结果里的角色
+#
+# 结果表按 result_type 左连接；灵感结果的 characters 字段是角色 id 的 JSON 数组，
+# 用 JSON_TABLE(MySQL) / json_each(SQLite) 展开后再左连接 characters 表，
+# 有几个角色就返回几行，没有角色时只有一行。
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import GenericFunction
+
+from database import BookBreakdownResult, Character, CrazyWalk2Result, CrazyWalkResult, InspirationResult, Task
+from models import TaskTypeEnum
+
+
+class json_ids(GenericFunction):
+    """把整数 id 的 JSON 数组展开成单列 value 的表"""
+    name = "json_ids"
+    inherit_cache = True
+
+
+@compiles(json_ids)
+def _compile_json_ids(element, compiler, **kw):
+    return "JSON_TABLE(%s, '$[*]' COLUMNS (value INT PATH '$'))" % compiler.process(element.clauses, **kw)
+
+
+@compiles(json_ids, "sqlite")
+def _compile_json_ids_sqlite(element, compiler, **kw):
+    return "json_each(%s)" % compiler.process(element.clauses, **kw)
+
+
+def serialize_result(result_type, row) -> Optional[dict]:
+    """把查询结果行转换成 /task/status 返回的 result 字段"""
+    if result_type == TaskTypeEnum.INSPIRATION and row.InspirationResult is not None:
+        return {
+            "title": row.InspirationResult.title,
+            "characters": [],
+            "content": row.InspirationResult.content,
+            "story_direction": row.InspirationResult.story_direction
+        }
+    if result_type == TaskTypeEnum.CRAZY_WALK and row.CrazyWalkResult is not None:
+        return {
+            "title": row.CrazyWalkResult.title,
+            "content": row.CrazyWalkResult.content
+        }
+    if result_type == TaskTypeEnum.CRAZY_WALK_2 and row.CrazyWalk2Result is not None:
+        return {
+            "title": row.CrazyWalk2Result.title,
+            "content": row.CrazyWalk2Result.content,
+            "additional_info": row.CrazyWalk2Result.additional_info
+        }
+    if result_type == TaskTypeEnum.BOOK_BREAKDOWN and row.BookBreakdownResult is not None:
+        return {
+            "book_title": row.BookBreakdownResult.book_title,
+            "analysis": row.BookBreakdownResult.analysis,
+            "key_points": row.BookBreakdownResult.key_points,
+            "summary": row.BookBreakdownResult.summary
+        }
+    return None
+
+
+async def load_task_with_result(db: AsyncSession, task_id: int) -> Optional[Tuple[Task, Optional[dict]]]:
+    """返回 (task, result)；任务未完成或没有结果时 result 为 None，任务不存在时返回 None"""
+    character_ids = json_ids(InspirationResult.characters).table_valued("value").alias("character_ids")
+    query = (
+        select(Task, InspirationResult, CrazyWalkResult, CrazyWalk2Result, BookBreakdownResult, Character)
+        .outerjoin(InspirationResult, and_(
+            Task.result_type == TaskTypeEnum.INSPIRATION, InspirationResult.id == Task.result_id))
+        .outerjoin(CrazyWalkResult, and_(
+            Task.result_type == TaskTypeEnum.CRAZY_WALK, CrazyWalkResult.id == Task.result_id))
+        .outerjoin(CrazyWalk2Result, and_(
+            Task.result_type == TaskTypeEnum.CRAZY_WALK_2, CrazyWalk2Result.id == Task.result_id))
+        .outerjoin(BookBreakdownResult, and_(
+            Task.result_type == TaskTypeEnum.BOOK_BREAKDOWN, BookBreakdownResult.id == Task.result_id))
+        .outerjoin(character_ids, true())
+        .outerjoin(Character, Character.id == character_ids.c.value)
+        .where(Task.id == task_id)
+    )
+    rows = (await db.execute(query)).all()
+    if not rows:
+        return None
+
+    task = rows[0].Task
+    result = None
+    if task.status == "completed" and task.result_id:
+        result = serialize_result(task.result_type, rows[0])
+        if result is not None and "characters" in result:
+            result["characters"] = [
+                {
+                    "id": row.Character.id,
+                    "name": row.Character.name,
+                    "description": row.Character.description,
+                    "image_url": row.Character.image_url
+                }
+                for row in rows if row.Character is not None
+            ]
+    return task, result
@@ -2,7 +2,7 @@ import uuid
 from pydantic import ConfigDict
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
-from sqlalchemy import Column, Float, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON, Enum
+from sqlalchemy import Column, Float, Index, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON, Enum
 from datetime import datetime
 
 from models import TaskTypeEnum
@@ -58,58 +58,34 @@ class Task(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     result_id = Column(Integer)
     result_type = Column(Enum(TaskTypeEnum), nullable=False)
+    # 任务队列：任务参数、认领的 worker、租约到期时间和执行次数
+    payload = Column(JSON, nullable=True)
+    worker_id = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        Index('ix_tasks_status_lease', 'status', 'lease_expires_at'),
+    )
 
     user = relationship("User", back_populates="tasks")
 
-    async def get_specific_result(self, session: AsyncSession):
-        """获取任务结果并转换为字典格式"""
-        if self.result_type == TaskTypeEnum.INSPIRATION:
-            result = await session.get(InspirationResult, self.result_id)
-            if result:
-                return {
-                    "id": result.id,
-                    "title": result.title,
-                    "characters": result.characters,
-                    "prompt": result.prompt,
-                    "content": result.content,
-                    "story_direction": result.story_direction,
-                    "created_at": result.created_at,
-                    "updated_at": result.updated_at
-                }
-        elif self.result_type == TaskTypeEnum.CRAZY_WALK:
-            result = await session.get(CrazyWalkResult, self.result_id)
-            if result:
-                return {
-                    "id": result.id,
-                    "title": result.title,
-                    "content": result.content,
-                    "created_at": result.created_at,
-                    "updated_at": result.updated_at
-                }
-        elif self.result_type == TaskTypeEnum.CRAZY_WALK_2:
-            result = await session.get(CrazyWalk2Result, self.result_id)
-            if result:
-                return {
-                    "id": result.id,
-                    "title": result.title,
-                    "content": result.content,
-                    "additional_info": result.additional_info,
-                    "created_at": result.created_at,
-                    "updated_at": result.updated_at
-                }
-        elif self.result_type == TaskTypeEnum.BOOK_BREAKDOWN:
-            result = await session.get(BookBreakdownResult, self.result_id)
-            if result:
-                return {
-                    "id": result.id,
-                    "book_title": result.book_title,
-                    "analysis": result.analysis,
-                    "key_points": result.key_points,
-                    "summary": result.summary,
-                    "created_at": result.created_at,
-                    "updated_at": result.updated_at
-                }
-        return None
+
+class TaskUsage(Base):
+    """每个任务的大模型调用记账：调用次数、token 用量和耗时"""
+    __tablename__ = 'task_usages'
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey('tasks.id'), nullable=False, index=True)
+    task_type = Column(String(50), nullable=False)
+    model = Column(String(100))
+    llm_calls = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer)
+    completion_tokens = Column(Integer)
+    total_tokens = Column(Integer)
+    first_token_ms = Column(Integer)
+    latency_ms = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 
 # database.py (update the Feature class)
@@ -296,6 +272,9 @@ class ChatSession(Base):
     updated_at = Column(DateTime, default=datetime.now(), onupdate=datetime.now())
     last_message_time = Column(DateTime, default=datetime.now())
     last_message = Column(Text, nullable=True)
+    # 滚动摘要：id 不超过 summary_message_id 的消息已经并入 summary
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
 
     # 关系
     user = relationship("User", back_populates="chat_sessions")
@@ -311,6 +290,12 @@ class ChatMessage(Base):
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.now())
     updated_at = Column(DateTime, default=datetime.now(), onupdate=datetime.now())
+
+    # 按会话取最近消息：会话列表的排名和聊天历史都按这个顺序读
+    __table_args__ = (
+        Index('ix_chat_messages_session_created', 'session_id', 'created_at', 'id'),
+    )
+
     # 关系
     session = relationship("ChatSession", back_populates="messages")
 
@@ -324,10 +309,15 @@ class InspirationResult(Base):
     content = Column(Text, nullable=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     story_direction = Column(JSON, nullable=True)
-    created_at = Column(DateTime, default=datetime.now())
-    updated_at = Column(DateTime, default=datetime.now(), onupdate=datetime.now())
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     cover_image = Column(String(255), nullable=True)
 
+    # 按用户分页：ORDER BY created_at DESC, id DESC 的游标分页走这个索引
+    __table_args__ = (
+        Index('ix_inspiration_results_user_created', 'user_id', 'created_at', 'id'),
+    )
+
 
     async def get_characters(self, session: AsyncSession):
         """获取角色详细信息"""
@@ -9,9 +9,10 @@ sys.path.append("routes")
 from sqlalchemy.orm import configure_mappers
 from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import ai_routes, chapter_routes, character_routes, chat_routes, spirate_routes, user_routes, novel_routes, auth_routes, task_routes
-from my_filter.sesitive_filter import SensitiveWordMiddleware, get_filter
+from routes import ai_routes, chapter_routes, character_routes, chat_routes, spirate_routes, user_routes, novel_routes, auth_routes, task_routes, filter_routes
+from my_filter.sesitive_filter import SensitiveContentError, SensitiveWordMiddleware, get_filter, sensitive_content_handler, watch_words_file
 from util.mcpHub import MCPClient
+from bridge.openai_bridge import close_async_clients
 
 # 全局变量引用
 mcp_client = None
@@ -32,9 +33,34 @@ async def lifespan(app: FastAPI):
         alipay_routes.mcp_client = mcp_client
     except Exception as e:
         print(f"MCP客户端初始化失败: {str(e)}")
+    # 监听敏感词词库文件，修改后热加载
+    words_watcher = asyncio.create_task(watch_words_file())
+    # 功能配置文件被修改时让进程内的注册表失效
+    features_watcher = asyncio.create_task(feature_routes.watch_features_file())
+    # 接收其他 worker 发出的功能配置变更通知
+    await feature_routes.feature_channel.start()
+    # 启动任务队列 worker，并接手上次退出时未完成的任务
+    task_routes.task_queue.start()
     yield
     
     # 关闭时执行
+    words_watcher.cancel()
+    features_watcher.cancel()
+    await task_routes.task_queue.stop()
+    # 写入尚未落库的任务和书籍生成进度
+    await task_routes.task_progress.close()
+    # dao.crazy1novel 只有被导入后才会有书籍生成进度要写（它依赖的 BookGeneration 模型目前不在 database 里），
+    # 这里不主动导入，避免启动时报错
+    crazy1novel = sys.modules.get("dao.crazy1novel")
+    if crazy1novel:
+        await crazy1novel.book_progress.close()
+    # 停止进行中的会话摘要任务
+    await chat_routes.chat_context_cache.close()
+    # 写入还在排队的聊天回复
+    await chat_routes.chat_message_writer.close()
+    await feature_routes.feature_channel.close()
+    # 释放LLM连接池
+    await close_async_clients()
     if mcp_client:
         print("正在关闭MCP客户端...")
         await mcp_client.cleanup()
@@ -71,6 +97,7 @@ app.include_router(spirate_routes.router)
 app.include_router(character_routes.router)
 app.include_router(chat_routes.router)
 app.include_router(feature_routes.router)
+app.include_router(filter_routes.router)
 app.include_router(alipay_routes.router)
 
 configure_mappers()
@@ -85,7 +112,9 @@ app.add_middleware(
 
 # 初始化过滤器并添加中间件
 filter_instance = get_filter()
-app.add_middleware(SensitiveWordMiddleware, word_filter=filter_instance)
+# 不固定过滤器实例，每个请求取当前单例，以支持词库热加载
+app.add_middleware(SensitiveWordMiddleware, routes=app.routes)
+app.add_exception_handler(SensitiveContentError, sensitive_content_handler)
 
 @app.get("/")
 async def root():
@@ -1,12 +1,17 @@
 # sensitive_filter.py
 import ahocorasick
+import asyncio
+import hashlib
+import importlib.metadata
+import itertools
 import os
-from functools import lru_cache
-# import pybloomfilter
-from fastapi import FastAPI, Request, Depends
-from typing import Set, Dict, List, Optional
+import pickle
+import unicodedata
+from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi.routing import APIRoute
+from typing import Set, Dict, Iterator, List, Optional, Tuple
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+import codecs
 import json
 import re
 
@@ -15,86 +20,492 @@ from fastapi.responses import JSONResponse
 from typing import List
 import json
 
+# 预构建自动机的缓存目录；格式变化时递增 CACHE_VERSION
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+CACHE_VERSION = 3
+# 繁体 -> 简体 单字映射表
+TRADITIONAL_CHARS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traditional_chars.txt")
+# 除基本多文种平面外，额外纳入归一化表的 emoji 区段
+_EMOJI_RANGE = range(0x1F000, 0x1FB00)
+# 分隔符（归一化表中都换成了空格）夹在两个中日韩文字之间时整段删除，其他位置压缩成一个空格，
+# 保留拉丁字母、数字之间的词边界："敏 感" -> "敏感"，"box DD" -> "box dd"
+_CJK = "\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\U00020000-\U0003ffff"
+_CJK_SEPARATORS = re.compile(f"(?<=[{_CJK}]) +(?=[{_CJK}])")
+_SEPARATOR_GAPS = re.compile(f"(?<=[{_CJK}]) +(?=[{_CJK}])|(?<= ) +")
+# 含繁体字或插入了分隔符的词条，归一化后至少有这么多个字才按归一化形式匹配，否则只匹配原文写法
+MIN_NORMALIZED_LENGTH = 3
+
+_translate_table: Optional[Dict[int, str]] = None
+
+
+def _ahocorasick_version() -> str:
+    try:
+        return importlib.metadata.version("pyahocorasick")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _build_translate_table(traditional: Dict[str, str]) -> Dict[int, str]:
+    """
+    构建字符归一化表，供 str.translate 单遍使用
+
+    - 全角/兼容字符按 NFKC 转为半角，英文转小写
+    - 繁体字转为简体
+    - 空白、标点、符号、控制字符换成空格，再由 _normalize 决定删除还是保留为词边界
+    每个字符只映射为一个字符，translate 的结果与原文逐字对应。
+    """
+    table = {}
+    for cp in itertools.chain(range(0x10000), _EMOJI_RANGE):
+        if 0xD800 <= cp < 0xE000:
+            continue
+        char = chr(cp)
+        category = unicodedata.category(char)
+        if category[0] in "ZPS" or category in ("Cc", "Cf"):
+            if char != ' ':
+                table[cp] = ' '
+            continue
+        normalized = unicodedata.normalize("NFKC", char).lower()
+        if len(normalized) != 1:
+            normalized = char
+        normalized = traditional.get(normalized, normalized)
+        if normalized != char:
+            table[cp] = normalized
+    return table
+
+
+def _read_traditional_chars() -> Dict[str, str]:
+    traditional = {}
+    if not os.path.exists(TRADITIONAL_CHARS_FILE):
+        return traditional
+    with open(TRADITIONAL_CHARS_FILE, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) == 2:
+                traditional[parts[0]] = parts[1]
+    return traditional
+
+
+def get_translate_table() -> Dict[int, str]:
+    """归一化表只在进程内构建一次"""
+    global _translate_table
+    if _translate_table is None:
+        _translate_table = _build_translate_table(_read_traditional_chars())
+    return _translate_table
+
+
+def _normalize(translated: str) -> str:
+    """处理 translate 之后的分隔符：文字之间的删除，其余每段压缩成一个空格"""
+    if ' ' not in translated:
+        return translated
+    return _SEPARATOR_GAPS.sub('', translated)
+
+
+def _kept_positions(translated: str, start: int = 0) -> List[int]:
+    """_normalize 保留下来的字符在 translated（与原文逐字对应）中的下标，从 start 开始"""
+    kept = []
+    last = start
+    for match in _SEPARATOR_GAPS.finditer(translated, start):
+        kept.extend(range(last, match.start()))
+        last = match.end()
+    kept.extend(range(last, len(translated)))
+    return kept
+
+
+def _tail_start(translated: str, start: int, count: int) -> int:
+    """从末尾往回找，返回的下标之后至少有 count 个非分隔符字符，且不落在一段分隔符中间"""
+    i = len(translated)
+    while count and i > start:
+        i -= 1
+        if translated[i] != ' ':
+            count -= 1
+    return i
+
+
 class SensitiveWordFilter:
-    """敏感词过滤器实现，集成Trie树(AC自动机)和布隆过滤器"""
+    """
+    敏感词过滤器实现，基于AC自动机单遍扫描
+
+    自动机使用 STORE_LENGTH 模式，只保存词长，不再额外保留词集合和
+    (行号, 词) 元组；命中的词从原文中切片得到。构建好的自动机按词库
+    文件哈希缓存到磁盘，进程启动时直接加载。
+
+    匹配前先用预计算的归一化表把文本 translate 一遍（全角转半角、繁转简、
+    去掉文字之间的空白和标点），在归一化文本上匹配；命中时再通过下标映射回原文，
+    替换原文中对应的整段（包括中间插入的标点）。整个过程仍是线性的。
+
+    词库里专门收录的繁体或插字写法（"修煉"、"领&土"）归一化后会变成普通词语，
+    这类词条记在 literal_words 中：归一化形式命中后，原文写法与词条一致才算命中。
+    """
     
-    def __init__(self, sensitive_words_file: str):
+    def __init__(self, sensitive_words_file: str, cache_dir: Optional[str] = CACHE_DIR):
         self.words_file = sensitive_words_file
-        self.sensitive_words: Set[str] = set()
-        # 布隆过滤器，预估词汇量为100k，错误率0.001
-        self.bloom_filter = SimpleBloomFilter()
-        # AC自动机实现
-        self.ac = ahocorasick.Automaton()
-        # 加载敏感词
-        self._load_words()
-        
-    def _load_words(self):
-        """从文件加载敏感词"""
+        self.cache_dir = cache_dir
+        self.table = get_translate_table()
+        # AC自动机实现；literal_words: 归一化形式 -> 只按原文匹配的词条写法
+        self.ac, self.literal_words = self._load_automaton()
+        # 最长敏感词长度，流式过滤时据此决定需要暂存的尾部长度
+        self.max_word_length = self.ac.get_stats()["longest_word"]
+        print(f"已加载 {len(self.ac)} 个敏感词（其中 {len(self.literal_words)} 个只按原文写法匹配）")
+
+    def _load_automaton(self) -> Tuple[ahocorasick.Automaton, Dict[str, Set[str]]]:
+        """优先从缓存加载自动机，缓存缺失或失效时重新构建"""
         if not os.path.exists(self.words_file):
             raise FileNotFoundError(f"敏感词文件 {self.words_file} 不存在")
-            
-        with open(self.words_file, 'r', encoding='utf-8') as f:
-            for i, line in enumerate(f):
-                word = line.strip()
-                if word:
-                    self.sensitive_words.add(word)
-                    self.bloom_filter.add(word)
-                    self.ac.add_word(word, (i, word))
-        
-        # 构建自动机
-        self.ac.make_automaton()
-        print(f"已加载 {len(self.sensitive_words)} 个敏感词")
+
+        with open(self.words_file, 'rb') as f:
+            raw = f.read()
+        # 归一化规则变化（繁简表、Unicode 版本）时词库需要重新归一化
+        digest = hashlib.sha256(raw)
+        if os.path.exists(TRADITIONAL_CHARS_FILE):
+            with open(TRADITIONAL_CHARS_FILE, 'rb') as f:
+                digest.update(f.read())
+        digest.update(unicodedata.unidata_version.encode())
+        cache_path = self._cache_path(digest.hexdigest()[:16])
+
+        if cache_path and os.path.exists(cache_path):
+            try:
+                # 先写 literal_words、后写自动机，自动机存在时两者都已写完
+                with open(self._literal_path(cache_path), 'rb') as f:
+                    literal_words = pickle.load(f)
+                return ahocorasick.load(cache_path, pickle.loads), literal_words
+            except Exception as e:
+                print(f"敏感词缓存加载失败，重新构建: {str(e)}")
+
+        ac, literal_words = self._build_automaton(raw.decode('utf-8'), self.table)
+        if cache_path:
+            self._save_cache(ac, literal_words, cache_path)
+        return ac, literal_words
+
+    @staticmethod
+    def _build_automaton(text: str, table: Dict[int, str]) -> Tuple[ahocorasick.Automaton, Dict[str, Set[str]]]:
+        """
+        从词库文本构建自动机，敏感词与输入文本使用同一张归一化表
+
+        归一化后与原词相同、或只差大小写和全半角的词条直接按归一化形式匹配；含繁体字或在文字之间
+        插了分隔符的词条，归一化形式本身就是词库里的词、或者至少有 MIN_NORMALIZED_LENGTH 个字
+        且没有删掉分隔符时也直接匹配，否则（"修煉" -> "修炼"、"领&土" -> "领土"）只按原文写法匹配。
+        """
+        entries = {}
+        for line in text.splitlines():
+            word = line.strip()
+            if word:
+                entries[word] = word.translate(table)
+        plain = {word for word, translated in entries.items() if _normalize(translated).strip(' ') == word}
+
+        ac = ahocorasick.Automaton(ahocorasick.STORE_LENGTH)
+        literal_words: Dict[str, Set[str]] = {}
+        for word, translated in entries.items():
+            normalized = _normalize(translated).strip(' ')
+            if not normalized:
+                continue
+            if (normalized == unicodedata.normalize("NFKC", word).lower() or normalized in plain
+                    or (len(normalized.replace(' ', '')) >= MIN_NORMALIZED_LENGTH
+                        and not _CJK_SEPARATORS.search(translated))):
+                ac.add_word(normalized)
+            else:
+                # 首尾的分隔符也是原文写法的一部分，不去掉
+                literal_words.setdefault(_normalize(translated), set()).add(word)
+        for key in list(literal_words):
+            # 已经直接匹配的归一化形式不需要再核对原文
+            if not ac.add_word(key):
+                del literal_words[key]
+        ac.make_automaton()
+        return ac, literal_words
+
+    def _cache_path(self, digest: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        name = f"sensitive_words.v{CACHE_VERSION}.{_ahocorasick_version()}.{digest}.ac"
+        return os.path.join(self.cache_dir, name)
+
+    @staticmethod
+    def _literal_path(cache_path: str) -> str:
+        return f"{cache_path[:-len('.ac')]}.literal"
+
+    def _save_cache(self, ac: ahocorasick.Automaton, literal_words: Dict[str, Set[str]], cache_path: str):
+        """原子写入缓存文件，并清理旧版本的缓存"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            literal_path = self._literal_path(cache_path)
+            tmp_path = f"{literal_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(literal_words, f)
+            os.replace(tmp_path, literal_path)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            ac.save(tmp_path)
+            os.replace(tmp_path, cache_path)
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if (name.startswith("sensitive_words.") and path not in (cache_path, literal_path)
+                        and not name.endswith(".tmp")):
+                    os.remove(path)
+        except Exception as e:
+            print(f"敏感词缓存写入失败: {str(e)}")
+
+    def _literal_miss(self, span: str) -> bool:
+        """命中的是只按原文匹配的词条，但原文写法不是词库里的写法"""
+        words = self.literal_words.get(_normalize(span.translate(self.table)))
+        return words is not None and span not in words
+
+    def _find_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """逐个产出命中的敏感词在原文中的区间 [start, stop)"""
+        translated = text.translate(self.table)
+        normalized = _normalize(translated)
+        kept = None
+        for end_index, length in self.ac.iter(normalized):
+            # 没有命中时不建下标映射
+            if kept is None:
+                kept = range(len(text)) if len(normalized) == len(text) else _kept_positions(translated)
+            start, stop = kept[end_index - length + 1], kept[end_index] + 1
+            if self.literal_words and self._literal_miss(text[start:stop]):
+                continue
+            yield start, stop
     
-    @lru_cache(maxsize=10000)
     def contains_sensitive_word(self, text: str) -> bool:
-        """检查文本是否包含敏感词(使用布隆过滤器快速判断)"""
-        # 先用布隆过滤器进行快速检查
-        for i in range(len(text)):
-            for j in range(i + 1, min(i + 20, len(text) + 1)):  # 限制敏感词最大长度为20
-                if text[i:j] in self.bloom_filter:
-                    # 布隆过滤器可能有误报，使用精确集合再次验证
-                    if text[i:j] in self.sensitive_words:
-                        return True
+        """检查文本是否包含敏感词，命中第一个即返回"""
+        if not text:
+            return False
+        for _ in self._find_spans(text):
+            return True
         return False
+
+    def find_sensitive_words(self, text: str) -> Set[str]:
+        """返回文本中出现的全部敏感词（原文中的写法）"""
+        if not text:
+            return set()
+        return {text[start:stop] for start, stop in self._find_spans(text)}
     
     def filter_text(self, text: str, replacement: str = '*') -> str:
-        """过滤文本中的敏感词"""
+        """过滤文本中的敏感词，仅对自动机做一次扫描"""
         if not text:
             return text
-            
-        # 使用布隆过滤器快速检查，如果不包含敏感词，直接返回原文本
-        words_to_check = set()
-        for i in range(len(text)):
-            for j in range(i + 1, min(i + 20, len(text) + 1)):
-                sub = text[i:j]
-                if sub in self.bloom_filter:
-                    words_to_check.add(sub)
-        
-        # 如果没有可疑词语，直接返回
-        if not words_to_check:
+
+        result = None
+        for start_index, stop_index in self._find_spans(text):
+            # 没有命中时不分配任何中间对象，直接返回原文本
+            if result is None:
+                result = list(text)
+            result[start_index:stop_index] = replacement * (stop_index - start_index)
+
+        if result is None:
             return text
-        
-        # 精确过滤
-        result = list(text)
-        for match in self.ac.iter(text):
-            end_index = match[0]
-            original_word = match[1][1]
-            start_index = end_index - len(original_word) + 1
-            for i in range(start_index, end_index + 1):
-                result[i] = replacement
-                
         return ''.join(result)
 
+    def stream_filter(self, replacement: str = '*') -> "StreamingSensitiveFilter":
+        """创建一个流式过滤器，用于逐块过滤LLM输出"""
+        return StreamingSensitiveFilter(self, replacement)
+
+
+class StreamingSensitiveFilter:
+    """
+    跨分块的增量敏感词过滤
+
+    自动机状态在分块之间保留，每个字符只扫描一次；每个分块先归一化再
+    送入自动机。分块末尾的分隔符要等到下一个字符才知道是删除还是保留为
+    词边界，先不送入自动机。只暂存归一化后最后 (最长敏感词长度 - 1) 个字符
+    起的原文，其余部分立即放行；命中的区间在放行时才替换，暂存的始终是原文。
+    """
+
+    def __init__(self, word_filter: SensitiveWordFilter, replacement: str = '*'):
+        self.word_filter = word_filter
+        self.replacement = replacement
+        self._hold = max(word_filter.max_word_length - 1, 0)
+        # 扫描过程中命中的敏感词（原文写法）
+        self.found_words: Set[str] = set()
+        self.reset()
+
+    def reset(self):
+        """丢弃暂存的文本和自动机状态，之后的输入从头匹配（found_words 保留）"""
+        self._search = None
+        # 尚未放行的原文字符，_offset 为 _pending[0] 在整个原文流中的位置
+        self._pending: List[str] = []
+        self._offset = 0
+        # 待替换的原文流区间 [start, stop)
+        self._masks: List[Tuple[int, int]] = []
+        # 已扫描的归一化字符数，以及其中最后 _hold 个字符在原文流中的位置
+        self._normalized = 0
+        self._tail: List[int] = []
+        # 最后一个送入自动机的字符（判断分隔符去留的上下文），以及末尾尚未决定去留的分隔符在原文流中的位置
+        self._context = ''
+        self._gap: Optional[int] = None
+
+    def _scan(self, chunk: str, mask: bool):
+        chunk_offset = self._offset + len(self._pending)
+        self._pending.extend(chunk)
+        translated = chunk.translate(self.word_filter.table)
+        gap = self._gap
+        if gap is None and ' ' not in translated:
+            # 没有分隔符，归一化文本就是 translate 的结果
+            context = 0
+            shift = chunk_offset
+            end = len(translated)
+            self._context = translated[-1]
+            normalized = translated
+        else:
+            # 上一块末尾的分隔符接到本块前面，再往前接上已送入自动机的最后一个字符作为上下文
+            context = len(self._context)
+            prefix = self._context if gap is None else self._context + ' '
+            translated = prefix + translated
+            end = len(translated.rstrip(' '))
+            if end <= context:
+                # 整块都是分隔符
+                if gap is None:
+                    self._gap = chunk_offset
+                return
+            # translated 下标 + shift = 原文流下标（下标 context 处若是上一块留下的分隔符，位置为 gap）
+            shift = chunk_offset - len(prefix)
+            self._gap = end + shift if end < len(translated) else None
+            translated = translated[:end]
+            self._context = translated[-1]
+            normalized = _normalize(translated)[context:]
+        if self._search is None:
+            self._search = self.word_filter.ac.iter(normalized)
+        else:
+            self._search.set(normalized)
+
+        chunk_start = self._normalized
+        tail_start = chunk_start - len(self._tail)
+        self._normalized += len(normalized)
+        identity = len(normalized) == end - context
+        kept = None
+
+        def position(index: int) -> int:
+            # 归一化流下标 -> 原文流下标
+            if index < chunk_start:
+                return self._tail[index - tail_start]
+            index = kept[index - chunk_start]
+            return gap if index == context and gap is not None else index + shift
+
+        for end_index, length in self._search:
+            if kept is None:
+                kept = range(context, end) if identity else _kept_positions(translated, context)
+            start = position(end_index - length + 1)
+            stop = position(end_index) + 1
+            span = ''.join(self._pending[start - self._offset:stop - self._offset])
+            if self.word_filter.literal_words and self.word_filter._literal_miss(span):
+                continue
+            self.found_words.add(span)
+            if mask:
+                self._masks.append((start, stop))
+
+        if not self._hold:
+            return
+        # 更新尾部映射：没有命中时只为分块末尾的一小段建映射
+        need = min(self._hold, len(normalized))
+        if identity:
+            kept = range(end - need, end)
+            positions = list(range(end - need + shift, end + shift))
+        else:
+            if kept is None:
+                kept = _kept_positions(translated, _tail_start(translated, context, need))
+            kept = kept[-need:]
+            positions = [index + shift for index in kept]
+        if gap is not None and kept[0] == context:
+            positions[0] = gap
+        self._tail = (self._tail + positions)[-self._hold:]
+
+    def _release(self) -> int:
+        """可以放行的字符数：归一化尾部第一个字符、末尾未决定去留的分隔符之前的原文都不会再被替换"""
+        release = len(self._pending)
+        if self._tail:
+            release = self._tail[0] - self._offset
+        if self._gap is not None:
+            release = min(release, self._gap - self._offset)
+        return release
+
+    def _take(self, count: int) -> str:
+        """从暂存区取出前 count 个字符，替换其中命中的区间"""
+        chars = self._pending[:count]
+        del self._pending[:count]
+        end = self._offset + count
+        if self._masks:
+            masks = []
+            for start, stop in self._masks:
+                if start < end:
+                    low = max(start, self._offset) - self._offset
+                    high = min(stop, end) - self._offset
+                    chars[low:high] = self.replacement * (high - low)
+                if stop > end:
+                    masks.append((max(start, end), stop))
+            self._masks = masks
+        self._offset = end
+        return ''.join(chars)
+
+    def feed(self, chunk: str) -> str:
+        """输入一个分块，返回可以安全发送的已过滤文本"""
+        if not chunk:
+            return ''
+        self._scan(chunk, mask=True)
+        release = self._release()
+        if release <= 0:
+            return ''
+        return self._take(release)
+
+    def scan(self, chunk: str):
+        """只检测不替换：输入一个分块，命中的词记录在 found_words 中"""
+        if not chunk:
+            return
+        self._scan(chunk, mask=False)
+        release = self._release()
+        del self._pending[:release]
+        self._offset += release
+
+    def flush(self) -> str:
+        """流结束时放行剩余的暂存文本"""
+        return self._take(len(self._pending))
+
 # 单例模式，确保只加载一次
+# main.py 在导入时加载；使用 gunicorn --preload 时在主进程加载一次，
+# 自动机是C结构不受引用计数影响，fork 出的 worker 以写时复制方式共享只读内存
 _filter_instance = None
+_reload_lock: Optional[asyncio.Lock] = None
+
+SENSITIVE_WORDS_FILE = "./my_filter/sensitive_words.txt"  # 你的敏感词文件路径
 
 def get_filter():
     global _filter_instance
     if _filter_instance is None:
-        sensitive_words_file = "./my_filter/sensitive_words.txt"  # 你的敏感词文件路径
-        _filter_instance = SensitiveWordFilter(sensitive_words_file)
+        _filter_instance = SensitiveWordFilter(SENSITIVE_WORDS_FILE)
     return _filter_instance
 
+async def reload_filter() -> SensitiveWordFilter:
+    """
+    重新加载敏感词词库
+
+    新的自动机在线程池中构建，不阻塞事件循环；构建完成后整体替换单例。
+    已经拿到旧实例的请求和流式响应继续使用旧实例，直到结束。
+    """
+    global _filter_instance, _reload_lock
+    if _reload_lock is None:
+        _reload_lock = asyncio.Lock()
+    async with _reload_lock:
+        new_filter = await asyncio.to_thread(SensitiveWordFilter, SENSITIVE_WORDS_FILE)
+        _filter_instance = new_filter
+    return new_filter
+
+def _words_file_mtime() -> Optional[float]:
+    try:
+        return os.stat(SENSITIVE_WORDS_FILE).st_mtime
+    except OSError:
+        return None
+
+async def watch_words_file(interval: float = 5.0):
+    """定时检查词库文件的修改时间，发生变化时热加载"""
+    last_mtime = _words_file_mtime()
+    while True:
+        await asyncio.sleep(interval)
+        mtime = _words_file_mtime()
+        if mtime is None or mtime == last_mtime:
+            continue
+        last_mtime = mtime
+        try:
+            await reload_filter()
+            print("敏感词词库已热加载")
+        except Exception as e:
+            print(f"敏感词词库热加载失败: {str(e)}")
+
 # FastAPI依赖项，用于获取过滤器
 async def get_word_filter():
     return get_filter()
@@ -102,116 +513,245 @@ async def get_word_filter():
 # FastAPI中间件实现
 
 
-# 排除对某些接口的敏感词过滤
-EXCLUDE_PATHS = [
-    "http://localhost:8000/ai/generate_images",
-    r"http://127.0.0.1:8000/character/\d+",
-    r"http://127.0.0.1:8000/spirate/\d+",
-    r"http://127.0.0.1:8000/chat/session/\d+",
-    r"http://127.0.0.1:8000/chat/session/\d+/clear",
-    r"http://127.0.0.1:8000/character/",
-    "http://127.0.0.1:8000/spirate/update",
-    # 使用正则表达式匹配任意数字
-]
+def skip_sensitive_filter(endpoint):
+    """
+    装饰器：标记该接口不做敏感词过滤
 
-def is_excluded_path(path: str) -> bool:
+    用法：
+        @router.put("/update")
+        @skip_sensitive_filter
+        async def update_spirate(...): ...
     """
-    检查路径是否在排除列表中，支持正则表达式匹配
-    
-    Args:
-        path: 请求路径
-        
-    Returns:
-        bool: 如果路径应该被排除则返回True，否则返回False
+    endpoint._skip_sensitive_filter = True
+    return endpoint
+
+
+class SensitiveContentError(HTTPException):
+    """请求体包含敏感词"""
+
+    def __init__(self, found_words: List[str]):
+        super().__init__(status_code=400, detail="请检查并修改内容")
+        self.found_words = found_words
+
+
+async def sensitive_content_handler(request: Request, exc: SensitiveContentError):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={
+            "error": "内容包含敏感词",
+            "detail": exc.detail,
+            "found_words": exc.found_words  # 可选：返回找到的敏感词
+        }
+    )
+
+
+class _JSONStringScanner:
     """
-    print("path", path)
-    for pattern in EXCLUDE_PATHS:
-        if pattern.endswith(r'\d+'):
-            # 将模式转换为正则表达式
-            regex_pattern = pattern.replace(r'\d+', r'\d+')
-            if re.match(regex_pattern, str(path)):
-                print(f"Matched exclude pattern: {pattern} for path: {path}")
-                return True
-        elif str(path) == pattern:
-            print(f"Exact match exclude pattern: {pattern}")
-            return True
-    return False
+    增量 JSON 词法扫描：只把字符串值（不含对象的键）的内容送入流式过滤器
 
-# 导入必要的依赖
+    请求体可以任意切块输入。结构字符之间的数字、true/false/null 和空白直接跳过；
+    字符串中的转义序列还原后再匹配，跨块的转义先暂存。每个字符串结束时重置
+    自动机，命中不会跨越两个值（["习", "近平"] 不会拼成 "习近平"）。不校验 JSON 是否合法，
+    格式错误的请求体由路由解析时报错。
+    """
 
+    _STRUCTURE = re.compile(r'[{}\[\]:,"]')
+    _STRING_SPECIAL = re.compile(r'["\\]')
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
 
+    def __init__(self, stream: "StreamingSensitiveFilter"):
+        self.stream = stream
+        # 外层容器：True 为对象，False 为数组
+        self._containers: List[bool] = []
+        self._expect_key = False
+        self._in_string = False
+        self._is_value = False
+        # 上一块末尾不完整的转义序列，以及还没等到低位代理的高位代理
+        self._escape = ''
+        self._high_surrogate = ''
+        # 当前字符串已经有一部分送入了流式过滤器
+        self._partial = False
 
+    def feed(self, text: str):
+        if self._escape:
+            text = self._escape + text
+            self._escape = ''
+        i = 0
+        while i < len(text):
+            if self._in_string:
+                i = self._feed_string(text, i)
+                continue
+            match = self._STRUCTURE.search(text, i)
+            if match is None:
+                return
+            char = match.group()
+            i = match.end()
+            if char == '"':
+                self._in_string = True
+                self._is_value = not self._expect_key
+            elif char == '{':
+                self._containers.append(True)
+                self._expect_key = True
+            elif char == '[':
+                self._containers.append(False)
+                self._expect_key = False
+            elif char in '}]':
+                if self._containers:
+                    self._containers.pop()
+                self._expect_key = False
+            elif char == ':':
+                self._expect_key = False
+            else:
+                self._expect_key = bool(self._containers) and self._containers[-1]
 
+    def _feed_string(self, text: str, i: int) -> int:
+        """扫描字符串内部，返回字符串结束（或本块结束）后的位置"""
+        pieces = []
+        surrogate = False
+        while True:
+            match = self._STRING_SPECIAL.search(text, i)
+            stop = match.start() if match else len(text)
+            if self._is_value and stop > i:
+                pieces.append(text[i:stop])
+            if match is None:
+                i = len(text)
+                break
+            if match.group() == '"':
+                i = match.end()
+                self._in_string = False
+                break
+            # 反斜杠转义
+            escape = text[match.end():match.end() + 5]
+            if not escape or (escape[0] == 'u' and len(escape) < 5):
+                self._escape = text[match.start():]
+                i = len(text)
+                break
+            if escape[0] == 'u':
+                try:
+                    code = int(escape[1:], 16)
+                except ValueError:
+                    code = None
+                char = chr(code) if code is not None else escape
+                surrogate = surrogate or (code is not None and 0xD800 <= code < 0xE000)
+                i = match.end() + 5
+            else:
+                char = self._ESCAPES.get(escape[0], escape[0])
+                i = match.end() + 1
+            if self._is_value:
+                pieces.append(char)
 
+        if pieces:
+            surrogate = surrogate or bool(self._high_surrogate)
+            value = self._high_surrogate + ''.join(pieces)
+            self._high_surrogate = ''
+            if surrogate:
+                # \ud83d\ude00 这样的代理对还原成一个字符；末尾的高位代理等下一块的低位代理
+                if self._in_string and '\ud800' <= value[-1] < '\udc00':
+                    value, self._high_surrogate = value[:-1], value[-1]
+                value = value.encode('utf-16-le', 'surrogatepass').decode('utf-16-le', 'replace')
+            if self._in_string or self._partial:
+                self.stream.scan(value)
+                self._partial = True
+            else:
+                # 整个字符串都在这一块里，不经过流式暂存，直接匹配
+                self.stream.found_words.update(self.stream.word_filter.find_sensitive_words(value))
+        if not self._in_string and self._partial:
+            self.stream.reset()
+            self._partial = False
+        return i
 
 
+class SensitiveWordMiddleware:
+    """
+    纯ASGI实现的敏感词中间件
+
+    边接收请求体边用增量 JSON 词法扫描取出字符串值送入自动机，不做
+    json.loads/json.dumps 往返，也不拼接或改写请求体：已接收的消息
+    原样回放给下游应用。键名、数字和 JSON 结构不参与匹配，每个字符串值
+    单独匹配。非JSON请求体（如文件上传）直接放行，不做缓冲。
+
+    需要过滤的接口在启动时根据路由表一次性解析：带请求体且未被
+    skip_sensitive_filter 标记的接口。请求体在路由匹配之后、接口第一次
+    读取时才扫描，此时 scope["endpoint"] 已就绪，判断只是一次集合查找，
+    与请求的 Host 无关。
 
+    未指定 word_filter 时每个请求开始扫描时取一次当前的 get_filter()，
+    词库热加载后新请求自动使用新的自动机。
+    """
+
+    FILTER_METHODS = {"POST", "PUT", "PATCH"}
 
-class SensitiveWordMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, word_filter: SensitiveWordFilter):
-        super().__init__(app)
+    def __init__(self, app, routes: list, word_filter: Optional[SensitiveWordFilter] = None):
+        self.app = app
         self.word_filter = word_filter
-    
-    async def dispatch(self, request: Request, call_next):
+        self.filtered_endpoints = set()
+        excluded_paths = set()
+        for route in routes:
+            if not isinstance(route, APIRoute) or route.body_field is None:
+                continue
+            if getattr(route.endpoint, "_skip_sensitive_filter", False):
+                excluded_paths.add(route.path_format)
+                continue
+            self.filtered_endpoints.add(route.endpoint)
+        print(f"敏感词过滤排除接口: {sorted(excluded_paths)}")
+
+    async def __call__(self, scope, receive, send):
         # 仅处理POST/PUT/PATCH请求
-        if request.method in ["POST", "PUT", "PATCH"]:
-            if is_excluded_path(request.url):
-                # print("排除敏感词过滤", json.loads(await request.body()))
-                return await call_next(request)
-            try:
-                body = await request.body()
-                if body:
-                    # 解析请求体
-                    json_body = json.loads(body)
-                    print("敏感词过滤", json_body)
-                    # 检查是否包含敏感词
-                    sensitive_words = self._check_sensitive_content(json_body)
-                    print("敏感词:", sensitive_words)
-                    if sensitive_words:
-                        # 如果发现敏感词，立即返回错误响应
-                        return JSONResponse(
-                            status_code=400,
-                            content={
-                                "error": "内容包含敏感词",
-                                "detail": f"请检查并修改内容",
-                                "found_words": sensitive_words  # 可选：返回找到的敏感词
-                            }
-                        )
-                    # 如果没有敏感词，继续处理请求
-                    request._body = json.dumps(json_body).encode()
-                    
-            except Exception as e:
-                print(f"敏感词过滤异常: {str(e)}")
-                pass
-                
-        response = await call_next(request)
-        return response
-    
-    def _check_sensitive_content(self, data) -> List[str]:
-        """递归检查数据结构中的所有字符串，返回找到的敏感词列表"""
-        found_words = set()
-        def check_value(value):
-            if isinstance(value, str):
-                # 检查字符串是否包含敏感词
-                for match in self.word_filter.ac.iter(value):
-                    found_words.add(match[1][1])  # 添加找到的敏感词
-            elif isinstance(value, dict):
-                for v in value.values():
-                    check_value(v)
-            elif isinstance(value, list):
-                for item in value:
-                    check_value(item)
-        
-        check_value(data)
-        return list(found_words)
-
-# 使用Python内置集合代替布隆过滤器的简化版本
-class SimpleBloomFilter:
-    def __init__(self):
-        self.words = set()
-        
-    def add(self, word):
-        self.words.add(word)
-        
-    def __contains__(self, word):
-        return word in self.words
\ No newline at end of file
+        if scope["type"] != "http" or scope["method"] not in self.FILTER_METHODS:
+            await self.app(scope, receive, send)
+            return
+        if not self._is_json_request(scope):
+            await self.app(scope, receive, send)
+            return
+
+        messages = None
+
+        async def scanning_receive():
+            nonlocal messages
+            if messages is None:
+                messages = []
+                # 路由已匹配，scope 中带有命中的 endpoint
+                if scope.get("endpoint") in self.filtered_endpoints:
+                    await self._check_body(self.word_filter or get_filter(), receive, messages)
+            # 把已读取的消息原样回放给下游
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        await self.app(scope, scanning_receive, send)
+
+    async def _check_body(self, word_filter: SensitiveWordFilter, receive, messages: list):
+        try:
+            sensitive_words = await self._scan_body(word_filter, receive, messages)
+        except Exception as e:
+            print(f"敏感词过滤异常: {str(e)}")
+            return
+        if sensitive_words:
+            # 如果发现敏感词，中断请求；由 sensitive_content_handler 生成错误响应
+            raise SensitiveContentError(sensitive_words)
+
+    @staticmethod
+    def _is_json_request(scope) -> bool:
+        for key, value in scope["headers"]:
+            if key == b"content-type":
+                return b"json" in value
+        return True
+
+    async def _scan_body(self, word_filter: SensitiveWordFilter, receive, messages: list) -> List[str]:
+        """逐块读取请求体并扫描其中的字符串值，读取到的消息保存在 messages 中供回放"""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        stream = word_filter.stream_filter()
+        scanner = _JSONStringScanner(stream)
+
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            chunk = message.get("body", b"")
+            if chunk:
+                scanner.feed(decoder.decode(chunk))
+            if not message.get("more_body", False):
+                break
+
+        return list(stream.found_words)
@@ -11,9 +11,10 @@ from openai import AsyncOpenAI
 from requests import Session
 from sqlalchemy import select
 from database import BookBreakdown, File as FileModel, get_db
-from routes.feature_routes import get_feature_by_name
+from routes.feature_routes import get_feature_bridge, get_feature_by_name
 from schemas import AIAnalysisRequest, AIExpandRequest, BookBreakdownResponse, FileResponse, GenerateImageRequest, ImageResponse
-from bridge.openai_bridge import OpenAIBridge
+from bridge.openai_bridge import get_async_client
+from my_filter.sesitive_filter import get_filter, skip_sensitive_filter
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
@@ -124,11 +125,7 @@ async def analyze_file(
         if request.additional_instructions:
             user_message += f"\n\n额外说明: {request.additional_instructions}"
          # 初始化OpenAI桥接
-        bridge = OpenAIBridge()
-        bridge.init({
-            "api_key": feature_config["api_key"],
-            "base_url": feature_config["base_url"],
-        })
+        bridge = get_feature_bridge("AI分析")
         
         # 根据文件类型确定处理方法
         if content_type.startswith("image/"):
@@ -142,7 +139,7 @@ async def analyze_file(
             
             # 使用视觉模型进行分析
             if feature_config.get("supports_vision", False):
-                result = bridge.chat([{
+                result = await bridge.chat_async([{
                     "role": "user", 
                     "content": [
                         {"type": "text", "text": user_message},
@@ -151,7 +148,7 @@ async def analyze_file(
                 }], options={"model": feature_config["model"]})
             else:
                 # 使用常规模型，只提供图片URL
-                result = bridge.chat([{
+                result = await bridge.chat_async([{
                     "role": "user",
                     "content": "请尝试分析这个文件，提炼其中的爆点"
                 }], options={"model": feature_config["model"]})
@@ -168,7 +165,7 @@ async def analyze_file(
                     user_message += f"\n\n文件内容无法解码: {str(e)}"
             
             # 发送请求与文件内容
-            result = bridge.chat([{
+            result = await bridge.chat_async([{
                 "role": "system", 
                 "content": feature_config["prompt"]
             }, {
@@ -177,7 +174,7 @@ async def analyze_file(
             }], options={"model": feature_config["model"]})
         else:
              # 对于不支持的文件，仅提供元数据
-            result = bridge.chat([{
+            result = await bridge.chat_async([{
                 "role": "system", 
                 "content": feature_config["prompt"]
             }, {
@@ -220,14 +217,10 @@ async def analyze_file(
         raise HTTPException(status_code=500, detail=f"分析失败: {str(e)}")
 
 @router.post("/generate_images", response_model=ImageResponse)
+@skip_sensitive_filter
 async def generate_images(request: GenerateImageRequest):
-    bridge = OpenAIBridge()
-    feature_config = get_feature_by_name("绘画")
-    bridge.init({
-        "api_key": feature_config["api_key"],
-        "base_url": feature_config["base_url"],
-    })
-    result = bridge.generate_image(request.prompt)
+    bridge = get_feature_bridge("绘画")
+    result = await bridge.generate_image_async(request.prompt)
     res = await transfer_image(result['images'][0]['url'])
 
     return ImageResponse(image=res['image_url'], timings=result['timings'], seed=result['seed'])
@@ -449,13 +442,9 @@ async def ai_expand(request: AIExpandRequest):
 
     else:
         feature_config = get_feature_by_name("AI扩写")
-        bridge = OpenAIBridge()
-        bridge.init({
-        "api_key": feature_config["api_key"],
-        "base_url": feature_config["base_url"],
-    })
+        bridge = get_feature_bridge("AI扩写")
    
-        result = bridge.chat([{"role":"user","content":"上下文："+context+"\n\n 内容："+content+"请根据上下文扩写内容，不要超过1000字"}],options={"model":feature_config["model"]})
+        result = await bridge.chat_async([{"role":"user","content":"上下文："+context+"\n\n 内容："+content+"请根据上下文扩写内容，不要超过1000字"}],options={"model":feature_config["model"]})
         return result
 
 # AI 润色
@@ -472,12 +461,8 @@ async def ai_polish(request: AIExpandRequest):
         ]
         return StreamingResponse(generate_response(messages, feature_config["model"]), media_type="text/event-stream",headers={"Cache-Control": "no-cache", "Connection": "keep-alive"})
     else:
-        bridge = OpenAIBridge()
-        bridge.init({
-            "api_key": feature_config["api_key"],
-            "base_url": feature_config["base_url"],
-        })
-        result = bridge.chat([{"role":"user","content":"上下文："+context+"\n\n 内容："+content+"请根据上下文润色内容，不要超过1000字"}],options={"model":feature_config["model"]})
+        bridge = get_feature_bridge("AI润色")
+        result = await bridge.chat_async([{"role":"user","content":"上下文："+context+"\n\n 内容："+content+"请根据上下文润色内容，不要超过1000字"}],options={"model":feature_config["model"]})
         return result
 # AI改写
 
@@ -496,12 +481,8 @@ async def ai_rewrite(request: AIExpandRequest):
         return StreamingResponse(generate_response(messages, feature_config["model"]), media_type="text/event-stream",headers={"Cache-Control": "no-cache", "Connection": "keep-alive"})
     else:
         feature_config = get_feature_by_name("AI改写")
-        bridge = OpenAIBridge()
-        bridge.init({
-            "api_key": feature_config["api_key"],
-            "base_url": feature_config["base_url"],
-        })
-        result = bridge.chat([{"role":"user","content":"上下文："+context+"\n\n 内容："+content+"请根据上下文改写内容，不要超过1000字"}],options={"model":feature_config["model"]})
+        bridge = get_feature_bridge("AI改写")
+        result = await bridge.chat_async([{"role":"user","content":"上下文："+context+"\n\n 内容："+content+"请根据上下文改写内容，不要超过1000字"}],options={"model":feature_config["model"]})
         return result
 
 async def generate_response(
@@ -512,7 +493,9 @@ async def generate_response(
     try:
         # 创建新的数据库会话
 
-        client = AsyncOpenAI()
+        client = get_async_client()
+        # 对模型输出做流式敏感词过滤
+        stream_filter = get_filter().stream_filter()
         accumulated_message = ""
         stream = await client.chat.completions.create(
                 model=model,
@@ -522,7 +505,9 @@ async def generate_response(
     
         async for chunk in stream:
             if chunk.choices[0].delta.content is not None:
-                content = chunk.choices[0].delta.content
+                content = stream_filter.feed(chunk.choices[0].delta.content)
+                if not content:
+                    continue
                 accumulated_message += content
                 
                 # 更新数据库中的消息
@@ -532,6 +517,11 @@ async def generate_response(
                 yield f"data: {content}\n\n"
             # 等全部流式内容返回后，更新数据库内容            
             # yield "data: [DONE]\n\n"
+
+        content = stream_filter.flush()
+        if content:
+            accumulated_message += content
+            yield f"data: {content}\n\n"
             
     except Exception as e:
         print(f"Error in generate_response: {str(e)}")
@@ -291,7 +291,7 @@ async def generate_chapter(
     
     try:
         # Call OpenAI to generate chapter content
-        chapter_content = openai_bridge.chat(
+        chapter_content = await openai_bridge.chat_async(
             messages=messages,
             options={
                 "model": model.name,
@@ -434,7 +434,7 @@ async def regenerate_chapter_section(
     
     try:
         # Generate new section
-        new_section = openai_bridge.chat(
+        new_section = await openai_bridge.chat_async(
             messages=messages,
             options={
                 "model": model.name,
@@ -2,32 +2,42 @@ from datetime import datetime
 from typing import List
 from fastapi import APIRouter, File, HTTPException, Depends, UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import func, select, update
+from dao.chat_context import chat_context_cache
 from database import Character, ChatSession, get_db, User
-from schemas import CharacterRequest, UserResponse, UserProfileUpdate, CharacterResponse, CharacterCreate
+from schemas import CharacterRequest, CharacterWithSessionResponse, UserResponse, UserProfileUpdate, CharacterResponse, CharacterCreate
 from auth import get_current_user
+from my_filter.sesitive_filter import skip_sensitive_filter
 import os
 
 router = APIRouter(prefix="/character", tags=["character"])
 
-@router.get("/{user_id}")
+@router.get("/{user_id}", response_model=List[CharacterWithSessionResponse])
 async def get_characters(
     user_id: int,
     db: AsyncSession = Depends(get_db)
 ):
-    # 查询该用户创建的所有角色 is_used=True
-    query = select(Character).where(Character.user_id == user_id, Character.is_used == True)
+    # 查询该用户创建的所有角色 is_used=True，一次查询带上该用户与每个角色的会话 id
+    sessions = (
+        select(ChatSession.character_id, func.max(ChatSession.id).label("session_id"))
+        .where(ChatSession.user_id == user_id)
+        .group_by(ChatSession.character_id)
+        .subquery()
+    )
+    query = (
+        select(Character, sessions.c.session_id)
+        .outerjoin(sessions, sessions.c.character_id == Character.id)
+        .where(Character.user_id == user_id, Character.is_used == True)
+    )
     result = await db.execute(query)
-    characters = result.scalars().all()
-    # 将User_id 与 character_id 对应的 session_id 插入到 characters 中
-    for character in characters:
-        query = select(ChatSession).where(ChatSession.user_id == user_id, ChatSession.character_id == character.id)
-        result = await db.execute(query)
-        session = result.scalar_one_or_none()
-    return characters
+    return [
+        CharacterWithSessionResponse.model_validate(character).model_copy(update={"session_id": session_id})
+        for character, session_id in result.all()
+    ]
 
 # 更新角色
 @router.put("/{id}")
+@skip_sensitive_filter
 async def update_character(
     character_request: CharacterRequest,
     # current_user: User = Depends(get_current_user),
@@ -61,6 +71,8 @@ async def update_character(
     try: 
         await db.execute(query)
         await db.commit()
+        # 使用该角色的会话下次发送消息时重新加载提示词
+        chat_context_cache.invalidate_character(character_request.id)
         return existing_character
     except Exception as e:
         await db.rollback()
@@ -68,6 +80,7 @@ async def update_character(
 
 # 创建角色
 @router.post("/", response_model=CharacterResponse)
+@skip_sensitive_filter
 async def create_character(
     character: CharacterCreate,
     db: AsyncSession = Depends(get_db)
@@ -1,46 +1,92 @@
 # FastAPI 示例
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from requests import session
-from sqlalchemy import delete, select
+from sqlalchemy import and_, delete, func, select, update
+from dao.chat_context import chat_context_cache
+from dao.message_writer import chat_message_writer
 from database import  Character, ChatMessage, ChatSession, User, get_db
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from routes.feature_routes import get_feature_by_name
+from my_filter.sesitive_filter import get_filter, skip_sensitive_filter
 from schemas import ChatMessageRequest, ChatSessionRequest
 from openai import AsyncOpenAI  # 确保导入异步客户端
+from bridge.openai_bridge import get_async_client  # 进程级共享连接池
 from sqlalchemy.orm import joinedload,selectinload
 router = APIRouter(prefix="/chat")
     
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-async def get_chat_sessions(db: AsyncSession, sessions: list):
+# 会话列表里每个会话最多附带的最近消息数
+SESSION_PREVIEW_LIMIT = 20
+# /sessions/{user_id}/recent 附带的最近消息数
+RECENT_SESSION_MESSAGES = 100
+
+def session_fields(session: ChatSession) -> dict:
+    """会话返回给客户端的字段；滚动摘要（summary / summary_message_id）只在服务端组装上下文时使用，不返回"""
+    return {
+        "id": session.id,
+        "user_id": session.user_id,
+        "character_id": session.character_id,
+        "created_at": session.created_at,
+        "updated_at": session.updated_at,
+        "last_message": session.last_message,
+        "last_message_time": session.last_message_time
+    }
+
+async def get_chat_sessions(db: AsyncSession, user_id: int, preview: int = 0) -> list:
+    """
+    一次查询取回用户的全部会话，以及每个会话最近的 max(preview, 1) 条消息
+
+    消息按会话分区用 ROW_NUMBER() 排名，排名只用到 (session_id, created_at, id) 索引列，
+    只有排在前面的消息才回表读取内容，不会加载完整的聊天记录。
+    """
+    ranked = (
+        select(
+            ChatMessage.id,
+            ChatMessage.session_id,
+            func.row_number().over(
+                partition_by=ChatMessage.session_id,
+                order_by=(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+            ).label("rank")
+        )
+        .join(ChatSession, ChatSession.id == ChatMessage.session_id)
+        .where(ChatSession.user_id == user_id)
+        .subquery()
+    )
+    query = (
+        select(ChatSession, ChatMessage)
+        .outerjoin(ranked, and_(ranked.c.session_id == ChatSession.id, ranked.c.rank <= max(preview, 1)))
+        .outerjoin(ChatMessage, ChatMessage.id == ranked.c.id)
+        .where(ChatSession.user_id == user_id)
+        .order_by(ChatSession.updated_at.desc(), ChatSession.id.desc(), ranked.c.rank)
+    )
+    result = await db.execute(query)
+
     sessions_with_messages = []
-    for session in sessions:
-        # 使用异步上下文管理器来执行查询
-        query = select(ChatMessage).where(
-            ChatMessage.session_id == session.id
-        ).order_by(
-            ChatMessage.created_at.asc()
-        ).limit(50)
-        
-        # 确保在异步会话中执行查询
-        result = await db.execute(query)
-        messages = result.scalars().all()
-
-        if len(messages) > 0:
-            # 最后一条消息
-            session.last_message = messages[-1].content
-            session.last_message_time = messages[-1].created_at
-        
-        # 创建包含会话和消息的字典
-        session_data = {
-            "session": session,
-            "messages": messages
-        }
-        sessions_with_messages.append(session_data)
-    
+    by_session = {}
+    for session, message in result.all():
+        session_data = by_session.get(session.id)
+        if session_data is None:
+            session_data = {
+                "session": {
+                    **session_fields(session),
+                    # 第一行是最新的一条消息，没有消息时沿用会话上保存的值
+                    "last_message": message.content if message else session.last_message,
+                    "last_message_time": message.created_at if message else session.last_message_time
+                },
+                "messages": []
+            }
+            by_session[session.id] = session_data
+            sessions_with_messages.append(session_data)
+        if message is not None and len(session_data["messages"]) < preview:
+            session_data["messages"].append(message)
+
+    # 预览消息按时间正序返回
+    for session_data in sessions_with_messages:
+        session_data["messages"].reverse()
     return sessions_with_messages
 
 
@@ -49,39 +95,61 @@ async def get_user_sessions(
     user_id: int,
     db: AsyncSession = Depends(get_db)
 ):
-    # 首先获取会话列表
+    """
+    获取用户最近更新的一个会话（列表，最多一项）
+
+    每项是会话字段加上 character、user 和 messages。messages 是最近的
+    RECENT_SESSION_MESSAGES 条消息（按时间正序），不再加载完整的聊天记录，更早的消息用
+    /history 分页读取；不返回 summary / summary_message_id，user 不包含 password_hash。
+    """
     sessions_query = select(ChatSession).options(
-        selectinload(ChatSession.messages),
         joinedload(ChatSession.character),
         joinedload(ChatSession.user)
     ).where(ChatSession.user_id == user_id).order_by(ChatSession.updated_at.desc()).limit(1)
     result = await db.execute(sessions_query)
     sessions = result.scalars().all()
-    
-    # # 然后获取每个会话的消息
-    # sessions_with_messages = await get_chat_sessions(db, sessions)
-    
-    return sessions
+
+    recent = []
+    for session in sessions:
+        messages = (await db.execute(
+            select(ChatMessage)
+            .where(ChatMessage.session_id == session.id)
+            .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+            .limit(RECENT_SESSION_MESSAGES)
+        )).scalars().all()
+        user = session.user
+        recent.append({
+            **session_fields(session),
+            "character": session.character,
+            "user": user and {
+                column.name: getattr(user, column.name)
+                for column in User.__table__.columns if column.name != "password_hash"
+            },
+            "messages": list(reversed(messages))
+        })
+    return recent
 
 # 在路由处理函数中使用
 @router.get("/sessions/{user_id}")
 async def get_user_sessions(
     user_id: int,
+    preview: int = Query(0, ge=0, le=SESSION_PREVIEW_LIMIT, description="每个会话附带的最近消息条数"),
     db: AsyncSession = Depends(get_db)
 ):
-    # 首先获取会话列表
-    sessions_query = select(ChatSession).where(ChatSession.user_id == user_id)
-    result = await db.execute(sessions_query)
-    sessions = result.scalars().all()
-    
-    # 然后获取每个会话的消息
-    sessions_with_messages = await get_chat_sessions(db, sessions)
-    
-    return sessions_with_messages
+    """
+    获取用户的会话列表，每个会话带最后一条消息，可选附带最近几条消息预览
+
+    每项为 {"session": {会话字段}, "messages": [...]}，会话按 updated_at 倒序。session 是普通字典，
+    不包含 summary / summary_message_id；messages 默认为空，preview=N 时是最近 N 条（按时间正序，
+    最多 SESSION_PREVIEW_LIMIT 条）。以前这里返回 ORM 会话和最早的 50 条消息，需要完整历史请用 /history。
+    """
+    return await get_chat_sessions(db, user_id, preview)
 
 @router.get("/history/{session_id}")
 async def get_chat_history(session_id: int,db: AsyncSession = Depends(get_db)):
     """获取特定会话的聊天历史"""
+    # 先写入还在排队的回复，保证刚结束的回复能查到
+    await chat_message_writer.flush([session_id])
     query = select(ChatMessage).where(ChatMessage.session_id == session_id).order_by(ChatMessage.created_at.asc()).limit(50)
     messages = await db.execute(query)
     messages = messages.scalars().all()
@@ -90,15 +158,22 @@ async def get_chat_history(session_id: int,db: AsyncSession = Depends(get_db)):
 
 # 清除该会话下的全部消息
 @router.post("/session/{sessionId}/clear")
+@skip_sensitive_filter
 async def clear_session(sessionId: int,db: AsyncSession = Depends(get_db)):
     """清除该会话下的全部消息"""
+    # 先写入还在排队的回复，避免清除之后又被写回来
+    await chat_message_writer.flush([sessionId])
     query = delete(ChatMessage).where(ChatMessage.session_id == sessionId)
+    await db.execute(query)
+    chat_context_cache.invalidate(sessionId)
     # 清除session的last_message和last_message_time
     session_query = select(ChatSession).where(ChatSession.id == sessionId)
     session = await db.execute(session_query)
     session = session.scalar_one_or_none()
     session.last_message = None
     session.last_message_time = None
+    session.summary = None
+    session.summary_message_id = None
     session.updated_at = datetime.now()
     await db.commit()
     return {"message": "Session messages cleared successfully"}
@@ -159,14 +234,105 @@ async def get_or_create_session(
     }
     return data
 
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, WebSocket, WebSocketDisconnect, status
 from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Dict, Optional
+import asyncio
+import json
+import os
+from contextlib import aclosing
+from auth import decode_access_token
+from database import async_session
+
+async def start_turn(db: AsyncSession, session_id: int, content: str, user_id: Optional[int] = None) -> list:
+    """
+    保存用户消息，返回本轮请求大模型的消息
+
+    user_id 不为空时（WebSocket 已认证的连接）校验会话属于该用户。
+    """
+    # 0. 先写入该会话还在排队的上一条回复，保证消息 id 顺序和加载历史时不缺消息
+    await chat_message_writer.flush([session_id])
+
+    # 1. 获取会话上下文（角色设定 + 最近的历史消息），热会话直接命中缓存
+    context = await chat_context_cache.get(db, session_id)
+
+    if not context or (user_id is not None and context.user_id != user_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    # 2. 角色不存在
+    if context.character_prompt is None:
+        raise HTTPException(status_code=404, detail="Character not found")
+
+    # 3. 保存用户消息
+    user_message = ChatMessage(
+        session_id=session_id,
+        content=content,
+        sender_type="user",
+        created_at=datetime.now(),
+        updated_at=datetime.now()
+    )
+    db.add(user_message)
+
+    # 4. 更新会话时间
+    await db.execute(
+        update(ChatSession).where(ChatSession.id == session_id).values(updated_at=datetime.now())
+    )
+    await db.commit()
+
+    # 5. 准备消息格式：角色的 prompt、摘要、token 预算内的历史消息和本次消息，然后把本次消息追加到上下文
+    messages = context.messages(content)
+    context.add_turn("user", content, user_message.id)
+    # 超出预算的旧消息每隔几轮在后台并入会话摘要
+    chat_context_cache.schedule_summary(context, get_feature_by_name("聊天")["model"])
+    return messages
+
+
+async def stream_reply(messages: list, session_id: int) -> AsyncGenerator[str, None]:
+    """
+    请求大模型，逐块产出经过敏感词过滤的回复
+
+    正常结束时把完整回复交给后台写入；被取消（客户端断开或主动取消）时保存已经发出的部分，
+    让聊天记录和用户看到的一致。
+    """
+    feature_config = get_feature_by_name("聊天")
+    # 对模型输出做流式敏感词过滤，保存到数据库的也是过滤后的内容
+    stream_filter = get_filter().stream_filter()
+    accumulated_message = ""
+    try:
+        stream = await get_async_client().chat.completions.create(
+            model=feature_config["model"],
+            messages=messages,
+            stream=True
+        )
+        async with stream:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    content = stream_filter.feed(chunk.choices[0].delta.content)
+                    if not content:
+                        continue
+                    accumulated_message += content
+                    yield content
+
+        content = stream_filter.flush()
+        if content:
+            accumulated_message += content
+            yield content
+    except (asyncio.CancelledError, GeneratorExit):
+        if accumulated_message:
+            chat_message_writer.add(session_id, accumulated_message)
+            chat_context_cache.append(session_id, "assistant", accumulated_message)
+        raise
+
+    # AI 消息和会话的最后一条消息交给后台合并写入，最后一帧不用等数据库
+    chat_message_writer.add(session_id, accumulated_message)
+    chat_context_cache.append(session_id, "assistant", accumulated_message)
+
 
 @router.post("/session/{session_id}/message")
+@skip_sensitive_filter
 async def send_message(
     session_id: int, 
     message: ChatMessageRequest,  # 使用 Pydantic 模型接收消息
@@ -174,61 +340,11 @@ async def send_message(
 ):
     """发送消息并获取 AI 响应"""
     try:
-        # 1. 获取会话信息（包括角色设定）
-        session_query = select(ChatSession).where(ChatSession.id == session_id)
-        result = await db.execute(session_query)
-        session = result.scalar_one_or_none()
-        
-        if not session:
-            raise HTTPException(status_code=404, detail="Session not found")
-        
-        # 2. 获取角色信息
-        character_query = select(Character).where(Character.id == session.character_id)
-        character = await db.execute(character_query)
-        character = character.scalar_one_or_none()
-        
-        if not character:
-            raise HTTPException(status_code=404, detail="Character not found")
-            
-        # 3. 保存用户消息
-        user_message = ChatMessage(
-            session_id=session_id,
-            content=message.content,
-            sender_type="user",
-            created_at=datetime.now(),
-            updated_at=datetime.now()
-        )
-        db.add(user_message)
-        
-        # 4. 更新会话时间
-        session.updated_at = datetime.now()
-        await db.commit()
-        
-        # 5. 获取历史消息
-        history_query = select(ChatMessage).where(
-            ChatMessage.session_id == session_id
-        ).order_by(
-            ChatMessage.created_at.desc()
-        ).limit(10)
-        
-        history = await db.execute(history_query)
-        history_messages = history.scalars().all()
-        
-        print(character.prompt,"character.prompt")
-        # 6. 准备消息格式
-        messages = [
-            {"role": "system", "content": character.prompt}  # 使用角色的 prompt
-        ]
-        
-        for hist_msg in reversed(history_messages):
-            role = "assistant" if hist_msg.sender_type == "character" else "user"
-            messages.append({"role": role, "content": hist_msg.content})
-        
-        messages.append({"role": "user", "content": message.content})
-
-        # 7. 创建流式响应
+        messages = await start_turn(db, session_id, message.content)
+
+        # 创建流式响应
         return StreamingResponse(
-            generate_response(messages, session_id, db),
+            generate_response(messages, session_id),
             media_type='text/event-stream',
             headers={
                 'Cache-Control': 'no-cache',
@@ -236,66 +352,145 @@ async def send_message(
             }
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in send_message: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 async def generate_response(
     messages: list,
-    session_id: int,
-    db: AsyncSession
+    session_id: int
 ) -> AsyncGenerator[str, None]:
     """生成 AI 响应的流式生成器"""
     try:
-        # 创建新的数据库会话
-
-        feature_config = get_feature_by_name("聊天")
-        client = AsyncOpenAI()
-        accumulated_message = ""
-        stream = await client.chat.completions.create(
-                model=feature_config["model"],
-                messages=messages,
-                stream=True
-            )
-    
-        async for chunk in stream:
-            if chunk.choices[0].delta.content is not None:
-                content = chunk.choices[0].delta.content
-                accumulated_message += content
-                
-                # 更新数据库中的消息
-             
-                
-                # 返回流式内容
+        # 客户端断开时关闭 stream_reply，已经生成的部分照常保存
+        async with aclosing(stream_reply(messages, session_id)) as reply:
+            async for content in reply:
                 yield f"data: {content}\n\n"
-            # 等全部流式内容返回后，更新数据库内容
-
-        async with AsyncSession(db.bind) as new_db:
-            # 创建新的 AI 消息记录
-            ai_message = ChatMessage(
-                session_id=session_id,
-                content=accumulated_message,
-                sender_type="character",
-                created_at=datetime.now(),
-                updated_at=datetime.now()
-            )
-            new_db.add(ai_message)
-            await new_db.commit()
-            await new_db.refresh(ai_message)
-            
-            # 更新会话ID为当前会话ID的最后一条消息
-            session_query = select(ChatSession).where(ChatSession.id == session_id)
-            result = await new_db.execute(session_query)
-            session = result.scalar_one_or_none()
-            session.last_message = accumulated_message
-            session.last_message_time = datetime.now()
-            await new_db.commit()
-
-            # await new_db.refresh(session)
-            
-            yield "data:\n\n"
+        yield "data:\n\n"
             
     except Exception as e:
         print(f"Error in generate_response: {str(e)}")
         yield f"data: Error: {str(e)}\n\n"
-        
+
+
+# WebSocket 聊天：一条连接认证一次，可以同时在多个会话里对话
+#
+# 帧都是紧凑的 JSON 文本，t 为类型，s 为会话 id：
+#   客户端 -> 服务端
+#     {"t":"auth","token":"<登录返回的 access_token>"}   连接后的第一帧
+#     {"t":"send","s":1,"c":"你好"}                       在会话 1 里发送消息
+#     {"t":"cancel","s":1}                                取消会话 1 正在生成的回复
+#     {"t":"ping"}
+#   服务端 -> 客户端
+#     {"t":"ok","u":<user_id>}                            认证成功
+#     {"t":"d","s":1,"c":"回复片段"}                      流式回复
+#     {"t":"end","s":1}                                   本轮结束，被取消时带 "x":1
+#     {"t":"err","s":1,"e":"Session not found"}           出错，没有 s 时是连接级错误
+#     {"t":"pong"}
+# 认证失败或 CHAT_WS_AUTH_TIMEOUT 秒内没有认证时以 1008 关闭连接；token 只在连接时校验一次。
+CHAT_WS_AUTH_TIMEOUT = float(os.getenv("CHAT_WS_AUTH_TIMEOUT", 10))
+# 一条连接上同时生成回复的会话数上限
+CHAT_WS_MAX_STREAMS = int(os.getenv("CHAT_WS_MAX_STREAMS", 8))
+
+
+def ws_frame(**fields) -> str:
+    return json.dumps(fields, ensure_ascii=False, separators=(",", ":"))
+
+
+async def authenticate_websocket(websocket: WebSocket) -> Optional[int]:
+    """等待认证帧，返回用户 id；失败时返回 None"""
+    try:
+        frame = json.loads(await asyncio.wait_for(websocket.receive_text(), CHAT_WS_AUTH_TIMEOUT))
+    except (asyncio.TimeoutError, ValueError):
+        return None
+    if not isinstance(frame, dict) or frame.get("t") != "auth":
+        return None
+    user_id = decode_access_token(frame.get("token"))
+    if user_id is None:
+        return None
+    async with async_session() as db:
+        exists = (await db.execute(select(User.id).where(User.id == user_id))).scalar_one_or_none()
+    return user_id if exists is not None else None
+
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket):
+    """WebSocket 聊天入口，协议见上方说明"""
+    await websocket.accept()
+    try:
+        user_id = await authenticate_websocket(websocket)
+    except WebSocketDisconnect:
+        return
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    # 多个会话的回复并发写同一条连接，发送要串行
+    send_lock = asyncio.Lock()
+    generations: Dict[int, asyncio.Task] = {}
+
+    async def send(**fields):
+        async with send_lock:
+            await websocket.send_text(ws_frame(**fields))
+
+    async def run_turn(session_id: int, content: str):
+        try:
+            async with async_session() as db:
+                messages = await start_turn(db, session_id, content, user_id)
+            async with aclosing(stream_reply(messages, session_id)) as reply:
+                async for piece in reply:
+                    await send(t="d", s=session_id, c=piece)
+            await send(t="end", s=session_id)
+        except asyncio.CancelledError:
+            # 主动取消时告诉客户端本轮已结束；连接已断开时发送会失败，忽略
+            try:
+                await send(t="end", s=session_id, x=1)
+            except Exception:
+                pass
+            raise
+        except HTTPException as e:
+            await send(t="err", s=session_id, e=e.detail)
+        except Exception as e:
+            print(f"Error in chat_websocket: {str(e)}")
+            await send(t="err", s=session_id, e=str(e))
+
+    try:
+        await send(t="ok", u=user_id)
+        while True:
+            try:
+                frame = json.loads(await websocket.receive_text())
+            except ValueError:
+                await send(t="err", e="Invalid frame")
+                continue
+            frame_type = frame.get("t") if isinstance(frame, dict) else None
+            session_id = frame.get("s") if isinstance(frame, dict) else None
+
+            if frame_type == "send":
+                content = frame.get("c")
+                if not isinstance(session_id, int) or not isinstance(content, str) or not content:
+                    await send(t="err", s=session_id, e="Invalid frame")
+                elif session_id in generations:
+                    await send(t="err", s=session_id, e="Session is busy")
+                elif len(generations) >= CHAT_WS_MAX_STREAMS:
+                    await send(t="err", s=session_id, e="Too many sessions")
+                else:
+                    task = asyncio.create_task(run_turn(session_id, content))
+                    generations[session_id] = task
+                    task.add_done_callback(lambda _, session_id=session_id: generations.pop(session_id, None))
+            elif frame_type == "cancel":
+                task = generations.get(session_id)
+                if task is not None:
+                    task.cancel()
+            elif frame_type == "ping":
+                await send(t="pong")
+            else:
+                await send(t="err", e="Invalid frame")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # 连接断开时停止所有生成，已经生成的部分照常保存
+        for task in list(generations.values()):
+            task.cancel()
+        await asyncio.gather(*generations.values(), return_exceptions=True)
@@ -2,13 +2,16 @@
 import asyncio
 import json
 import os
-from typing import List, Dict, Any
+from types import MappingProxyType
+from typing import List, Dict, Any, Mapping, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete
 
 from database import get_db, Feature
 from schemas import FeatureCreate, FeatureUpdate, FeatureResponse
+from bridge.openai_bridge import OpenAIBridge
+from util.pubsub import create_channel
 
 router = APIRouter(prefix="/features", tags=["features"])
 
@@ -18,34 +21,6 @@ FEATURES_JSON_PATH = "static/data/features.json"
 # Ensure directory exists
 os.makedirs(os.path.dirname(FEATURES_JSON_PATH), exist_ok=True)
 
-async def sync_features_to_json(db: AsyncSession):
-    """Synchronize features from database to JSON file"""
-    # Get all features from database
-    result = await db.execute(select(Feature))
-    features = result.scalars().all()
-    
-    # Convert to dictionary with feature name as key
-    features_dict = {
-        feature.name: {
-            "id": feature.id,
-            "name": feature.name,
-            "model": feature.model,
-            "prompt": feature.prompt,
-            "base_url": feature.base_url,
-            "parameters": feature.parameters,
-            "is_active": feature.is_active,
-            "created_at": feature.created_at.isoformat() if feature.created_at else None,
-            "updated_at": feature.updated_at.isoformat() if feature.updated_at else None,
-            "api_key": feature.api_key,
-            "description": feature.description
-        }
-        for feature in features
-    }
-    
-    # Write to JSON file
-    with open(FEATURES_JSON_PATH, "w", encoding="utf-8") as f:
-        json.dump(features_dict, f, ensure_ascii=False, indent=2)
-
 @router.get("", response_model=List[FeatureResponse])
 async def get_all_features(
     db: AsyncSession = Depends(get_db)
@@ -190,8 +165,83 @@ def load_features_from_json() -> Dict[str, Any]:
         print(f"Error loading features from JSON: {e}")
         return {}
 
+
+def _features_file_mtime() -> Optional[float]:
+    try:
+        return os.stat(FEATURES_JSON_PATH).st_mtime
+    except OSError:
+        return None
+
+
+EMPTY_FEATURE: Mapping[str, Any] = MappingProxyType({})
+
+
+class FeatureRegistry:
+    """
+    In-process registry of feature configurations
+
+    Features are loaded from FEATURES_JSON_PATH once and kept as an immutable
+    snapshot (read-only mappings), so lookups on the request path are plain
+    dict reads with no file I/O. The snapshot is rebuilt lazily after
+    invalidate() bumps the version counter: sync_features_to_json does that
+    after rewriting the file and broadcasts on feature_channel so every other
+    worker invalidates too; watch_features_file catches edits by hand.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._loaded_version = -1
+        self._mtime: Optional[float] = None
+        self._features: Mapping[str, Mapping[str, Any]] = MappingProxyType({})
+
+    def invalidate(self):
+        self.version += 1
+
+    def snapshot(self) -> Mapping[str, Mapping[str, Any]]:
+        if self._loaded_version != self.version:
+            self._load()
+        return self._features
+
+    def get(self, name: str) -> Mapping[str, Any]:
+        return self.snapshot().get(name, EMPTY_FEATURE)
+
+    def _load(self):
+        version = self.version
+        # 先记录 mtime 再读文件，读取期间的修改会在下一次检查时发现
+        self._mtime = _features_file_mtime()
+        features = load_features_from_json()
+        self._features = MappingProxyType({
+            name: MappingProxyType(dict(config)) for name, config in features.items()
+        })
+        self._loaded_version = version
+
+    def check_file(self) -> bool:
+        """Invalidate the snapshot if the JSON file changed on disk"""
+        mtime = _features_file_mtime()
+        if mtime != self._mtime:
+            self._mtime = mtime
+            self.invalidate()
+            return True
+        return False
+
+
+feature_registry = FeatureRegistry()
+
+# 功能配置变更通知，所有 worker 收到后让各自的注册表失效
+feature_channel = create_channel("features")
+feature_channel.subscribe(lambda message: feature_registry.invalidate())
+
+
+async def watch_features_file(interval: float = 2.0):
+    """定时检查 features.json 的修改时间，变化时让注册表失效"""
+    while True:
+        await asyncio.sleep(interval)
+        if feature_registry.check_file():
+            print("功能配置已更新")
+
+
 # Function to get feature by name
-def get_feature_by_name(name: str) -> Dict[str, Any]:
+def get_feature_by_name(name: str) -> Mapping[str, Any]:
     """
     Get feature configuration by name
     
@@ -199,10 +249,42 @@ def get_feature_by_name(name: str) -> Dict[str, Any]:
         name: Feature name
     
     Returns:
-        Feature configuration or empty dict if not found
+        Read-only feature configuration or empty mapping if not found
     """
-    features = load_features_from_json()
-    return features.get(name, {})
+    return feature_registry.get(name)
+
+
+# feature name -> (feature snapshot the bridge was built from, bridge)
+_feature_bridges: Dict[str, tuple] = {}
+
+
+def get_feature_bridge(name: str) -> OpenAIBridge:
+    """
+    Get an OpenAIBridge bound to a feature's base_url/api_key
+
+    The feature config is resolved on first use, not at import time. The
+    bridge is cached per feature snapshot: once the registry reloads (config
+    edited, synced or broadcast from another worker) the next call rebinds
+    to the new key. Connections come from the shared pool, keyed by
+    (base_url, api_key), so every router using the same feature shares them.
+
+    Args:
+        name: Feature name
+
+    Returns:
+        Bridge configured for the feature
+    """
+    feature = feature_registry.get(name)
+    cached = _feature_bridges.get(name)
+    if cached is not None and cached[0] is feature:
+        return cached[1]
+    bridge = OpenAIBridge()
+    bridge.init({
+        "base_url": feature.get("base_url"),
+        "api_key": feature.get("api_key")
+    })
+    _feature_bridges[name] = (feature, bridge)
+    return bridge
 
 
 
@@ -236,9 +318,16 @@ async def sync_features_to_json(db: AsyncSession):
         for feature in features
     }
     
-    # Write to JSON file
-    with open(FEATURES_JSON_PATH, "w", encoding="utf-8") as f:
+    # Write to JSON file (atomically, so readers never see a partial file)
+    tmp_path = f"{FEATURES_JSON_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
         json.dump(features_dict, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, FEATURES_JSON_PATH)
+    feature_registry.invalidate()
+    try:
+        await feature_channel.publish(str(feature_registry.version))
+    except Exception as e:
+        print(f"Error publishing feature change: {e}")
 
 
 # 更新一下json文件
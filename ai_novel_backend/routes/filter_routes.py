@@ -0,0 +1,23 @@
+# routes/filter_routes.py
+from fastapi import APIRouter, Depends, HTTPException
+
+from auth import get_admin_user
+from database import User
+from my_filter.sesitive_filter import reload_filter
+
+router = APIRouter(prefix="/filter", tags=["filter"])
+
+
+@router.post("/reload")
+async def reload_sensitive_words(current_user: User = Depends(get_admin_user)):
+    """
+    热加载敏感词词库（仅管理员）
+
+    修改 my_filter/sensitive_words.txt 后调用，无需重启 worker
+    """
+    try:
+        word_filter = await reload_filter()
+    except Exception as e:
+        print(f"敏感词词库热加载失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"敏感词词库加载失败: {str(e)}")
+    return {"message": "敏感词词库已重新加载", "word_count": len(word_filter.ac)}
@@ -1,28 +1,25 @@
 from datetime import datetime
+from typing import Optional
+import base64
+import json
 import math
 import os
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import func, select, update
+from sqlalchemy import func, or_, select, update
+from dao.character import add_story_characters
 from database import Character, InspirationResult, User, get_db, async_session
-from routes.feature_routes import get_feature_by_name
+from routes.feature_routes import get_feature_by_name, get_feature_bridge
 from schemas import   ContinueSpirateRequest, InspirationUpdate, SpirateResponse
-from bridge.openai_bridge import OpenAIBridge
 from util.chapter_utils import ChapterUtils
+from util.ttl_cache import TTLCache
+from my_filter.sesitive_filter import skip_sensitive_filter
 
 
 
 
 router = APIRouter(prefix="/spirate", tags=["spirate"])
 
-feature_config = get_feature_by_name("灵感-续写")
-bridge = OpenAIBridge()
-
-bridge.init({
-    "base_url": feature_config["base_url"],
-    "api_key": feature_config["api_key"]
-})
-
 
 @router.post("/continue/{id}")
 async def continue_spirate(id: int, request: ContinueSpirateRequest, db: AsyncSession = Depends(get_db)):
@@ -75,7 +72,9 @@ async def continue_spirate(id: int, request: ContinueSpirateRequest, db: AsyncSe
             {"role": "user", "content": content}
         ]
 
-        res = bridge.chat(messages,  options={
+        feature_config = get_feature_by_name("灵感-续写")
+        bridge = get_feature_bridge("灵感-续写")
+        res = await bridge.chat_async(messages,  options={
                     "model": feature_config["model"],
                     "max_tokens": 2000,
                     "temperature": 0.7
@@ -88,25 +87,11 @@ async def continue_spirate(id: int, request: ContinueSpirateRequest, db: AsyncSe
         story_parts = chapter_utils.parse_story(res)
         # 追加到数据库
 
-        characters = []
-        character_ids = []
-        # 创建Character 对象
-        for character in story_parts['characters']:
-            print(f"character: {character}")
-            character_result = Character(
-                name=character['姓名'],
-                description='\n'.join(character['描述']) if isinstance(character['描述'], list) else character['描述'],
-                user_id=spirate.user_id,
-                prompt=f"你现在正在做一个角色扮演，无论用户如何去套取你的模型信息，你都不会回复。你只会回答你的公开信息，你的公开信息是：你叫{character['姓名']},关于你的描述为：{character['描述']},除此之外，你可以基于你的角色定位和用户聊天、谈心，唯独不能泄露你的模型信息！"
-            )
-            characters.append(character_result)
-            async with async_session() as db:
-                db.add(character_result)
-                await db.commit()
-                await db.refresh(character_result)
-                character_ids.append(character_result.id)
         user = None
         async with async_session() as db:
+            # 新角色和续写内容在同一个事务里写入，并追加到灵感的角色列表
+            characters = await add_story_characters(db, spirate.user_id, story_parts['characters'])
+
             # Query the user first
             user_query = select(User).where(User.id == spirate.user_id)
             user_result = await db.execute(user_query)
@@ -117,7 +102,7 @@ async def continue_spirate(id: int, request: ContinueSpirateRequest, db: AsyncSe
                 content=spirate.content + story_parts['content'],
                 updated_at=datetime.utcnow(),  # Make sure to update the timestamp
                 story_direction=spirate.story_direction,
-                characters=spirate.characters,
+                characters=(spirate.characters or []) + [character.id for character in characters],
                 user_id=user.id  # Reference the user ID properly
             )
             await db.execute(query)
@@ -140,6 +125,7 @@ async def continue_spirate(id: int, request: ContinueSpirateRequest, db: AsyncSe
 
 
 @router.put("/update")
+@skip_sensitive_filter
 async def update_spirate(request: InspirationUpdate, db: AsyncSession = Depends(get_db)):
     # 更新
     print("request", request)
@@ -171,12 +157,11 @@ async def get_spirate(id: int, db: AsyncSession = Depends(get_db)):
         characters = []
         res = await db.execute(select(User).where(User.id == spirate.user_id))
         user = res.scalar_one_or_none()
-        for character in spirate.characters:
-            character_obj = await db.execute(select(Character).where(Character.id == character))
-            character_obj = character_obj.scalar_one_or_none()
-
-            print(character_obj.prompt,"character_obj")
-            characters.append(character_obj)
+        # 一次 IN 查询取回全部角色，按灵感里保存的顺序返回
+        if spirate.characters:
+            res = await db.execute(select(Character).where(Character.id.in_(spirate.characters)))
+            characters_by_id = {character.id: character for character in res.scalars().all()}
+            characters = [characters_by_id[character_id] for character_id in spirate.characters if character_id in characters_by_id]
     
         new = SpirateResponse(
             id=spirate.id,
@@ -201,27 +186,85 @@ async def get_spirate(id: int, db: AsyncSession = Depends(get_db)):
 
 
 
+# 用户灵感总数的缓存：新增灵感时失效，多 worker 部署下其他进程最多延迟 TTL 秒
+SPIRATE_COUNT_CACHE_TTL = float(os.getenv("SPIRATE_COUNT_CACHE_TTL", 60))
+spirate_count_cache = TTLCache(maxsize=4096, ttl=SPIRATE_COUNT_CACHE_TTL)
+
+def invalidate_spirate_count(user_id: int):
+    spirate_count_cache.pop(user_id)
+
+def encode_spirate_cursor(spirate: InspirationResult) -> str:
+    raw = json.dumps([spirate.created_at.isoformat(), spirate.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_spirate_cursor(cursor: str):
+    try:
+        created_at, spirate_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(spirate_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
 # 根据用户id获取spirate
 @router.get("/user/{user_id}")
 async def get_spirate_by_user_id(user_id: int,
     page: int = Query(1, ge=1),
     pageSize: int = Query(5, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
     db: AsyncSession = Depends(get_db),
 ):
+    """
+    按创建时间倒序分页获取用户的灵感
+
+    传入上一页的 next_cursor 时按 (created_at, id) 游标取下一页，耗时与翻页深度无关，
+    只返回 data、next_cursor 和 has_more；不带游标时按 page 偏移分页（兼容旧客户端，
+    第一页两种方式相同），另外返回 total、current_page 和 total_pages。
+    """
     print(pageSize,"pageSize")
     print(page,"page")
-    spirate = await db.execute(select(InspirationResult).where(InspirationResult.user_id == user_id).order_by(InspirationResult.created_at.desc()).offset((page - 1) * pageSize).limit(pageSize))
+    query = (
+        select(InspirationResult)
+        .where(InspirationResult.user_id == user_id)
+        .order_by(InspirationResult.created_at.desc(), InspirationResult.id.desc())
+        .limit(pageSize + 1)  # 多取一条判断是否还有下一页
+    )
+    if cursor:
+        created_at, spirate_id = decode_spirate_cursor(cursor)
+        # created_at <= 游标 让索引直接定位到起点，再排除同一时间里 id 不更小的记录
+        query = query.where(
+            InspirationResult.created_at <= created_at,
+            or_(InspirationResult.created_at < created_at, InspirationResult.id < spirate_id)
+        )
+    elif page > 1:
+        query = query.offset((page - 1) * pageSize)
+    spirate = await db.execute(query)
     spirate = spirate.scalars().all()
-
-
-    total = await db.execute(select(func.count()).where(InspirationResult.user_id == user_id))
-    total = total.scalar_one_or_none()
+    has_more = len(spirate) > pageSize
+    spirate = spirate[:pageSize]
+    next_cursor = None
+    if has_more and spirate[-1].created_at is not None:
+        next_cursor = encode_spirate_cursor(spirate[-1])
+    if cursor:
+        # 游标分页不对应页码，不返回 current_page / total_pages
+        return {
+            "data": spirate,
+            "next_cursor": next_cursor,
+            "has_more": has_more
+        }
+
+    total = spirate_count_cache.get(user_id)
+    if total is None:
+        total = await db.execute(
+            select(func.count()).select_from(InspirationResult).where(InspirationResult.user_id == user_id)
+        )
+        total = total.scalar_one()
+        spirate_count_cache.set(user_id, total)
     current_page = page
     total_pages = math.ceil(total / pageSize)
     return {
         "data": spirate,
         "total": total,
         "current_page": current_page,
-        "total_pages": total_pages
+        "total_pages": total_pages,
+        "next_cursor": next_cursor,
+        "has_more": has_more
     }
-
@@ -1,28 +1,42 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy import  select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
+from typing import Optional
 import asyncio
+import json
+import os
 from database import  BookBreakdownResult, Character, CrazyWalk2Result, CrazyWalkResult, InspirationResult, async_session, get_db  # 导入session工厂
 
+from dao.character import add_story_characters
 from dao.inspirate import InspirationService
-from database import Task
+from dao.progress_writer import ProgressWriter
+from dao.task_queue import TaskQueue
+from dao.task_result import load_task_with_result
+from database import Task, TaskUsage
 from models import TaskTypeEnum
 from routes.ai_routes import generate_images
+from routes.spirate_routes import invalidate_spirate_count
 from schemas import GenerateImageRequest, SampleTaskRequest, SampleTaskResponse, TaskCreate, TaskResponse
+from util.progress_bus import TERMINAL_STATUSES, progress_bus
+from util.ttl_cache import TTLCache
 router = APIRouter(prefix="/task", tags=["task"])
 
 @router.post("/new",response_model=SampleTaskResponse)
 async def create_task(task_data: dict):
-    """创建新任务并异步处理"""
+    """创建新任务，由任务队列的 worker 认领处理"""
     print(f"task_data: {task_data}")
     try:
-        # 创建任务记录
+        # 创建任务记录，任务参数一起持久化，进程重启后仍可继续处理
         task = Task(
             user_id=task_data['user_id'],
             task_type=task_data['task_type'],
+            result_type=task_data['task_type'],
             prompt=task_data['prompt'],
-            status="processing",
+            payload=task_data,
+            status="pending",
             completion_percentage=0,
             created_at=datetime.now(),
             updated_at=datetime.now()
@@ -32,8 +46,8 @@ async def create_task(task_data: dict):
             await session.commit()
             await session.refresh(task)
         
-        # 启动异步任务处理，传入task_data
-        asyncio.create_task(process_task(task.id, task_data))
+        # 唤醒本进程空闲的 worker
+        task_queue.notify()
         
         return {"task_id": task.id, "message": "任务已创建"}
         
@@ -55,68 +69,172 @@ async def process_task(task_id: int, task_data: dict):
             # 更新70%进度 - 开始调用API
             await update_progress(task_id, 70)
             # 等待API调用完成
-            result_id = await process_task_inspiration(task_data)
+            result_id = await process_task_inspiration(task_data, task_id)
             print(f"result_data: {result_id}")
+            # 完成状态已经和结果在同一个事务里写入；返回 None 时是租约过期后被重新认领、
+            # 已由其他 worker 完成，本次结果已回滚。两种情况都丢掉还没写入的进度，
+            # 避免迟到的 70% 覆盖数据库里的最终状态，再把数据库中的结果推送给订阅者
+            task_progress.discard(task_id)
+            if result_id is None:
+                print(f"任务 {task_id} 已完成，丢弃重复执行的结果")
+            await publish_task_result(task_id)
+            return
         print("到这里了")
-        # API调用完成后，更新完成状态和结果
-        async with async_session() as db:
-            await db.execute(
-                update(Task)
-                .where(Task.id == task_id)
-                .values(
-                    completion_percentage=100,
-                    status="completed",
-                    result_type=task_data['task_type'],
-                    result_id=result_id,
-                    updated_at=datetime.utcnow()
-                )
-            )
-            await db.commit()
+        # API调用完成后，更新完成状态和结果（最终状态立即写入）
+        await task_progress.set(task_id, {
+            "completion_percentage": 100,
+            "status": "completed",
+            "result_type": task_data['task_type'],
+            "result_id": result_id,
+            "updated_at": datetime.utcnow()
+        }, terminal=True)
+        await publish_task_result(task_id)
         
     except Exception as e:
         print(f"Task processing error: {e}")
         try:
-            async with async_session() as db:
-                await db.execute(
-                    update(Task)
-                    .where(Task.id == task_id)
-                    .values(
-                        status="failed",
-                        updated_at=datetime.utcnow()
-                    )
-                )
-                await db.commit()
+            # 只在任务仍是 processing 时写入失败，其他 worker 已经完成的任务保持不变
+            if not await task_progress.set(task_id, {
+                "status": "failed",
+                "updated_at": datetime.utcnow()
+            }, terminal=True):
+                print(f"任务 {task_id} 已不在处理中，不标记为失败")
+            await publish_task_result(task_id)
         except Exception as db_error:
             print(f"Error updating task status: {db_error}")
 
+async def notify_task_failed(task_id: int):
+    """队列把任务标记为失败后（重试次数用完或处理异常），丢掉本进程的进度和缓存并推送结果"""
+    task_progress.discard(task_id)
+    task_response_cache.pop(task_id)
+    await publish_task_result(task_id)
+
+# 每个进程固定数量的 worker 从 tasks 表认领任务，并发上限见 TASK_WORKERS
+task_queue = TaskQueue(process_task, on_failed=notify_task_failed)
+
+# 任务进度先记在内存，按 PROGRESS_FLUSH_SECONDS 合并写入 tasks 表；
+# 只更新仍在 processing 的任务，租约过期的 worker 不会覆盖其他 worker 写入的最终状态
+task_progress = ProgressWriter(Task, guard=Task.status == "processing")
+
+# 已结束任务的查询结果缓存
+TASK_RESPONSE_CACHE_TTL = float(os.getenv("TASK_RESPONSE_CACHE_TTL", 60))
+task_response_cache = TTLCache(maxsize=1024, ttl=TASK_RESPONSE_CACHE_TTL)
+
 async def update_progress(task_id: int, percentage: int):
     """更新任务进度"""
-    async with async_session() as db:
-        await db.execute(
-            update(Task)
-            .where(Task.id == task_id)
-            .values(
-                completion_percentage=percentage,
-                updated_at=datetime.utcnow()
-            )
-        )
-        await db.commit()
+    await task_progress.set(task_id, {
+        "completion_percentage": percentage,
+        "updated_at": datetime.utcnow()
+    })
+    progress_bus.publish(task_id, {
+        "id": task_id,
+        "status": "processing",
+        "completion_percentage": percentage
+    })
+
+
+async def publish_task_result(task_id: int):
+    """任务结束后把完整结果推送给订阅者"""
+    response = await load_task_response(task_id)
+    if response is not None:
+        progress_bus.publish(task_id, jsonable_encoder(response))
 
 
 @router.get("/status/{task_id}")
 async def get_task_status(task_id: int, db: AsyncSession = Depends(get_db)):
     """获取任务状态和结果"""
     print(f"task_id: {task_id}")
-    task = None
-    async with async_session() as db:
-        query = select(Task).where(Task.id == task_id)
-        result = await db.execute(query)
-        task = result.scalar_one_or_none()
-
-    if not task:
+    response = await load_task_response(task_id)
+    if response is None:
         raise HTTPException(status_code=404, detail="Task not found")
+
+    print(f"response: {response}")
+    return response
+
+
+# SSE 连接空闲时发送心跳的间隔
+TASK_EVENTS_KEEPALIVE_SECONDS = 15
+
+def format_task_event(event: dict) -> str:
+    name = "result" if event["status"] in TERMINAL_STATUSES else "progress"
+    return f"event: {name}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@router.get("/{task_id}/events")
+async def task_events(task_id: int, request: Request):
+    """
+    以 SSE 推送任务进度和最终结果，替代轮询 /task/status
+
+    进度事件为 event: progress，任务结束时发送 event: result（内容同 /task/status）后关闭连接。
+    """
+    initial = None
+    if progress_bus.latest(task_id) is None:
+        # 任务不在本进程处理（或尚未开始），先查一次数据库作为初始状态
+        initial = await load_task_response(task_id)
+        if initial is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+
+    async def event_stream():
+        last = jsonable_encoder(initial) if initial is not None else None
+        with progress_bus.subscribe(task_id) as queue:
+            if last is not None and queue.empty():
+                queue.put_nowait(last)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), TASK_EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    if progress_bus.latest(task_id) is not None:
+                        continue
+                    # 任务由其他进程处理时收不到本进程的进度，按心跳间隔低频查一次数据库
+                    response = await load_task_response(task_id)
+                    if response is None:
+                        return
+                    event = jsonable_encoder(response)
+                    if last is not None and event["status"] == last["status"] \
+                            and event["completion_percentage"] == last["completion_percentage"]:
+                        continue
+                last = event
+                yield format_task_event(event)
+                if event["status"] in TERMINAL_STATUSES:
+                    return
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
+    )
+
+
+async def load_task_response(task_id: int) -> Optional[TaskResponse]:
+    """查询任务状态，任务完成时根据 result_type 带上对应表的结果；任务不存在时返回 None"""
+    cached = task_response_cache.get(task_id)
+    if cached is not None:
+        return cached
+
+    result_error = False
+    async with async_session() as db:
+        try:
+            loaded = await load_task_with_result(db, task_id)
+        except Exception as e:
+            # 结果数据损坏或展开角色失败时，仍然返回任务本身的状态
+            print(f"Error fetching result: {e}")
+            await db.rollback()
+            task = (await db.execute(select(Task).where(Task.id == task_id))).scalar_one_or_none()
+            loaded = None if task is None else (task, {"error": "获取结果数据失败"})
+            result_error = True
+    if loaded is None:
+        return None
+    task, result_data = loaded
     
     print(f"task: {task}")
+    # 还没写入数据库的进度以内存中的为准
+    pending = task_progress.get(task.id)
+    if pending:
+        for key in ("status", "completion_percentage", "updated_at"):
+            if key in pending:
+                setattr(task, key, pending[key])
     response = TaskResponse(
         id=task.id,
         status=task.status,
@@ -131,73 +249,36 @@ async def get_task_status(task_id: int, db: AsyncSession = Depends(get_db)):
         result=None
     )
 
-    # 如果任务完成，根据result_type获取对应表的结果
     if task.status == "completed" and task.result_id:
-        try:
-            result_data = None
-            async with async_session() as db:
-                if task.result_type == TaskTypeEnum.INSPIRATION:
-                    query = select(InspirationResult).where(InspirationResult.id == task.result_id)
-                    result = await db.execute(query)
-                    inspiration_result = result.scalar_one_or_none()
-                    if inspiration_result:
-                        characters = await inspiration_result.get_characters(db)
-                        result_data = {
-                            "title": inspiration_result.title,
-                            "characters": characters,
-                            "content": inspiration_result.content,
-                            "story_direction": inspiration_result.story_direction
-                        }
-
-                elif task.result_type == TaskTypeEnum.CRAZY_WALK:
-                    query = select(CrazyWalkResult).where(CrazyWalkResult.id == task.result_id)
-                    result = await db.execute(query)
-                    crazy_walk_result = result.scalar_one_or_none()
-                    if crazy_walk_result:
-                        result_data = {
-                            "title": crazy_walk_result.title,
-                            "content": crazy_walk_result.content
-                        }
-
-                elif task.result_type == TaskTypeEnum.CRAZY_WALK_2:
-                    query = select(CrazyWalk2Result).where(CrazyWalk2Result.id == task.result_id)
-                    result = await db.execute(query)
-                    crazy_walk_2_result = result.scalar_one_or_none()
-                    if crazy_walk_2_result:
-                        result_data = {
-                            "title": crazy_walk_2_result.title,
-                            "content": crazy_walk_2_result.content,
-                            "additional_info": crazy_walk_2_result.additional_info
-                        }
-
-                elif task.result_type == TaskTypeEnum.BOOK_BREAKDOWN:
-                    query = select(BookBreakdownResult).where(BookBreakdownResult.id == task.result_id)
-                    result = await db.execute(query)
-                    book_breakdown_result = result.scalar_one_or_none()
-                    if book_breakdown_result:
-                        result_data = {
-                            "book_title": book_breakdown_result.book_title,
-                            "analysis": book_breakdown_result.analysis,
-                            "key_points": book_breakdown_result.key_points,
-                            "summary": book_breakdown_result.summary
-                        }
-
-            response.result = result_data
-            
-        except Exception as e:
-            print(f"Error fetching result: {e}")
-            response.result = {"error": "获取结果数据失败"}
-            
+        response.result = result_data
     elif task.status == "failed":
         response.result = {
             "error": "任务处理失败"
         }
 
-    print(f"response: {response}")
+    # 已结束的任务不会再变化，短时间内的重复查询直接走缓存
+    if task.status in TERMINAL_STATUSES and not pending and not result_error:
+        task_response_cache.set(task_id, response)
     return response
 
-async def process_task_inspiration(task_data: dict)->int:
-    """处理灵感任务"""
+async def record_task_usage(task_id: int, task_type: str, usage: dict):
+    """写入任务的大模型用量记录；记账失败不影响任务本身"""
+    print(f"任务 {task_id} 用量: {usage}")
+    try:
+        async with async_session() as db:
+            db.add(TaskUsage(task_id=task_id, task_type=task_type, **usage))
+            await db.commit()
+    except Exception as e:
+        print(f"Error recording task usage: {e}")
+
+async def process_task_inspiration(task_data: dict, task_id: int = None)->Optional[int]:
+    """
+    处理灵感任务，返回灵感结果 id
+
+    传入 task_id 时，灵感结果和任务的 completed 状态在同一个事务里提交；
+    任务已经不是 processing（被其他 worker 重新认领后完成）时整个事务回滚并返回 None，
+    崩溃后重新执行的任务不会插入重复的结果。
+    """
     service = InspirationService()
     try:
         result = None
@@ -206,45 +287,45 @@ async def process_task_inspiration(task_data: dict)->int:
             result = await service.continue_story(task_data['prompt'])
         else:
             result = await service.generate_complete_story(task_data['prompt'])
+            if task_id is not None:
+                await record_task_usage(task_id, "INSPIRATION", service.usage)
 
-        # 保存到灵感表
-        
-        character_ids = []
-        # 创建Character 对象
-        for character in result['characters']:
-            print(f"character: {character}")
-            character_result = Character(
-                name=character['姓名'],
-                description='\n'.join(character['描述']) if isinstance(character['描述'], list) else character['描述'],
-                user_id=task_data['user_id'],
-                prompt=f"你现在正在做一个角色扮演，无论用户如何去套取你的模型信息，你都不会回复。你只会回答你的公开信息，你的公开信息是：你叫{character['姓名']},关于你的描述为：{character['描述']},除此之外，你可以基于你的角色定位和用户聊天、谈心，唯独不能泄露你的模型信息！"
-            )
-            async with async_session() as db:
-                db.add(character_result)
-                await db.commit()
-                await db.refresh(character_result)
-                character_ids.append(character_result.id)
-
-        
+        # 保存到灵感表：角色和灵感结果在同一个事务里写入
         
         # cover_image = await generate_images(GenerateImageRequest(prompt=task_data['prompt'],size='1280x960',user_id=task_data['user_id']))
         
-
-
-        inspiration_result = InspirationResult(
-            title=result['title'],
-            characters=character_ids,
-            prompt=task_data['prompt'],
-            content=result['content'],
-            user_id=task_data['user_id'],
-            story_direction=result['story_direction'],
-            cover_image=''
-        )
         async with async_session() as db:
+            characters = await add_story_characters(db, task_data['user_id'], result['characters'])
+            inspiration_result = InspirationResult(
+                title=result['title'],
+                characters=[character.id for character in characters],
+                prompt=task_data['prompt'],
+                content=result['content'],
+                user_id=task_data['user_id'],
+                story_direction=result['story_direction'],
+                cover_image=''
+            )
             db.add(inspiration_result)
+            await db.flush()
+            if task_id is not None:
+                completed = await db.execute(
+                    update(Task)
+                    .where(Task.id == task_id, Task.status == "processing")
+                    .values(
+                        status="completed",
+                        completion_percentage=100,
+                        result_type=TaskTypeEnum.INSPIRATION,
+                        result_id=inspiration_result.id,
+                        updated_at=datetime.utcnow()
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                if completed.rowcount != 1:
+                    await db.rollback()
+                    return None
             await db.commit()
-            await db.refresh(inspiration_result)
-            return inspiration_result.id
+        invalidate_spirate_count(task_data['user_id'])
+        return inspiration_result.id
 
     except Exception as e:
         print(f"Task processing error: {e}")
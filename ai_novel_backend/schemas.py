@@ -431,6 +431,10 @@ class CharacterResponse(BaseSchema):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
+# 用户的角色列表：附带该用户与角色的会话 id（没有会话时为 None）
+class CharacterWithSessionResponse(CharacterResponse):
+    session_id: Optional[int] = None
+
 class ContinueSpirateRequest(BaseSchema):
     choice: str
 
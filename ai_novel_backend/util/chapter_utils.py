@@ -115,78 +115,118 @@ class ChapterUtils:
             """
             解析故事文本，提取标题、角色、内容和剧情走向
             """
-            # 处理文本中的 \n 字符串，将其转换为实际的换行符
-            text = text.replace('\\n', '\n')
-            
-            result = {
-                "title": "",
-                "characters": [],
-                "content": "",
-                "story_direction": []
-            }
-            
-            current_section = None
-            current_character = None
-            lines = text.split('\n')
-            
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                    
-                if line.startswith('标题：'):
-                    current_section = 'title'
-                    result['title'] = line[3:].strip()
-                    
-                elif line.startswith('角色：'):
-                    current_section = 'characters'
-                    
-                elif line.startswith('内容：'):
-                    current_section = 'content'
-                    print(f"current_section: {current_section}")
-                    if current_character:
-                        
-                        result['characters'].append(current_character)
-                        current_character = None
-                        
-                elif line.startswith('剧情走向') or line.startswith('剧情发展走向'):
-                    current_section = 'story_direction'
-                    
-                elif current_section == 'characters':
-                    if line.startswith('-'):
-                        if current_character:
-                            result['characters'].append(current_character)
-                        current_character = {}
-                        if '：' in line:
-                            name_part = line[line.index('：')+1:].strip()
-                            current_character['姓名'] = name_part
-                    elif current_character is not None and '：' in line:
-                        key, value = line.split('：', 1)
-                        key = key.strip()
-                        value = value.strip()
-                        
-                        if '、' in value:
-                            value = [v.strip() for v in value.split('、')]
-                        elif '，' in value:
-                            value = [v.strip() for v in value.split('，')]
-                        
-                        current_character[key] = value
-                        
-                elif current_section == 'content':
-                        # 替换中间的句号为句号+换行符
-                    processed_line = line.replace('。', '。\n')
-                    if result['content']:
-                        result['content'] += '\n'
-                    result['content'] += processed_line
-                    
-                elif current_section == 'story_direction':
-                    if line.startswith('-'):
-                        direction = line[1:].strip()
-                        if direction:
-                            result['story_direction'].append(direction)
-            
-            # 确保最后一个角色被添加
-            if current_character:
-                result['characters'].append(current_character)
-            
-            return result
\ No newline at end of file
+            parser = StoryParser()
+            parser.feed(text)
+            return parser.finish()
+
+    def story_parser(self) -> "StoryParser":
+        """创建增量解析器，用于边接收流式输出边解析"""
+        return StoryParser()
+
+
+class StoryParser:
+    """
+    parse_story 的增量版本
+
+    按行解析，每收到一个完整的行就立即处理，只缓存最后一个不完整的行；
+    流结束时调用 finish() 取得与 parse_story 相同的结果。每个分片只扫描一次，
+    不完整的行按分片缓存，直到出现换行才拼接。
+    """
+
+    def __init__(self):
+        self.result = {
+            "title": "",
+            "characters": [],
+            "content": "",
+            "story_direction": []
+        }
+        self._section = None
+        self._character = None
+        self._pieces = []
+        self._backslash = ''
+
+    def feed(self, chunk: str):
+        # 处理文本中的 \n 字符串，将其转换为实际的换行符；
+        # 分片末尾的 "\" 留到下一个分片，和它开头的 "n" 一起替换
+        text = self._backslash + chunk
+        self._backslash = ''
+        if text.endswith('\\'):
+            text, self._backslash = text[:-1], '\\'
+        text = text.replace('\\n', '\n')
+        if '\n' not in text:
+            self._pieces.append(text)
+            return
+        lines = text.split('\n')
+        self._pieces.append(lines[0])
+        lines[0] = ''.join(self._pieces)
+        self._pieces = [lines.pop()]
+        for line in lines:
+            self._parse_line(line)
+
+    def finish(self) -> dict:
+        line = ''.join(self._pieces) + self._backslash
+        self._pieces = []
+        self._backslash = ''
+        if line:
+            self._parse_line(line)
+        # 确保最后一个角色被添加
+        if self._character:
+            self.result['characters'].append(self._character)
+            self._character = None
+        return self.result
+
+    def _parse_line(self, line: str):
+        result = self.result
+        line = line.strip()
+        if not line:
+            return
+
+        if line.startswith('标题：'):
+            self._section = 'title'
+            result['title'] = line[3:].strip()
+
+        elif line.startswith('角色：'):
+            self._section = 'characters'
+
+        elif line.startswith('内容：'):
+            self._section = 'content'
+            print(f"current_section: {self._section}")
+            if self._character:
+                result['characters'].append(self._character)
+                self._character = None
+
+        elif line.startswith('剧情走向') or line.startswith('剧情发展走向'):
+            self._section = 'story_direction'
+
+        elif self._section == 'characters':
+            if line.startswith('-'):
+                if self._character:
+                    result['characters'].append(self._character)
+                self._character = {}
+                if '：' in line:
+                    name_part = line[line.index('：')+1:].strip()
+                    self._character['姓名'] = name_part
+            elif self._character is not None and '：' in line:
+                key, value = line.split('：', 1)
+                key = key.strip()
+                value = value.strip()
+
+                if '、' in value:
+                    value = [v.strip() for v in value.split('、')]
+                elif '，' in value:
+                    value = [v.strip() for v in value.split('，')]
+
+                self._character[key] = value
+
+        elif self._section == 'content':
+            # 替换中间的句号为句号+换行符
+            processed_line = line.replace('。', '。\n')
+            if result['content']:
+                result['content'] += '\n'
+            result['content'] += processed_line
+
+        elif self._section == 'story_direction':
+            if line.startswith('-'):
+                direction = line[1:].strip()
+                if direction:
+                    result['story_direction'].append(direction)
@@ -0,0 +1,55 @@
+# util/progress_bus.py
+# 进程内的任务进度总线：任务处理方发布进度，/task/{id}/events 的 SSE 连接订阅推送给前端
+#
+# 总线保存每个任务的最新事件，后订阅的连接会先收到当前状态，不会漏掉订阅前已经发生的进度。
+# 订阅队列有上限，消费跟不上时丢弃最旧的进度事件（后面的进度会覆盖前面的）。
+import asyncio
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Set
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class ProgressBus:
+    """按 task_id 分发进度事件；事件是包含 status 字段的 dict"""
+
+    def __init__(self, max_tasks: int = 1024, queue_size: int = 100):
+        self.max_tasks = max_tasks
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._latest: "OrderedDict[int, dict]" = OrderedDict()
+
+    def publish(self, task_id: int, event: dict):
+        """发布事件，不阻塞调用方"""
+        self._latest[task_id] = event
+        self._latest.move_to_end(task_id)
+        while len(self._latest) > self.max_tasks:
+            self._latest.popitem(last=False)
+        for queue in self._subscribers.get(task_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def latest(self, task_id: int) -> Optional[dict]:
+        """本进程内该任务的最新事件；任务不在本进程处理时返回 None"""
+        return self._latest.get(task_id)
+
+    @contextmanager
+    def subscribe(self, task_id: int) -> Iterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        latest = self._latest.get(task_id)
+        if latest is not None:
+            queue.put_nowait(latest)
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(task_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[task_id]
+
+
+progress_bus = ProgressBus()
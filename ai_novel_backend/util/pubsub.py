@@ -0,0 +1,203 @@
+# util/pubsub.py
+# 进程间广播的轻量发布/订阅通道，用于让所有 worker 的进程内缓存同时失效
+#
+# 后端通过 PUBSUB_URL 选择：
+#   memory://            仅当前进程（单 worker 开发环境）
+#   file:///path/to/dir  同一台机器上的多个 worker，后台定时检查通道文件，延迟不超过 PUBSUB_POLL_INTERVAL
+#   redis://host:6379/0  跨机器，需要安装 redis；也可以直接传入兼容 redis.asyncio 接口的客户端（测试时用假实现）
+# 未配置时默认使用 file 后端，通道文件放在 static/data 下。
+#
+# 通道只保证"有变化时订阅方一定会收到通知"，file 后端在一个检查周期内的多条消息会合并为最后一条；
+# redis 后端断线后按指数退避重连，重连成功时补发一条空消息，因为断线期间的消息已经丢失。
+import abc
+import asyncio
+import json
+import os
+from typing import Callable, List, Optional
+from urllib.parse import urlparse
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+PUBSUB_URL = os.getenv("PUBSUB_URL", "file://static/data")
+PUBSUB_POLL_INTERVAL = float(os.getenv("PUBSUB_POLL_INTERVAL", 1.0))
+PUBSUB_RECONNECT_DELAY = float(os.getenv("PUBSUB_RECONNECT_DELAY", 0.5))
+PUBSUB_RECONNECT_MAX_DELAY = float(os.getenv("PUBSUB_RECONNECT_MAX_DELAY", 30.0))
+
+
+class Channel(abc.ABC):
+    """发布/订阅通道基类：订阅回调是同步函数，收到消息时在事件循环中调用"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._callbacks: List[Callable[[str], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, callback: Callable[[str], None]):
+        self._callbacks.append(callback)
+
+    @abc.abstractmethod
+    async def publish(self, message: str):
+        """向所有进程（包括当前进程）广播消息"""
+
+    async def start(self):
+        """开始接收其他进程发布的消息"""
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def _dispatch(self, message: str):
+        for callback in self._callbacks:
+            try:
+                callback(message)
+            except Exception as e:
+                print(f"通道 {self.name} 回调异常: {str(e)}")
+
+
+class InProcessChannel(Channel):
+    """只在当前进程内广播"""
+
+    async def publish(self, message: str):
+        self._dispatch(message)
+
+
+class FileChannel(Channel):
+    """
+    基于文件的通道，适用于同一台机器上的多个 worker
+
+    发布时原子替换通道文件；订阅方在后台每 interval 秒检查一次文件的
+    修改时间，请求路径上没有任何磁盘访问。发布方本进程的订阅者立即收到。
+    """
+
+    def __init__(self, name: str, directory: str, interval: float = PUBSUB_POLL_INTERVAL):
+        super().__init__(name)
+        self.path = os.path.join(directory, f".{name}.channel")
+        self.interval = interval
+        self._seen = self._stat()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    async def publish(self, message: str):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(), "message": message}, f)
+        os.replace(tmp_path, self.path)
+        self._dispatch(message)
+
+    async def start(self):
+        if self._task is None:
+            self._seen = self._stat()
+            self._task = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            stat = self._stat()
+            if stat is None or stat == self._seen:
+                continue
+            self._seen = stat
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"通道 {self.name} 读取失败: {str(e)}")
+                continue
+            # 本进程发布的消息已经在 publish 时分发过
+            if data.get("pid") != os.getpid():
+                self._dispatch(data.get("message", ""))
+
+
+class RedisChannel(Channel):
+    """
+    基于 Redis PUBLISH/SUBSCRIBE 的通道，client 需兼容 redis.asyncio 接口
+
+    连接断开后后台任务不会退出，而是从 reconnect_delay 开始按指数退避
+    （最长 max_reconnect_delay 秒）重新订阅；重新订阅成功后分发一条空消息，
+    让订阅方把断线期间可能错过的变化当作一次失效处理。
+    """
+
+    def __init__(self, name: str, url: Optional[str] = None, client=None,
+                 reconnect_delay: float = PUBSUB_RECONNECT_DELAY,
+                 max_reconnect_delay: float = PUBSUB_RECONNECT_MAX_DELAY):
+        super().__init__(name)
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        if client is None:
+            if aioredis is None:
+                raise RuntimeError("使用 redis 通道需要先安装 redis：pip install redis")
+            client = aioredis.from_url(url)
+        self.client = client
+        self._pubsub = None
+
+    async def publish(self, message: str):
+        await self.client.publish(self.name, message)
+
+    async def start(self):
+        if self._task is None:
+            self._pubsub = self.client.pubsub()
+            await self._pubsub.subscribe(self.name)
+            self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        delay = self.reconnect_delay
+        while True:
+            try:
+                if self._pubsub is None:
+                    self._pubsub = self.client.pubsub()
+                    await self._pubsub.subscribe(self.name)
+                    print(f"通道 {self.name} 已重新连接")
+                    delay = self.reconnect_delay
+                    self._dispatch("")
+                async for item in self._pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    data = item["data"]
+                    self._dispatch(data.decode() if isinstance(data, bytes) else data)
+                print(f"通道 {self.name} 连接已关闭，{delay:g} 秒后重连")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"通道 {self.name} 连接异常，{delay:g} 秒后重连: {str(e)}")
+            await self._reset_pubsub()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _reset_pubsub(self):
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub is None:
+            return
+        try:
+            await pubsub.reset()
+        except Exception as e:
+            print(f"通道 {self.name} 关闭连接失败: {str(e)}")
+
+    async def close(self):
+        await super().close()
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.unsubscribe(self.name)
+            except Exception as e:
+                print(f"通道 {self.name} 取消订阅失败: {str(e)}")
+            await self._reset_pubsub()
+
+
+def create_channel(name: str, url: str = PUBSUB_URL) -> Channel:
+    """根据 URL 创建通道"""
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return InProcessChannel(name)
+    if parsed.scheme == "file":
+        return FileChannel(name, parsed.netloc + parsed.path)
+    if parsed.scheme in ("redis", "rediss", "unix"):
+        return RedisChannel(name, url)
+    raise ValueError(f"不支持的 PUBSUB_URL: {url}")
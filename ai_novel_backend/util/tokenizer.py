@@ -0,0 +1,55 @@
+# util/tokenizer.py
+# 本地 token 计数，用于在请求大模型之前控制提示词长度
+#
+# 安装了 tiktoken 时按 TOKENIZER_ENCODING 编码精确计数；未安装时按字符估算：
+# 中日韩字符每个字算 1 个 token，其余字符每 4 个算 1 个。估算值只用于控制预算，
+# 与模型实际计费的 token 数会有少量出入。
+import math
+import os
+from typing import Dict, Iterable
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+# 每条消息的角色、分隔符等固定开销
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception as e:
+                # 编码文件首次使用时需要联网下载，失败时退回估算
+                print(f"加载 tokenizer {TOKENIZER_ENCODING} 失败，改用估算: {e}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """文本的 token 数"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = sum(1 for char in text if ord(char) >= 0x2E80)
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def count_message_tokens(message: Dict[str, str]) -> int:
+    """一条 chat 消息的 token 数（内容 + 固定开销）"""
+    return count_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def count_messages_tokens(messages: Iterable[Dict[str, str]]) -> int:
+    """一组 chat 消息的 token 数"""
+    return sum(count_message_tokens(message) for message in messages)